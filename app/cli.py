@@ -0,0 +1,311 @@
+"""
+Command-line maintenance tasks for the QR code store.
+
+Usage:
+    python -m app.cli rebuild-index [--driver flat|sharded|s3]
+    python -m app.cli reencode [--compression-level N] [--png-filter none|up] [--dry-run]
+    python -m app.cli migrate-storage --from flat --to sharded [--delete-source] [--dry-run]
+    python -m app.cli warm-up URLS_FILE [--sizes 10,20] [--formats png,svg] [--restart]
+    python -m app.cli sweep-expired [--batch-size N]
+    python -m app.cli job-worker [--concurrency N] [--drain]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from app.config import (
+    EXPIRY_SWEEP_BATCH_SIZE, JOB_WORKERS, PNG_COMPRESSION_LEVEL, PNG_FILTER, QR_DIRECTORY,
+    STORAGE_DRIVER
+)
+from app.services.expiry import sweep_expired
+from app.services.job_worker import job_worker
+from app.services.log_pipeline import setup_logging
+from app.services.qr_index import iter_image_files, qr_index
+from app.services.qr_service import RENDER_FORMATS, is_qr_code_file, metadata_name
+from app.services.render_executor import render_executor
+from app.services.storage import STORAGE_DRIVERS, Storage, create_storage
+from app.services.rasterizer import NATIVE_RASTER_AVAILABLE, PNG_FILTERS, reencode_png
+from app.services.warmup import WarmupProgress, warm_up
+
+
+def rebuild_index(args: argparse.Namespace) -> int:
+    """
+    Reconciles the metadata index with the QR codes present in the store.
+    """
+    added, removed = qr_index.rebuild(create_storage(args.driver, args.directory))
+    print(f"Index rebuilt: {added} added, {removed} removed, {qr_index.count()} total.")
+    return 0
+
+
+def reencode(args: argparse.Namespace) -> int:
+    """
+    Re-encodes the stored PNGs in place with the compact encoder and reports the bytes saved.
+    Files only get replaced when the new encoding is smaller; the pixels are unchanged,
+    so filenames and metadata stay valid.
+    """
+    if not NATIVE_RASTER_AVAILABLE:
+        print("numpy is required to re-encode the store.", file=sys.stderr)
+        return 1
+
+    storage = create_storage(args.driver, args.directory)
+    before_total = after_total = rewritten = skipped = 0
+    for qr_file in iter_image_files(storage):
+        if not qr_file.endswith('.png'):
+            continue
+        body = storage.get(qr_file)
+        new_body = reencode_png(
+            body, compression_level=args.compression_level, png_filter=args.png_filter
+        )
+        before_total += len(body)
+        if new_body is None or len(new_body) >= len(body):
+            skipped += 1
+            after_total += len(body)
+            continue
+        if not args.dry_run:
+            storage.put(qr_file, new_body)
+        rewritten += 1
+        after_total += len(new_body)
+
+    saved = before_total - after_total
+    percent = 100 * saved / before_total if before_total else 0
+    action = "Would rewrite" if args.dry_run else "Rewrote"
+    print(f"{action} {rewritten} files, skipped {skipped}: "
+          f"{before_total} -> {after_total} bytes ({saved} bytes, {percent:.1f}% saved).")
+    return 0
+
+
+def copy_objects(source: Storage, target: Storage, names: List[str], dry_run: bool) -> int:
+    """
+    Copies the named objects that the target does not hold yet and returns how many.
+    Stored names are content addresses, so an existing object is never stale.
+    """
+    copied = 0
+    for name in names:
+        if target.exists(name):
+            continue
+        if not dry_run:
+            target.put(name, source.get(name))
+        copied += 1
+    return copied
+
+
+def migrate_storage(args: argparse.Namespace) -> int:
+    """
+    Copies every stored object from one storage driver to another.
+
+    Metadata files are copied before images and images are deleted before metadata,
+    so each store keeps the invariant that an image always has its metadata. Names do
+    not change, so the index stays valid; only the storage settings need updating.
+    """
+    target_directory = args.target_directory or args.source_directory
+    if args.source == args.target and target_directory == args.source_directory:
+        print("Source and target are the same store.", file=sys.stderr)
+        return 1
+    source = create_storage(args.source, args.source_directory)
+    target = create_storage(args.target, target_directory)
+
+    # The names are listed up front: the source may share a directory with the target.
+    # Anything else in a local store, such as the index, is not part of the store.
+    names = set(source.iterate())
+    images = sorted(name for name in names if is_qr_code_file(name))
+    metadata = [metadata_name(name) for name in images if metadata_name(name) in names]
+    copied = copy_objects(source, target, metadata, args.dry_run)
+    copied += copy_objects(source, target, images, args.dry_run)
+
+    deleted = 0
+    if args.delete_source and not args.dry_run:
+        for name in images + metadata:
+            deleted += source.delete(name)
+    action = "Would copy" if args.dry_run else "Copied"
+    total = len(images) + len(metadata)
+    print(f"{action} {copied} of {total} objects from {source.driver} to {target.driver}, "
+          f"deleted {deleted} from the source.")
+    return 0
+
+
+def load_checkpoint(path: Path, source: Path) -> int:
+    """
+    Returns the line a warm-up of ``source`` stopped at, or 0 when there is no checkpoint
+    for this version of the file.
+    """
+    try:
+        checkpoint = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return 0
+    stat = source.stat()
+    if checkpoint.get("size") != stat.st_size or checkpoint.get("mtime") != stat.st_mtime:
+        return 0
+    return int(checkpoint.get("line", 0))
+
+
+def warm_up_store(args: argparse.Namespace) -> int:
+    """
+    Pre-renders every variant of the URLs in a file, reporting progress as it goes.
+
+    A checkpoint next to the file records how far the warm-up got, so running the
+    same command again resumes there; items already stored are skipped cheaply anyway.
+    """
+    unknown = set(args.formats) - set(RENDER_FORMATS)
+    if unknown:
+        print(f"Unsupported formats: {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+    if args.urls == Path("-"):
+        lines, checkpoint, total, resume_line = sys.stdin, None, None, 0
+    else:
+        checkpoint = args.checkpoint or args.urls.with_name(args.urls.name + ".warmup")
+        with open(args.urls, "rb") as urls_file:
+            total = sum(1 for _ in urls_file)
+        resume_line = 0 if args.restart else load_checkpoint(checkpoint, args.urls)
+        lines = open(args.urls, encoding="utf-8")  # pylint: disable=consider-using-with
+    if resume_line:
+        print(f"Resuming at line {resume_line}.")
+
+    def report(progress: WarmupProgress):
+        print(f"Warm-up: {progress}", flush=True)
+        if checkpoint is not None:
+            stat = args.urls.stat()
+            checkpoint.write_text(json.dumps({
+                "line": progress.resume_line, "size": stat.st_size, "mtime": stat.st_mtime
+            }))
+
+    try:
+        progress = asyncio.run(warm_up(
+            lines, sizes=args.sizes, formats=args.formats,
+            progress=WarmupProgress(total=total, resume_line=resume_line),
+            concurrency=args.concurrency or render_executor.max_workers, on_progress=report,
+        ))
+    finally:
+        lines.close()
+        render_executor.shutdown(wait=True)
+    return 1 if progress.failed else 0
+
+
+def sweep_expired_codes(args: argparse.Namespace) -> int:
+    """
+    Deletes the QR codes whose time to live has run out, for deployments that run the
+    sweeper on a schedule instead of inside the app.
+    """
+    storage = create_storage(args.driver, args.directory)
+    deleted = sweep_expired(storage, batch_size=args.batch_size)
+    print(f"Deleted {deleted} expired QR codes.")
+    return 0
+
+
+def run_job_worker(args: argparse.Namespace) -> int:
+    """
+    Runs queued render jobs in this process, alongside or instead of the job workers
+    of the app, until interrupted, or until the queue is empty with ``--drain``.
+    """
+    job_worker.concurrency = args.concurrency
+    try:
+        if args.drain:
+            print(f"Ran {asyncio.run(job_worker.drain())} jobs.")
+        else:
+            asyncio.run(job_worker.run_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        render_executor.shutdown(wait=True)
+    return 0
+
+
+def comma_list(item_type):
+    """
+    Returns an argparse type parsing a comma-separated list of ``item_type`` values.
+    """
+    def parse(value: str):
+        return [item_type(item) for item in value.split(",") if item]
+    return parse
+
+
+def add_storage_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds the options selecting the store a sub-command works on.
+    """
+    parser.add_argument("--driver", choices=STORAGE_DRIVERS, default=STORAGE_DRIVER,
+                        help="Storage driver (default: %(default)s).")
+    parser.add_argument("--directory", type=Path, default=QR_DIRECTORY,
+                        help="Root directory of the flat and sharded drivers.")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    Builds the argument parser with one sub-command per maintenance task.
+    """
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description=__doc__.split("\n")[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild-index", help="Reconcile the index with the store.")
+    add_storage_arguments(rebuild)
+    rebuild.set_defaults(handler=rebuild_index)
+
+    reencode_cmd = commands.add_parser("reencode", help="Re-encode stored PNGs compactly.")
+    add_storage_arguments(reencode_cmd)
+    reencode_cmd.add_argument("--compression-level", type=int, choices=range(10),
+                              default=PNG_COMPRESSION_LEVEL, help="zlib compression level.")
+    reencode_cmd.add_argument("--png-filter", choices=sorted(PNG_FILTERS), default=PNG_FILTER,
+                              help="PNG scanline filter.")
+    reencode_cmd.add_argument("--dry-run", action="store_true",
+                              help="Report the savings without rewriting files.")
+    reencode_cmd.set_defaults(handler=reencode)
+
+    migrate = commands.add_parser("migrate-storage", help="Copy the store to another driver.")
+    migrate.add_argument("--from", dest="source", choices=STORAGE_DRIVERS, required=True,
+                         help="Driver the QR codes are stored with now.")
+    migrate.add_argument("--to", dest="target", choices=STORAGE_DRIVERS, required=True,
+                         help="Driver to move the QR codes to.")
+    migrate.add_argument("--source-directory", type=Path, default=QR_DIRECTORY,
+                         help="Root directory of a local source (default: %(default)s).")
+    migrate.add_argument("--target-directory", type=Path,
+                         help="Root directory of a local target (default: the source's).")
+    migrate.add_argument("--delete-source", action="store_true",
+                         help="Delete the objects from the source once copied.")
+    migrate.add_argument("--dry-run", action="store_true",
+                         help="Report what would be copied without writing anything.")
+    migrate.set_defaults(handler=migrate_storage)
+
+    warm = commands.add_parser("warm-up", help="Pre-render the QR codes of a URL list.")
+    warm.add_argument("urls", type=Path,
+                      help="File with one URL or JSON QR code request per line, or - for stdin.")
+    warm.add_argument("--sizes", type=comma_list(int), default=[],
+                      help="Comma-separated box sizes to render every URL at.")
+    warm.add_argument("--formats", type=comma_list(str), default=[],
+                      help=f"Comma-separated formats among {', '.join(RENDER_FORMATS)}.")
+    warm.add_argument("--concurrency", type=int, default=0,
+                      help="URLs rendered at once (default: one per render worker).")
+    warm.add_argument("--checkpoint", type=Path,
+                      help="Progress file used to resume (default: URLS_FILE.warmup).")
+    warm.add_argument("--restart", action="store_true",
+                      help="Ignore the checkpoint and start from the first line.")
+    warm.set_defaults(handler=warm_up_store)
+
+    sweep = commands.add_parser("sweep-expired", help="Delete the expired QR codes.")
+    add_storage_arguments(sweep)
+    sweep.add_argument("--batch-size", type=int, default=EXPIRY_SWEEP_BATCH_SIZE,
+                       help="Codes deleted per index batch (default: %(default)s).")
+    sweep.set_defaults(handler=sweep_expired_codes)
+
+    jobs = commands.add_parser("job-worker", help="Run queued render jobs.")
+    jobs.add_argument("--concurrency", type=int, default=max(1, JOB_WORKERS),
+                      help="Jobs run at once (default: %(default)s).")
+    jobs.add_argument("--drain", action="store_true",
+                      help="Exit once the queue is empty instead of waiting for new jobs.")
+    jobs.set_defaults(handler=run_job_worker)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs the sub-command named on the command line.
+    """
+    setup_logging()
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -27,3 +27,57 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
 
 ADMIN_USER = os.getenv('ADMIN_USER', 'admin')
 ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'secret')
+
+RENDER_EXECUTOR = os.getenv('RENDER_EXECUTOR', 'process')
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', str(os.cpu_count() or 1)))
+RENDER_QUEUE_SIZE = int(os.getenv('RENDER_QUEUE_SIZE', '32'))
+RENDER_RETRY_AFTER = int(os.getenv('RENDER_RETRY_AFTER', '1'))
+
+QR_BORDER = int(os.getenv('QR_BORDER', '5'))
+QR_ERROR_CORRECTION = os.getenv('QR_ERROR_CORRECTION', 'M')
+
+RENDER_CACHE_BYTES = int(os.getenv('RENDER_CACHE_BYTES', str(8 * 1024 * 1024)))
+RENDER_CACHE_TTL = float(os.getenv('RENDER_CACHE_TTL', '5'))
+
+QR_INDEX_PATH = Path(os.getenv('QR_INDEX_PATH', str(QR_DIRECTORY / 'index.sqlite')))
+
+PNG_COMPRESSION_LEVEL = int(os.getenv('PNG_COMPRESSION_LEVEL', '6'))
+PNG_FILTER = os.getenv('PNG_FILTER', 'none')
+PNG_ZLIB_STRATEGY = os.getenv('PNG_ZLIB_STRATEGY', 'default')
+
+AUTH_CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', '10000'))
+AUTH_CACHE_TTL = float(os.getenv('AUTH_CACHE_TTL', '300'))
+REVOCATION_PATH = Path(os.getenv('REVOCATION_PATH', str(QR_DIRECTORY / 'revocations.sqlite')))
+
+STORAGE_DRIVER = os.getenv('STORAGE_DRIVER', 'flat')
+S3_BUCKET = os.getenv('S3_BUCKET', '')
+S3_PREFIX = os.getenv('S3_PREFIX', '')
+S3_ENDPOINT_URL = os.getenv('S3_ENDPOINT_URL') or None
+S3_PUBLIC_URL = os.getenv('S3_PUBLIC_URL', '')
+
+WARMUP_CONCURRENCY = int(os.getenv('WARMUP_CONCURRENCY', '0'))
+
+EXPIRY_SWEEP_INTERVAL = float(os.getenv('EXPIRY_SWEEP_INTERVAL', '60'))
+EXPIRY_SWEEP_BATCH_SIZE = int(os.getenv('EXPIRY_SWEEP_BATCH_SIZE', '500'))
+
+JOB_QUEUE_PATH = Path(os.getenv('JOB_QUEUE_PATH', str(QR_DIRECTORY / 'jobs.sqlite')))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '300'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '1'))
+JOB_RETENTION = float(os.getenv('JOB_RETENTION', '86400'))
+
+RATE_LIMIT_RATE = float(os.getenv('RATE_LIMIT_RATE', '10'))
+RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', '50'))
+RENDER_CONCURRENCY_PER_SUBJECT = int(os.getenv('RENDER_CONCURRENCY_PER_SUBJECT', '4'))
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+RATE_LIMIT_PATH = Path(os.getenv('RATE_LIMIT_PATH', str(QR_DIRECTORY / 'ratelimit.sqlite')))
+
+LOG_CONFIG = Path(os.getenv('LOG_CONFIG', 'logging.conf'))
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv('LOG_DEBUG_SAMPLE_RATE', '1'))
+
+SHARED_CACHE_BYTES = int(os.getenv('SHARED_CACHE_BYTES', str(32 * 1024 * 1024)))
+SHARED_CACHE_SLOT_BYTES = int(os.getenv('SHARED_CACHE_SLOT_BYTES', '16384'))
+SHARED_CACHE_PATH = Path(os.getenv('SHARED_CACHE_PATH', '/dev/shm/qr-render-cache'))
@@ -0,0 +1,77 @@
+"""
+This module contains the FastAPI dependencies shared by the routers, such as
+authentication of the bearer token on protected endpoints and rate limiting of
+the render path.
+"""
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordBearer
+
+from app.config import ADMIN_USER
+from app.services.rate_limit import rate_limiter
+from app.services.token_cache import token_cache
+from app.utils.common import validate_jwt_token
+
+# Setup OAuth2 with Password (and hashing), using a simple OAuth2PasswordBearer scheme
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+
+
+def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+    """
+    Verifies the bearer token and returns its claims.
+
+    Verified claims are served from the token cache until the token expires or
+    the cache TTL elapses, whichever comes first; revoked tokens are rejected even
+    when cached.
+    """
+    claims = token_cache.get(token)
+    if claims is None:
+        try:
+            claims = validate_jwt_token(token)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid or expired token",
+                headers={"WWW-Authenticate": "Bearer"},
+            ) from e
+        token_cache.put(token, claims)
+    if token_cache.is_revoked(token, claims):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return claims
+
+
+def require_admin(current_user: dict = Depends(get_current_user)) -> dict:
+    """
+    Restricts an endpoint to the administrator account.
+    """
+    if current_user.get("sub") != ADMIN_USER:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Administrator access required"
+        )
+    return current_user
+
+
+async def enforce_rate_limit(request: Request,
+                             current_user: dict = Depends(get_current_user)) -> dict:
+    """
+    Takes a token from the rate limit bucket of the token's subject, rejecting the
+    request with 429 when it is empty, and returns the claims.
+
+    The RateLimit headers of admitted requests are added to their response by
+    RateLimitHeadersMiddleware.
+    """
+    decision = await rate_limiter.check(current_user.get("sub", ""))
+    if decision is None:
+        return current_user
+    if not decision.allowed:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded, please retry later.",
+            headers=decision.headers(),
+        )
+    request.state.rate_limit_headers = decision.headers()
+    return current_user
@@ -4,17 +4,59 @@ the FastAPI app, sets up the logging configuration, and includes routes for
 managing QR codes and handling OAuth authentication.
 """
 
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
 from pydantic import HttpUrl
-from app.config import QR_DIRECTORY
-from app.routers import qr_code, oauth
+from app.config import EXPIRY_SWEEP_INTERVAL, JOB_WORKERS, QR_DIRECTORY, QR_INDEX_PATH
+from app.routers import admin, downloads, jobs, metrics, qr_code, oauth
+from app.services.expiry import run_sweeper
+from app.services.job_queue import job_queue
+from app.services.job_worker import job_worker
+from app.services.log_pipeline import RequestLogContextMiddleware, setup_logging
+from app.services.metrics import MetricsMiddleware
+from app.services.rate_limit import RateLimitHeadersMiddleware, rate_limiter
+from app.services.qr_index import qr_index
 from app.services.qr_service import create_directory
-from app.utils.common import setup_logging
+from app.services.render_executor import render_executor
+from app.services.shared_cache import shared_cache
+from app.services.storage import qr_storage
+from app.services.token_cache import token_cache
 from app.schema import QRCodeRequest, QRCodeResponse, Link
 
 setup_logging()
 
-create_directory(QR_DIRECTORY)
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """
+    Prepares the QR code directory, starts the render workers before serving requests
+    and drains them on shutdown. A missing metadata index is built from the existing
+    store first. Expired QR codes are swept in the background every
+    EXPIRY_SWEEP_INTERVAL seconds, unless it is 0, and JOB_WORKERS tasks run the
+    queued render jobs.
+
+    Nothing touches the filesystem at import time, so importing the app (for instance
+    in a ``gunicorn --preload`` master) stays cheap and side-effect free.
+    """
+    create_directory(QR_DIRECTORY)
+    if not QR_INDEX_PATH.exists():
+        await asyncio.to_thread(qr_index.rebuild, qr_storage)
+    render_executor.start()
+    sweeper = asyncio.create_task(run_sweeper()) if EXPIRY_SWEEP_INTERVAL > 0 else None
+    if JOB_WORKERS > 0:
+        job_worker.start()
+    yield
+    await job_worker.stop()
+    if sweeper is not None:
+        sweeper.cancel()
+        with suppress(asyncio.CancelledError):
+            await sweeper
+    render_executor.shutdown(wait=True)
+    qr_index.close()
+    job_queue.close()
+    rate_limiter.store.close()
+    shared_cache.close()
+    token_cache.revocations.close()
 
 app = FastAPI(
     title="QR Code Manager",
@@ -23,6 +65,7 @@ app = FastAPI(
         "It also supports OAuth for secure access."
     ),
     version="0.0.1",
+    lifespan=lifespan,
     redoc_url=None,
     contact={
         "name": "API Support",
@@ -35,8 +78,16 @@ app = FastAPI(
     }
 )
 
+app.add_middleware(RateLimitHeadersMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestLogContextMiddleware)
+
 app.include_router(qr_code.router)
 app.include_router(oauth.router)
+app.include_router(metrics.router)
+app.include_router(admin.router)
+app.include_router(downloads.router)
+app.include_router(jobs.router)
 
 @app.get("/")
 async def read_root():
@@ -0,0 +1,79 @@
+# Disable specific pylint warnings
+# pylint: disable=unused-argument
+"""
+This module contains the administrative API routes, such as warming up the render
+cache ahead of a campaign.
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from typing import List, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import JSONResponse
+
+from app.dependencies import require_admin
+from app.services.warmup import WarmupProgress, warm_up
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+# Recent warm-up jobs by id; the oldest are forgotten first.
+MAX_WARMUP_JOBS = 32
+warmup_jobs: "OrderedDict[str, WarmupProgress]" = OrderedDict()
+# Running warm-up tasks, referenced so they are not garbage collected.
+warmup_tasks = set()
+
+
+@router.post("/warmup", status_code=status.HTTP_202_ACCEPTED)
+async def start_warmup(
+    request: Request,
+    sizes: List[int] = Query(default=[], description="Box sizes to render every URL at."),
+    formats: List[Literal["png", "svg", "pdf", "eps"]] = Query(
+        default=[], description="Formats to render every URL in."
+    ),
+    current_user: dict = Depends(require_admin)
+):
+    """
+    Starts pre-rendering the QR codes of a URL list in the background.
+
+    The body holds one URL or JSON QR code request per line. The job shares the
+    render workers with live traffic, using half of them; codes already stored are
+    skipped, so posting the same list again resumes an interrupted warm-up cheaply.
+    Progress and throughput are reported by ``GET /admin/warmup/{job_id}``.
+    """
+    body = await request.body()
+    try:
+        lines = body.decode("utf-8").splitlines()
+    except UnicodeDecodeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Body must be UTF-8 text"
+        ) from e
+
+    job_id = uuid.uuid4().hex
+    progress = WarmupProgress(total=len(lines))
+    warmup_jobs[job_id] = progress
+    while len(warmup_jobs) > MAX_WARMUP_JOBS:
+        warmup_jobs.popitem(last=False)
+
+    task = asyncio.create_task(warm_up(lines, sizes=sizes, formats=formats, progress=progress))
+    warmup_tasks.add(task)
+    task.add_done_callback(warmup_tasks.discard)
+    logging.info("Warm-up %s started for %d lines", job_id, len(lines))
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={"job_id": job_id, **progress.as_dict()},
+        headers={"Location": f"/admin/warmup/{job_id}"},
+    )
+
+
+@router.get("/warmup/{job_id}")
+async def read_warmup(job_id: str, current_user: dict = Depends(require_admin)):
+    """
+    Reports the progress and throughput of a warm-up job.
+    """
+    progress = warmup_jobs.get(job_id)
+    if progress is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Warm-up job not found")
+    return {"job_id": job_id, **progress.as_dict()}
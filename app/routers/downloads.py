@@ -0,0 +1,137 @@
+"""
+This module contains the route serving stored QR code files.
+
+Download URLs of the local storage drivers point here, under SERVER_DOWNLOAD_FOLDER,
+so every download is checked against the index (expired codes answer 410) and
+carries validators and caching headers tied to the file content. Conditional
+requests are answered with 304, single byte ranges with 206, and whole files are
+sent with FileResponse, which uses the server's zero-copy path when it offers one.
+"""
+
+import asyncio
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import AsyncIterator, Optional
+
+import anyio
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+
+from app.config import SERVER_DOWNLOAD_FOLDER
+from app.services.downloads import cache_control, etag_cache
+from app.services.qr_index import qr_index
+from app.services.qr_service import RENDER_FORMATS, is_qr_code_file, media_type
+from app.services.storage import qr_storage
+from app.utils.common import etag_matches, parse_byte_range
+
+router = APIRouter()
+
+# Size of the chunks a byte range is sent in
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+def modified_since(if_modified_since: Optional[str], mtime: float) -> bool:
+    """
+    Checks whether a file changed after the time in an If-Modified-Since header;
+    a missing or unparsable header counts as changed.
+    """
+    if not if_modified_since:
+        return True
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return True
+    # HTTP dates have a resolution of one second
+    return int(mtime) > since.timestamp()
+
+
+def range_applies(if_range: Optional[str], etag: str, last_modified: str) -> bool:
+    """
+    Checks an If-Range header: a range is only served from the representation the
+    client already holds part of, identified by its strong entity tag or exact date.
+    """
+    return not if_range or if_range.strip() in (etag, last_modified)
+
+
+async def read_range(path: str, start: int, end: int) -> AsyncIterator[bytes]:
+    """
+    Yields bytes ``start`` to ``end`` of a file, inclusive, in chunks.
+    """
+    async with await anyio.open_file(path, mode="rb") as file:
+        await file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await file.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+@router.api_route(
+    f"/{SERVER_DOWNLOAD_FOLDER}/{{key:path}}",
+    methods=["GET", "HEAD"],
+    tags=["QR Codes"],
+    responses={200: {"content": {media_type: {} for media_type in RENDER_FORMATS.values()}}}
+)
+async def download_qr_code(key: str, request: Request):
+    """
+    Serves a stored QR code file by its storage key, as found in download URLs.
+
+    The strong ETag is the SHA-256 digest of the file. Content-addressed files are
+    cacheable as immutable, expiring ones until they expire. Remote stores are not
+    proxied: the client is redirected to the object's public URL.
+    """
+    qr_filename = key.rpartition('/')[2]
+    if not is_qr_code_file(qr_filename) or qr_storage.key(qr_filename) != key:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="QR code not found")
+    entry = await asyncio.to_thread(qr_index.get, qr_filename)
+    if entry is not None and entry.is_expired():
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="QR code has expired")
+    if qr_storage.remote:
+        return RedirectResponse(qr_storage.url(qr_filename),
+                                status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+    path = qr_storage.local_path(qr_filename)
+    try:
+        stat_result = await asyncio.to_thread(os.stat, path)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail="QR code not found") from e
+    size, mtime_ns = stat_result.st_size, stat_result.st_mtime_ns
+    etag = etag_cache.get(path, size, mtime_ns)
+    if etag is None:
+        etag = await asyncio.to_thread(etag_cache.etag, path, size, mtime_ns)
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": cache_control(qr_filename, entry.expires_at if entry else None),
+        "Accept-Ranges": "bytes",
+    }
+
+    # If-Modified-Since is only considered when the client sent no entity tag
+    if_none_match = request.headers.get("if-none-match")
+    if (etag_matches(if_none_match, etag) if if_none_match
+            else not modified_since(request.headers.get("if-modified-since"),
+                                    stat_result.st_mtime)):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header and range_applies(request.headers.get("if-range"), etag, last_modified):
+        try:
+            byte_range = parse_byte_range(range_header, size)
+        except ValueError:
+            return Response(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                            headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type(qr_filename), headers=headers,
+                            stat_result=stat_result)
+
+    start, end = byte_range
+    headers.update({"Content-Range": f"bytes {start}-{end}/{size}",
+                    "Content-Length": str(end - start + 1)})
+    body = read_range(str(path), start, end) if request.method == "GET" else iter(())
+    return StreamingResponse(body, status_code=status.HTTP_206_PARTIAL_CONTENT,
+                             media_type=media_type(qr_filename), headers=headers)
@@ -0,0 +1,71 @@
+"""
+This module contains the routes of asynchronous render jobs.
+
+``POST /qr-codes/?async=true`` queues the render of a QR code that is not stored
+yet and answers 202 Accepted with a job; the job is then polled here until it is
+done or failed.
+"""
+
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import JSONResponse
+
+from app.config import RENDER_RETRY_AFTER, SERVER_BASE_URL
+from app.dependencies import get_current_user
+from app.schema import JobStatus, QRCodeRequest
+from app.services.job_queue import Job, job_queue
+from app.services.job_worker import job_worker
+from app.services.qr_service import media_type
+from app.services.storage import qr_storage
+from app.utils.common import generate_links
+
+router = APIRouter(tags=["Jobs"])
+
+
+def job_status(job: Job) -> JobStatus:
+    """
+    Describes a job: while it is pending, with a link to its status; once it is done,
+    with the URL and links of its QR code.
+    """
+    if job.status != "done":
+        self_link = {
+            "rel": "self",
+            "href": f"{SERVER_BASE_URL}/jobs/{job.id}",
+            "action": "GET",
+            "type": "application/json"
+        }
+        return JobStatus(job_id=job.id, status=job.status, created_at=job.created_at,
+                         updated_at=job.updated_at, error=job.error, links=[self_link])
+    qr_filename = job.result["filename"]
+    qr_code_download_url = qr_storage.url(qr_filename)
+    return JobStatus(
+        job_id=job.id, status=job.status, created_at=job.created_at, updated_at=job.updated_at,
+        qr_code_url=qr_code_download_url,
+        links=generate_links(qr_filename, SERVER_BASE_URL, qr_code_download_url,
+                             media_type(qr_filename))
+    )
+
+
+async def accept_job(request: QRCodeRequest, current_user: dict) -> JSONResponse:
+    """
+    Queues the render of a QR code and answers 202 Accepted with the job, pointing
+    to its status with the Location header.
+    """
+    job = await job_worker.submit(request, current_user.get("sub"))
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=job_status(job).model_dump(mode="json"),
+        headers={"Location": f"/jobs/{job.id}", "Retry-After": str(RENDER_RETRY_AFTER)},
+    )
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def read_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Reports the status of a render job submitted by the current user.
+    """
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None or job.subject != current_user.get("sub"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job_status(job)
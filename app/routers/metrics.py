@@ -0,0 +1,19 @@
+"""
+This module contains the route exposing the application metrics to Prometheus.
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.services.metrics import registry
+
+router = APIRouter()
+
+# Version 0.0.4 of the Prometheus text exposition format
+METRICS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def read_metrics():
+    """
+    Returns the current value of every metric in the Prometheus text format.
+    """
+    return PlainTextResponse(registry.exposition(), media_type=METRICS_MEDIA_TYPE)
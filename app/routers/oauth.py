@@ -2,8 +2,10 @@
 This module contains the OAuth2 routes and logic for authentication, token generation, and security.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
+from app.dependencies import get_current_user, oauth2_scheme
+from app.services.token_cache import token_cache
 from app.utils.common import authenticate_user, create_access_token
 
 router = APIRouter()
@@ -22,3 +24,13 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
         )
     access_token = create_access_token(data={"sub": user['username']})
     return {"access_token": access_token, "token_type": "bearer"}
+
+@router.post("/token/revoke", status_code=status.HTTP_204_NO_CONTENT)
+def revoke_access_token(
+    token: str = Depends(oauth2_scheme), current_user: dict = Depends(get_current_user)
+):
+    """
+    Revokes the bearer token of the request; it is rejected from then on until it expires.
+    """
+    token_cache.revoke(token, current_user)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -7,104 +7,444 @@ retrieving existing QR codes, and deleting them, with support for OAuth2 authent
 """
 
 # Import necessary modules and functions from FastAPI and other standard libraries
+import asyncio
+import json
 import logging
-from typing import List
-from fastapi import APIRouter, HTTPException, Depends, Response, status
-from fastapi.responses import JSONResponse
-from fastapi.security import OAuth2PasswordBearer
+from datetime import datetime
+from typing import Any, AsyncIterator, Iterator, List, Literal, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from qrcode.exceptions import DataOverflowError
+from pydantic import ValidationError
 
 # Import classes and functions from our application's modules
-from app.schema import QRCodeRequest, QRCodeResponse
-from app.services.qr_service import generate_qr_code, list_qr_codes, delete_qr_code
-from app.utils.common import decode_filename_to_url, encode_url_to_filename, generate_links
-from app.config import QR_DIRECTORY, SERVER_BASE_URL, FILL_COLOR, BACK_COLOR, SERVER_DOWNLOAD_FOLDER
+from app.dependencies import enforce_rate_limit, get_current_user
+from app.schema import JobStatus, QRCodeRequest, QRCodeResponse
+from app.routers.jobs import accept_job
+from app.services.artifacts import artifact_name, ensure_qr_code, is_stored, render_params
+from app.services.downloads import IMMUTABLE_CACHE_CONTROL
+from app.services.export import ARCHIVE_MEDIA_TYPES, export_entries, stream_archive
+from app.services.qr_index import qr_index
+from app.services.qr_service import (
+    RENDER_FORMATS, delete_qr_code, is_qr_code_file, media_type, render_qr_code
+)
+from app.services.rate_limit import ConcurrencyLimitExceeded, rate_limiter
+from app.services.render_cache import render_cache, render_key
+from app.services.render_executor import RenderUnavailable, render_executor
+from app.services.shared_cache import shared_cache
+from app.services.single_flight import render_flight
+from app.services.storage import qr_storage
+from app.utils.colors import parse_color
+from app.utils.common import etag_matches, generate_links
+from app.config import (
+    SERVER_BASE_URL, QR_BORDER, QR_ERROR_CORRECTION,
+    FILL_COLOR, BACK_COLOR, RENDER_RETRY_AFTER
+)
 # Create an APIRouter instance to register our endpoints
 router = APIRouter()
 
-# Setup OAuth2 with Password (and hashing), using a simple OAuth2PasswordBearer scheme
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+def download_url(qr_filename: str) -> str:
+    """
+    Returns the public download URL of a stored QR code.
+    """
+    return qr_storage.url(qr_filename)
+
+def too_many_renders(error: ConcurrencyLimitExceeded) -> HTTPException:
+    """
+    Builds the 429 response of a user whose concurrent render slots are all taken.
+    """
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=f"{error}, please retry later.",
+        headers={"Retry-After": str(RENDER_RETRY_AFTER)}
+    )
 
 # Define an endpoint to create QR codes
 @router.post(
     "/qr-codes/",
     response_model=QRCodeResponse,
     status_code=status.HTTP_200_OK,
-    tags=["QR Codes"]
+    tags=["QR Codes"],
+    responses={202: {"model": JobStatus, "description": "The render was queued as a job."}}
 )
-async def create_qr_code(request: QRCodeRequest, token: str = Depends(oauth2_scheme)):
+async def create_qr_code(
+    request: QRCodeRequest,
+    run_async: bool = Query(default=False, alias="async",
+                            description="Queue the render as a job instead of waiting."),
+    current_user: dict = Depends(enforce_rate_limit)
+):
     """
     Creates a QR code for the given URL and returns the download URL.
+
+    With ``async=true``, a QR code that is not stored yet is rendered by a background
+    job: the response is 202 Accepted with the job, to be polled at ``GET /jobs/{id}``.
+
+    Requests are rate limited per user, and a user may only have a few renders in
+    flight at once; both limits are answered with 429 Too Many Requests.
     """
     logging.info("Creating QR code for URL: %s", request.url)
 
-    # Using keyword arguments
-    encoded_url = encode_url_to_filename(request.url)
-    qr_filename = f"{encoded_url}.png"
-    qr_code_full_path = QR_DIRECTORY / qr_filename
+    if run_async and not await is_stored(*artifact_name(request)):
+        return await accept_job(request, current_user)
 
-    qr_code_download_url = (
-        f"{SERVER_BASE_URL}/{SERVER_DOWNLOAD_FOLDER}/{qr_filename}"
-    )
+    try:
+        qr_filename, created = await ensure_qr_code(request, current_user.get("sub", ""))
+    except ConcurrencyLimitExceeded as e:
+        raise too_many_renders(e) from e
+    except RenderUnavailable as e:
+        logging.warning("%s, rejecting request for %s", e, request.url)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many QR codes are being rendered, please retry later.",
+            headers={"Retry-After": str(e.retry_after)}
+        ) from e
+
+    qr_code_download_url = download_url(qr_filename)
 
     # Generate HATEOAS links for this resource
-    links = [
-        generate_links(
-            filename=qr_filename,
-            base_url=SERVER_BASE_URL,
-            download_url=qr_code_download_url
-        )
-    ]
+    links = generate_links(
+        filename=qr_filename,
+        base_url=SERVER_BASE_URL,
+        download_url=qr_code_download_url,
+        media_type=media_type(qr_filename)
+    )
 
-    # Check if the QR code already exists
-    if qr_code_full_path.exists():
+    # Check if the QR code already existed
+    if not created:
         logging.info("QR code already exists.")
         return JSONResponse(
             status_code=status.HTTP_200_OK,
             content={"message": "QR code already exists.", "links": links}
         )
 
-    # Generate the QR code using keyword arguments
-    generate_qr_code(
-        data=request.url,
-        path=qr_code_full_path,
-        fill_color=FILL_COLOR,
-        back_color=BACK_COLOR,
-        size=request.size
-    )
-
     return QRCodeResponse(
         message="QR code created successfully.",
         qr_code_url=qr_code_download_url,
         links=links
     )
 
+async def read_batch_items(request: Request) -> Iterator[Any]:
+    """
+    Reads a batch request body and returns an iterator over its raw items.
+
+    The whole body is read before the streamed response starts, because the request
+    stream cannot be consumed while the response is being sent. NDJSON bodies
+    (``Content-Type: application/x-ndjson``) are then parsed one line at a time as
+    the iterator is consumed; lines that are not valid JSON are yielded as their
+    ``ValueError``. Any other body must be a JSON list.
+    """
+    content_type = request.headers.get("content-type", "")
+    body = await request.body()
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        return (parse_ndjson_line(line) for line in body.splitlines() if line.strip())
+
+    try:
+        items = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Body is not valid JSON"
+        ) from e
+    if not isinstance(items, list):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Body must be a list of QR code requests"
+        )
+    return iter(items)
+
+def parse_ndjson_line(line: bytes) -> Any:
+    """
+    Parses one NDJSON line, returning the ``ValueError`` instead of raising it.
+    """
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return e
+
+async def batch_item_result(index: int, request: QRCodeRequest, subject: str) -> dict:
+    """
+    Renders one batch item for the user and describes the outcome as a result line.
+    """
+    result = {"index": index, "url": str(request.url)}
+    try:
+        qr_filename, created = await ensure_qr_code(request, subject)
+    except ConcurrencyLimitExceeded as e:
+        result.update(status=status.HTTP_429_TOO_MANY_REQUESTS,
+                      error=str(e), retry_after=RENDER_RETRY_AFTER)
+        return result
+    except RenderUnavailable as e:
+        result.update(status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                      error=str(e), retry_after=e.retry_after)
+        return result
+    except Exception as e:  # pylint: disable=broad-except
+        logging.error("Batch item %d failed: %s", index, e)
+        result.update(status=status.HTTP_500_INTERNAL_SERVER_ERROR, error=str(e))
+        return result
+
+    qr_code_download_url = download_url(qr_filename)
+    result.update(
+        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        qr_code_url=qr_code_download_url,
+        links=generate_links(qr_filename, SERVER_BASE_URL, qr_code_download_url,
+                             media_type(qr_filename))
+    )
+    return result
+
+async def stream_batch_results(items: Iterator[Any], subject: str) -> AsyncIterator[bytes]:
+    """
+    Validates, deduplicates and renders batch items for the user, yielding one NDJSON
+    line per item as soon as its outcome is known.
+
+    At most one render per executor worker is in flight for the batch, and no more than
+    the user's concurrent render cap, so a large batch neither floods the render queue
+    nor buffers its results.
+    """
+    max_in_flight = render_executor.max_workers
+    if rate_limiter.max_renders > 0:
+        max_in_flight = min(max_in_flight, rate_limiter.max_renders)
+    in_flight = set()
+    first_index_by_key = {}
+    for index, item in enumerate(items):
+        if isinstance(item, ValueError):
+            yield ndjson_line({
+                "index": index,
+                "status": status.HTTP_400_BAD_REQUEST,
+                "error": f"Invalid JSON: {item}"
+            })
+            continue
+        try:
+            qr_request = QRCodeRequest.model_validate(item)
+        except ValidationError as e:
+            yield ndjson_line({
+                "index": index,
+                "status": status.HTTP_422_UNPROCESSABLE_ENTITY,
+                "error": json.loads(e.json(include_url=False))
+            })
+            continue
+
+        cache_key = render_key(**render_params(qr_request))
+        if cache_key in first_index_by_key:
+            yield ndjson_line({
+                "index": index,
+                "url": str(qr_request.url),
+                "status": status.HTTP_200_OK,
+                "duplicate_of": first_index_by_key[cache_key]
+            })
+            continue
+        first_index_by_key[cache_key] = index
+
+        in_flight.add(asyncio.ensure_future(batch_item_result(index, qr_request, subject)))
+        if len(in_flight) >= max_in_flight:
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield ndjson_line(task.result())
+
+    while in_flight:
+        done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            yield ndjson_line(task.result())
+
+def ndjson_line(result: dict) -> bytes:
+    """
+    Serializes one result as an NDJSON line.
+    """
+    return json.dumps(result).encode("utf-8") + b"\n"
+
+# Define an endpoint to create QR codes in bulk
+@router.post(
+    "/qr-codes/batch",
+    status_code=status.HTTP_200_OK,
+    tags=["QR Codes"]
+)
+async def create_qr_codes_batch(request: Request,
+                                current_user: dict = Depends(enforce_rate_limit)):
+    """
+    Creates QR codes for a batch of requests and streams one NDJSON result per item.
+
+    The body is either a JSON list of QR code requests or NDJSON with one request per
+    line (``Content-Type: application/x-ndjson``). Identical items are rendered once,
+    and results are streamed in completion order; each carries the ``index`` of its item.
+
+    The batch counts as one request against the rate limit, while its renders take the
+    user's concurrent render slots; an item rejected for lack of a slot is reported with
+    status 429.
+    """
+    logging.info("Creating QR codes in batch.")
+    items = await read_batch_items(request)
+    return StreamingResponse(
+        stream_batch_results(items, current_user.get("sub", "")),
+        media_type="application/x-ndjson"
+    )
+
 # Define an endpoint to list all QR codes
 @router.get("/qr-codes/", response_model=List[QRCodeResponse], tags=["QR Codes"])
-async def list_qr_codes_endpoint():
+async def list_qr_codes_endpoint(
+    response: Response,
+    limit: int = Query(default=100, ge=1, le=1000, description="Maximum number of QR codes."),
+    cursor: Optional[str] = Query(default=None, description="Cursor from X-Next-Cursor."),
+    prefix: Optional[str] = Query(default=None, description="Only data starting with this."),
+    created_after: Optional[datetime] = Query(default=None),
+    created_before: Optional[datetime] = Query(default=None),
+    url: Optional[str] = Query(default=None, description="Only QR codes encoding this URL.")
+):
     """
-    Lists all QR codes and their download URLs.
+    Lists unexpired QR codes and their download URLs, oldest first, one page at a time.
 
-    This endpoint retrieves all QR codes stored in the system and returns their
-    respective URLs and HATEOAS links.
+    This endpoint reads the metadata index, so its cost depends on the page size rather
+    than on the number of stored QR codes; looking codes up by ``url`` is an indexed
+    equality match. When more results are available, the ``X-Next-Cursor`` response
+    header holds the cursor of the next page.
     """
-    logging.info("Listing all QR codes.")
+    logging.info("Listing QR codes.")
 
-    # Retrieve all QR code files
-    qr_files = list_qr_codes(QR_DIRECTORY)
+    try:
+        entries, next_cursor = await asyncio.to_thread(
+            qr_index.page, limit, cursor, prefix, created_after, created_before, url
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)) from e
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
     # Create a response object for each QR code
-    responses = [
+    return [
         QRCodeResponse(
             message="QR code available",
-            qr_code_url=decode_filename_to_url(qr_file[:-4]),
-            links=generate_links(
-                "list", qr_file, SERVER_BASE_URL,
-                f"{SERVER_BASE_URL}/{SERVER_DOWNLOAD_FOLDER}/{qr_file}"
-            )
+            qr_code_url=entry.data,
+            links=generate_links(entry.filename, SERVER_BASE_URL, download_url(entry.filename),
+                                 media_type(entry.filename)),
+            expires_at=entry.expires_at
         )
-        for qr_file in qr_files  # Adjusted to ensure no line is too long
+        for entry in entries
     ]
-    return responses
+
+# Define an endpoint to render QR codes straight into the response
+@router.get(
+    "/qr-codes/render",
+    status_code=status.HTTP_200_OK,
+    tags=["QR Codes"],
+    responses={200: {"content": {media_type: {} for media_type in RENDER_FORMATS.values()}}}
+)
+async def render_qr_code_endpoint(
+    request: Request,
+    data: str = Query(..., min_length=1, max_length=7089, description="The data to encode."),
+    size: int = Query(default=10, ge=1, le=40, description="Size of each box in pixels."),
+    fmt: Literal["png", "svg", "pdf", "eps"] = Query(default="png", alias="format"),
+    fill_color: str = Query(default=FILL_COLOR, max_length=32),
+    back_color: str = Query(default=BACK_COLOR, max_length=32),
+    error_correction: Literal["L", "M", "Q", "H"] = Query(default=QR_ERROR_CORRECTION.upper()),
+    border: int = Query(default=QR_BORDER, ge=0, le=20, description="Quiet zone, in modules."),
+    current_user: dict = Depends(enforce_rate_limit)
+):
+    """
+    Renders an ephemeral QR code in memory and returns the image itself.
+
+    Nothing is stored on disk. The strong ETag is the content address of the render
+    parameters, so a matching If-None-Match is answered with 304 without rendering.
+    Images rendered by any worker of the host are served from the shared render
+    cache until evicted.
+    """
+    params = {
+        "data": data,
+        "size": size,
+        "fill_color": fill_color,
+        "back_color": back_color,
+        "border": border,
+        "error_correction": error_correction,
+        "fmt": fmt,
+    }
+    for color in (fill_color, back_color):
+        try:
+            parse_color(color)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
+            ) from e
+    cache_key = render_key(**params)
+    headers = {"ETag": f'"{cache_key}"', "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    body = shared_cache.get(cache_key)
+    if body is not None:
+        return Response(content=body, media_type=RENDER_FORMATS[fmt], headers=headers)
+
+    try:
+        flight_key = f"render:{cache_key}"
+        # Joining a render already in flight takes no render slot.
+        subject = None if render_flight.in_flight(flight_key) else current_user.get("sub", "")
+        async with rate_limiter.render_slot(subject):
+            body = await render_flight.do(
+                flight_key, render_executor.submit, render_qr_code, **params
+            )
+    except ConcurrencyLimitExceeded as e:
+        raise too_many_renders(e) from e
+    except RenderUnavailable as e:
+        logging.warning("%s, rejecting render of %d bytes", e, len(data))
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many QR codes are being rendered, please retry later.",
+            headers={"Retry-After": str(e.retry_after)}
+        ) from e
+    except DataOverflowError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Data is too long to fit in a QR code."
+        ) from e
+
+    shared_cache.put(cache_key, body)
+    return Response(content=body, media_type=RENDER_FORMATS[fmt], headers=headers)
+
+# Define an endpoint to export QR codes as an archive
+@router.get(
+    "/qr-codes/export",
+    status_code=status.HTTP_200_OK,
+    tags=["QR Codes"],
+    responses={200: {"content": {media_type: {} for media_type in ARCHIVE_MEDIA_TYPES.values()}}}
+)
+async def export_qr_codes_endpoint(
+    fmt: Literal["zip", "tar"] = Query(default="zip", alias="format"),
+    prefix: Optional[str] = Query(default=None, description="Only data starting with this."),
+    created_after: Optional[datetime] = Query(default=None),
+    created_before: Optional[datetime] = Query(default=None),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Streams a ZIP or TAR archive of the unexpired QR codes matching the filters, with
+    a ``manifest.csv`` listing their filename, data, creation and expiry times and size.
+
+    The archive is written while it is sent, one file at a time, so exporting a large
+    campaign neither buffers the archive nor delays the first byte.
+    """
+    logging.info("Exporting QR codes as %s.", fmt)
+    entries = export_entries(qr_index, prefix, created_after, created_before)
+    return StreamingResponse(
+        stream_archive(fmt, entries, qr_storage),
+        media_type=ARCHIVE_MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="qr-codes.{fmt}"'}
+    )
+
+# Define an endpoint to describe a stored QR code
+@router.get("/qr-codes/{qr_filename}", response_model=QRCodeResponse, tags=["QR Codes"])
+async def get_qr_code_endpoint(qr_filename: str):
+    """
+    Describes a stored QR code: the data it encodes, its links and, if it expires,
+    its expiry time.
+
+    This endpoint reads the metadata index only. A code past its expiry time is
+    answered with 410 Gone, even before the sweeper has deleted it.
+    """
+    entry = await asyncio.to_thread(qr_index.get, qr_filename)
+    if entry is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="QR code not found")
+    if entry.is_expired():
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="QR code has expired")
+    return QRCodeResponse(
+        message="QR code available",
+        qr_code_url=entry.data,
+        links=generate_links(entry.filename, SERVER_BASE_URL, download_url(entry.filename),
+                             media_type(entry.filename)),
+        expires_at=entry.expires_at
+    )
 
 # Define an endpoint to delete a QR code by filename
 @router.delete(
@@ -112,16 +452,22 @@ async def list_qr_codes_endpoint():
     status_code=status.HTTP_200_OK,
     tags=["QR Codes"]
 )
-async def delete_qr_code_endpoint(qr_filename: str, token: str = Depends(oauth2_scheme)):
+async def delete_qr_code_endpoint(qr_filename: str, current_user: dict = Depends(get_current_user)):
     """
     Deletes a QR code by filename. This endpoint deletes the specified QR code if it exists.
     """
     logging.info("Deleting QR code: %s.", qr_filename)
-    qr_code_path = QR_DIRECTORY / qr_filename
-
-    if not qr_code_path.is_file():
+    try:
+        # Only QR code images can be deleted, never their metadata or the index.
+        if not is_qr_code_file(qr_filename):
+            raise FileNotFoundError(qr_filename)
+        await asyncio.to_thread(delete_qr_code, qr_filename)
+    except FileNotFoundError as e:
         logging.warning("QR code not found: %s.", qr_filename)
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="QR code not found")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="QR code not found"
+        ) from e
 
-    delete_qr_code(qr_code_path)
+    render_cache.discard(qr_filename.rpartition('.')[0])
+    await asyncio.to_thread(qr_index.remove, qr_filename)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
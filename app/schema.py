@@ -3,23 +3,30 @@ This module defines the Pydantic schemas used for validating and serializing req
 related to QR code generation.
 """
 
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel, HttpUrl, Field, conint
+from pydantic import BaseModel, HttpUrl, Field, conint, field_validator
+
+from app.config import (
+    FILL_COLOR, BACK_COLOR, PNG_COMPRESSION_LEVEL, PNG_FILTER, QR_BORDER, QR_ERROR_CORRECTION
+)
+from app.utils.colors import parse_color
 
 class QRCodeRequest(BaseModel):
     """
     Schema for a QR code request.
-    It includes the URL to be encoded, color settings, and size.
+    It includes the URL to be encoded, color settings, size, error correction level,
+    quiet zone width, format, PNG encoder options and an optional time to live.
     """
     url: HttpUrl = Field(..., description="The URL to encode into the QR code.")
     fill_color: str = Field(
-        default="red",
+        default=FILL_COLOR,
         description="Color of the QR code.",
         example="black"
     )
     back_color: str = Field(
-        default="white",
+        default=BACK_COLOR,
         description="Background color of the QR code.",
         example="yellow"
     )
@@ -28,6 +35,45 @@ class QRCodeRequest(BaseModel):
         description="Size of the QR code from 1 to 40.",
         example=20
     )
+    error_correction: Literal["L", "M", "Q", "H"] = Field(
+        default=QR_ERROR_CORRECTION.upper(),
+        description="Error correction level: L (7%), M (15%), Q (25%) or H (30%).",
+        example="Q"
+    )
+    border: conint(ge=0, le=20) = Field(
+        default=QR_BORDER,
+        description="Width of the quiet zone around the code, in modules.",
+        example=4
+    )
+    format: Literal["png", "svg", "pdf", "eps"] = Field(
+        default="png",
+        description="Output format; svg, pdf and eps are vector formats.",
+        example="svg"
+    )
+    compression_level: conint(ge=0, le=9) = Field(
+        default=PNG_COMPRESSION_LEVEL,
+        description="zlib compression level of the PNG, from 0 to 9.",
+        example=6
+    )
+    png_filter: Literal["none", "up"] = Field(
+        default=PNG_FILTER,
+        description="PNG scanline filter, 'none' or 'up'.",
+        example="none"
+    )
+    ttl_seconds: Optional[conint(ge=1)] = Field(
+        default=None,
+        description="Seconds until the QR code expires and is deleted; omit to keep it.",
+        example=86400
+    )
+
+    @field_validator("fill_color", "back_color")
+    @classmethod
+    def validate_color(cls, value: str) -> str:
+        """
+        Ensures colours are CSS names, hex codes or rgb() triples.
+        """
+        parse_color(value)
+        return value
 
     class Config:  # pylint: disable=too-few-public-methods
         """
@@ -75,6 +121,7 @@ class QRCodeResponse(BaseModel):
     message: str
     qr_code_url: HttpUrl
     links: List[Link] = []
+    expires_at: Optional[datetime] = None
 
     class Config:  # pylint: disable=too-few-public-methods
         """
@@ -97,6 +144,42 @@ class QRCodeResponse(BaseModel):
         }
 
 
+class JobStatus(BaseModel):
+    """
+    Schema for the status of an asynchronous render job.
+    Once the job is done, it includes the URL of the QR code and its links.
+    """
+    job_id: str
+    status: Literal["queued", "running", "done", "failed"]
+    created_at: datetime
+    updated_at: datetime
+    error: Optional[str] = None
+    qr_code_url: Optional[HttpUrl] = None
+    links: List[Link] = []
+
+    class Config:  # pylint: disable=too-few-public-methods
+        """
+        Additional configuration for the JobStatus schema.
+        Includes examples for JSON serialization.
+        """
+        json_schema_extra = {
+            "example": {
+                "job_id": "3f2a9c1e8b7d4e6fa0c5b1d2e3f40516",
+                "status": "queued",
+                "created_at": "2024-01-01T00:00:00+00:00",
+                "updated_at": "2024-01-01T00:00:00+00:00",
+                "links": [
+                    {
+                        "rel": "self",
+                        "href": "https://api.example.com/jobs/3f2a9c1e8b7d4e6fa0c5b1d2e3f40516",
+                        "action": "GET",
+                        "type": "application/json"
+                    }
+                ]
+            }
+        }
+
+
 class Token(BaseModel):
     """
     Schema for the authentication token response.
@@ -0,0 +1,115 @@
+"""
+This module provides the render-or-reuse path shared by every way of creating QR
+codes: single requests, batches and cache warm-ups.
+
+A request is mapped to its render parameters and their content address. The
+artifact is reused when the store already holds it and rendered on the render
+executor otherwise, with concurrent requests for the same artifact sharing one
+render.
+
+A request with a time to live gives the artifact an expiry time; requesting a
+stored artifact again can only push its expiry back, never bring it forward.
+"""
+
+import asyncio
+from typing import Optional, Tuple
+
+from app.schema import QRCodeRequest
+from app.services.expiry import expiry_time, extend_expiry
+from app.services.metrics import RENDER_CACHE_REQUESTS
+from app.services.qr_index import QRIndexEntry, qr_index
+from app.services.qr_service import generate_qr_code
+from app.services.rate_limit import rate_limiter
+from app.services.render_cache import render_cache, render_key
+from app.services.render_executor import render_executor
+from app.services.single_flight import render_flight
+from app.services.storage import qr_storage
+
+
+def render_params(request: QRCodeRequest) -> dict:
+    """
+    Collects every parameter that affects the rendered artifact for a request.
+    These parameters are the arguments of generate_qr_code; all but the encoder
+    options also form the cache key.
+    """
+    return {
+        "data": str(request.url),
+        "size": request.size,
+        "fill_color": request.fill_color,
+        "back_color": request.back_color,
+        "border": request.border,
+        "error_correction": request.error_correction,
+        "fmt": request.format,
+        "compression_level": request.compression_level,
+        "png_filter": request.png_filter,
+    }
+
+
+def artifact_name(request: QRCodeRequest) -> Tuple[str, str]:
+    """
+    Returns the content address of the artifact a request describes and the
+    filename it is stored under.
+    """
+    params = render_params(request)
+    cache_key = render_key(**params)
+    return cache_key, f"{cache_key}.{params['fmt']}"
+
+
+async def is_stored(cache_key: str, qr_filename: str) -> bool:
+    """
+    Checks whether a QR code is stored, through the render cache. Remote stores are
+    looked up on a thread so the event loop never waits on the network.
+    """
+    if qr_storage.remote:
+        return await asyncio.to_thread(render_cache.exists, cache_key, qr_filename, qr_storage)
+    return render_cache.exists(cache_key, qr_filename, qr_storage)
+
+
+async def ensure_qr_code(request: QRCodeRequest,
+                         subject: Optional[str] = None) -> Tuple[str, bool]:
+    """
+    Makes sure the QR code described by the request is stored, rendering it if needed.
+
+    Parameters:
+    - request (QRCodeRequest): The QR code to store.
+    - subject (str): The user asking for it; a render then takes one of the user's
+      concurrent render slots. Stored codes take none.
+
+    Returns:
+    - The stored filename and whether it was rendered by this call.
+
+    Raises:
+    - RenderUnavailable: If the render executor is saturated or its workers crashed.
+    - ConcurrencyLimitExceeded: If the subject already has every render slot taken.
+    """
+    # The filename is the content address of the full render parameters
+    params = render_params(request)
+    cache_key = render_key(**params)
+    qr_filename = f"{cache_key}.{params['fmt']}"
+    expires_at = expiry_time(request.ttl_seconds)
+
+    if await is_stored(cache_key, qr_filename):
+        RENDER_CACHE_REQUESTS.inc(result="hit")
+        await asyncio.to_thread(extend_expiry, qr_filename, expires_at)
+        return qr_filename, False
+    RENDER_CACHE_REQUESTS.inc(result="miss")
+
+    # Render the QR code on the executor so the event loop stays responsive;
+    # concurrent requests for the same artifact share a single render.
+    # Only the caller starting the render takes a render slot; callers joining the
+    # render already in flight wait for it without one.
+    if render_flight.in_flight(cache_key):
+        subject = None
+    async with rate_limiter.render_slot(subject):
+        metadata = await render_flight.do(
+            cache_key, render_executor.submit,
+            generate_qr_code, filename=qr_filename, expires_at=expires_at, **params
+        )
+    render_cache.put(cache_key, qr_filename)
+    await asyncio.to_thread(qr_index.add, QRIndexEntry(
+        qr_filename, metadata["data"], metadata["created_at"], metadata.get("expires_at")
+    ))
+    if metadata.get("expires_at") != expires_at:
+        # A concurrent request with another time to live rendered it; keep the later expiry.
+        await asyncio.to_thread(extend_expiry, qr_filename, expires_at)
+    return qr_filename, True
@@ -0,0 +1,122 @@
+"""
+This module provides the HTTP caching metadata of stored QR code files.
+
+Downloads carry a strong entity tag: the SHA-256 digest of the file content. The
+stored name is a hash of the render parameters rather than of the bytes, and
+re-encoding rewrites a file under the same name, so the name alone cannot serve as
+a strong validator. Digests are remembered per file until its size or modification
+time changes, so each file is read once per worker to compute its digest.
+
+Content-addressed files never change meaning, so they are cacheable for a year and
+marked immutable, or until their expiry time for expiring codes. Files stored under
+legacy URL-derived names are revalidated on every use.
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional, Tuple
+
+# Rendered images are addressed by their parameters, so they never change
+IMMUTABLE_MAX_AGE = 31536000
+IMMUTABLE_CACHE_CONTROL = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+REVALIDATE_CACHE_CONTROL = "public, no-cache"
+
+# Stored names of content-addressed QR codes: a SHA-256 digest and an extension
+CONTENT_ADDRESSED_NAME = re.compile(r"[0-9a-f]{64}\.[a-z]+")
+
+# Number of file digests remembered per worker
+ETAG_CACHE_SIZE = 4096
+
+
+def cache_control(filename: str, expires_at: Optional[str] = None,
+                  now: Optional[datetime] = None) -> str:
+    """
+    Returns the Cache-Control header of a stored QR code.
+
+    Parameters:
+    - filename (str): The stored name of the QR code.
+    - expires_at (str): When the QR code expires, as an ISO 8601 UTC time, if it does.
+    - now (datetime): The current time, by default the real one.
+    """
+    if not CONTENT_ADDRESSED_NAME.fullmatch(filename):
+        return REVALIDATE_CACHE_CONTROL
+    if expires_at is None:
+        return IMMUTABLE_CACHE_CONTROL
+    now = now or datetime.now(timezone.utc)
+    remaining = int((datetime.fromisoformat(expires_at) - now).total_seconds())
+    return f"public, max-age={max(0, min(remaining, IMMUTABLE_MAX_AGE))}"
+
+
+def file_digest(path: Path) -> str:
+    """
+    Returns the hex SHA-256 digest of a file's content, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ETagCache:
+    """
+    An LRU map from files to the strong entity tag of their current content.
+
+    Parameters:
+    - max_entries (int): Number of files remembered.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, path: Path, size: int, mtime_ns: int) -> Optional[str]:
+        """
+        Returns the entity tag of a file if it is known for this size and modification time.
+        """
+        with self._lock:
+            entry = self._entries.get(str(path))
+            if entry is None or entry[:2] != (size, mtime_ns):
+                return None
+            self._entries.move_to_end(str(path))
+            return entry[2]
+
+    def put(self, path: Path, size: int, mtime_ns: int, etag: str):
+        """
+        Remembers the entity tag of a file, evicting the least recently used one if full.
+        """
+        with self._lock:
+            self._entries[str(path)] = (size, mtime_ns, etag)
+            self._entries.move_to_end(str(path))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def etag(self, path: Path, size: int, mtime_ns: int) -> str:
+        """
+        Returns the quoted strong entity tag of a file, hashing it on a miss. The
+        hash is read from disk, so callers on the event loop run this on a thread
+        when get() misses.
+        """
+        etag = self.get(path, size, mtime_ns)
+        if etag is None:
+            etag = f'"{file_digest(path)}"'
+            self.put(path, size, mtime_ns, etag)
+        return etag
+
+    def clear(self):
+        """
+        Forgets every remembered entity tag.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+etag_cache = ETagCache(ETAG_CACHE_SIZE)
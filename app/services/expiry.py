@@ -0,0 +1,101 @@
+"""
+This module expires QR codes created with a time to live.
+
+The expiry time of a code is recorded in its metadata file and in the metadata
+index. The sweeper deletes expired codes in bounded batches, reading only expired
+rows from the index in expiry order, so its cost depends on how many codes expired
+and not on the size of the store. It runs periodically inside the app lifespan, or
+once from the command line.
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from app.config import EXPIRY_SWEEP_BATCH_SIZE, EXPIRY_SWEEP_INTERVAL
+from app.services.qr_index import QRIndex, qr_index, utc_timestamp
+from app.services.qr_service import delete_qr_code, metadata_name, read_qr_metadata
+from app.services.render_cache import render_cache
+from app.services.storage import Storage, qr_storage
+
+
+def expiry_time(ttl_seconds: Optional[int], now: Optional[datetime] = None) -> Optional[str]:
+    """
+    Returns the expiry time of a code created at ``now`` with the given time to live,
+    or None when it has none.
+    """
+    if ttl_seconds is None:
+        return None
+    now = now or datetime.now(timezone.utc)
+    return utc_timestamp(now + timedelta(seconds=ttl_seconds))
+
+
+def extend_expiry(filename: str, expires_at: Optional[str],
+                  storage: Optional[Storage] = None, index: Optional[QRIndex] = None) -> bool:
+    """
+    Pushes back the expiry of a stored code requested again and records the new
+    expiry in its metadata, so that rebuilding the index keeps it.
+
+    Returns:
+    - Whether the expiry changed.
+    """
+    storage = storage or qr_storage
+    index = index or qr_index
+    if not index.extend_expiry(filename, expires_at):
+        return False
+    metadata = read_qr_metadata(filename, storage)
+    if metadata is not None:
+        metadata["expires_at"] = expires_at
+        storage.put(metadata_name(filename), json.dumps(metadata).encode('utf-8'))
+    return True
+
+
+def sweep_expired(storage: Optional[Storage] = None, index: Optional[QRIndex] = None,
+                  batch_size: int = EXPIRY_SWEEP_BATCH_SIZE,
+                  now: Optional[datetime] = None) -> int:
+    """
+    Deletes every code expired at ``now`` (by default the current time), one batch
+    of index entries at a time.
+
+    Parameters:
+    - storage (Storage): The store holding the codes; defaults to the configured one.
+    - index (QRIndex): The metadata index; defaults to the configured one.
+    - batch_size (int): Number of codes claimed from the index at once.
+
+    Returns:
+    - The number of codes deleted.
+    """
+    storage = storage or qr_storage
+    index = index or qr_index
+    deleted = 0
+    while True:
+        filenames = index.claim_expired(batch_size, now)
+        for filename in filenames:
+            try:
+                delete_qr_code(filename, storage)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.error("Could not delete expired QR code %s: %s", filename, e)
+            render_cache.discard(filename.rpartition('.')[0])
+        if len(filenames) < batch_size:
+            break
+    if deleted:
+        logging.info("Deleted %d expired QR codes", deleted)
+    return deleted
+
+
+async def run_sweeper(interval: float = EXPIRY_SWEEP_INTERVAL):
+    """
+    Sweeps expired codes every ``interval`` seconds until cancelled. The sweep runs
+    on a thread, so the event loop keeps serving requests meanwhile.
+    """
+    while True:
+        try:
+            await asyncio.to_thread(sweep_expired)
+        except Exception as e:  # pylint: disable=broad-except
+            logging.error("Expired QR code sweep failed: %s", e)
+        await asyncio.sleep(interval)
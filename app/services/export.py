@@ -0,0 +1,217 @@
+"""
+This module streams archives of stored QR codes.
+
+The QR codes to export are read from the metadata index one page at a time, and
+each file is copied into the archive in fixed-size chunks that are handed to the
+response as soon as they are written, so memory use does not grow with the size
+of the archive. Files are stored as they are, without compression: PNG and PDF
+images are compressed already. A ``manifest.csv`` listing every exported code is
+appended last; it is spooled to a temporary file while the archive is written.
+"""
+
+import csv
+import io
+import os
+import tarfile
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+from app.services.qr_index import QRIndex, QRIndexEntry
+from app.services.storage import Storage
+
+ARCHIVE_MEDIA_TYPES = {
+    'zip': 'application/zip',
+    'tar': 'application/x-tar',
+}
+
+MANIFEST_NAME = 'manifest.csv'
+MANIFEST_FIELDS = ('filename', 'data', 'created_at', 'expires_at', 'size')
+
+# Size of the chunks files are copied in.
+EXPORT_CHUNK_SIZE = 64 * 1024
+# Number of index entries read at once.
+EXPORT_PAGE_SIZE = 500
+# The manifest stays in memory up to this size, and is spooled to disk beyond it.
+MANIFEST_SPOOL_SIZE = 1024 * 1024
+
+
+class ArchiveSink(io.RawIOBase):
+    """
+    A write-only file object collecting the output of an archive writer until it is
+    drained into the response.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        # Writers may reuse memoryviews, but bytes are immutable and kept as they are.
+        self._chunks.append(data if isinstance(data, bytes) else bytes(data))
+        return len(data)
+
+    def drain(self) -> Iterator[bytes]:
+        """
+        Yields the chunks written since the last drain.
+        """
+        chunks, self._chunks = self._chunks, []
+        yield from chunks
+
+
+class ZipWriter:
+    """
+    Writes a ZIP archive to a non-seekable sink; sizes and checksums follow each
+    file in a data descriptor. The central directory, a few dozen bytes per file,
+    is the only state kept until the end.
+    """
+
+    def __init__(self, sink: ArchiveSink):
+        self._zip = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED)
+
+    def add(self, name: str, source: BinaryIO, size: int, mtime: float) -> Iterator[None]:
+        """
+        Copies a file into the archive, yielding after every chunk.
+        """
+        info = zipfile.ZipInfo(name, date_time=time.gmtime(max(mtime, 315532800))[:6])
+        info.file_size = size
+        with self._zip.open(info, 'w') as dest:
+            while chunk := source.read(EXPORT_CHUNK_SIZE):
+                dest.write(chunk)
+                yield
+
+    def close(self):
+        """
+        Writes the central directory.
+        """
+        self._zip.close()
+
+
+class TarWriter:
+    """
+    Writes a POSIX tar archive to a sink: a header block per file followed by its
+    content padded to whole blocks, and two empty blocks at the end.
+    """
+
+    def __init__(self, sink: ArchiveSink):
+        self._sink = sink
+
+    def add(self, name: str, source: BinaryIO, size: int, mtime: float) -> Iterator[None]:
+        """
+        Copies a file into the archive, yielding after every chunk.
+        """
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(mtime)
+        info.mode = 0o644
+        self._sink.write(info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape'))
+        while chunk := source.read(EXPORT_CHUNK_SIZE):
+            self._sink.write(chunk)
+            yield
+        remainder = size % tarfile.BLOCKSIZE
+        if remainder:
+            self._sink.write(tarfile.NUL * (tarfile.BLOCKSIZE - remainder))
+
+    def close(self):
+        """
+        Writes the end-of-archive marker.
+        """
+        self._sink.write(tarfile.NUL * (2 * tarfile.BLOCKSIZE))
+
+
+ARCHIVE_WRITERS = {
+    'zip': ZipWriter,
+    'tar': TarWriter,
+}
+
+
+def export_entries(index: QRIndex, prefix: Optional[str] = None,
+                   created_after: Optional[datetime] = None,
+                   created_before: Optional[datetime] = None) -> Iterator[QRIndexEntry]:
+    """
+    Yields the unexpired QR codes matching the filters, oldest first, reading the
+    index one page at a time.
+    """
+    cursor = None
+    while True:
+        entries, cursor = index.page(EXPORT_PAGE_SIZE, cursor, prefix,
+                                     created_after, created_before)
+        yield from entries
+        if cursor is None:
+            return
+
+
+def open_stored(name: str, storage: Storage) -> Optional[Tuple[BinaryIO, int]]:
+    """
+    Opens a stored QR code for reading.
+
+    Local files are read straight from disk; objects of remote stores are fetched
+    one at a time.
+
+    Returns:
+    - The open file and its size, or None if the QR code is gone.
+    """
+    path = storage.local_path(name)
+    try:
+        if path is not None:
+            # pylint: disable=consider-using-with
+            source = open(path, 'rb')
+            return source, os.fstat(source.fileno()).st_size
+        body = storage.get(name)
+    except FileNotFoundError:
+        return None
+    return io.BytesIO(body), len(body)
+
+
+def csv_line(row) -> bytes:
+    """
+    Formats one manifest row.
+    """
+    line = io.StringIO()
+    csv.writer(line).writerow(row)
+    return line.getvalue().encode('utf-8')
+
+
+def stream_archive(fmt: str, entries: Iterator[QRIndexEntry],
+                   storage: Storage) -> Iterator[bytes]:
+    """
+    Streams an archive of the given QR codes followed by their manifest.
+
+    QR codes listed in the index but missing from the store are left out of both.
+
+    Parameters:
+    - fmt (str): Archive format, one of ARCHIVE_WRITERS.
+    - entries: The QR codes to export.
+    - storage (Storage): The store holding them.
+
+    Returns:
+    - An iterator over the archive bytes.
+    """
+    sink = ArchiveSink()
+    writer = ARCHIVE_WRITERS[fmt](sink)
+    with tempfile.SpooledTemporaryFile(max_size=MANIFEST_SPOOL_SIZE) as manifest:
+        manifest.write(csv_line(MANIFEST_FIELDS))
+        for entry in entries:
+            opened = open_stored(entry.filename, storage)
+            if opened is None:
+                continue
+            source, size = opened
+            with source:
+                mtime = datetime.fromisoformat(entry.created_at).timestamp()
+                for _ in writer.add(entry.filename, source, size, mtime):
+                    yield from sink.drain()
+            yield from sink.drain()
+            manifest.write(csv_line((entry.filename, entry.data, entry.created_at,
+                                     entry.expires_at or '', size)))
+
+        size = manifest.tell()
+        manifest.seek(0)
+        for _ in writer.add(MANIFEST_NAME, manifest, size, time.time()):
+            yield from sink.drain()
+    writer.close()
+    yield from sink.drain()
@@ -0,0 +1,208 @@
+"""
+This module provides the persistent queue of asynchronous render jobs.
+
+Jobs live in a local SQLite database, by default in the QR code directory, so they
+survive restarts and can be consumed by job workers in other processes on the same
+host. A worker claims a job by leasing it: the claim is a single UPDATE, so two
+workers never run the same job at once, and a job whose worker died is claimed
+again once its lease runs out, up to a maximum number of attempts.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from app.config import JOB_MAX_ATTEMPTS, JOB_QUEUE_PATH
+
+# Schema migrations, applied in order; PRAGMA user_version records how many ran.
+MIGRATIONS = [
+    """
+    CREATE TABLE jobs (
+        id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        subject TEXT,
+        request TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        lease_until REAL,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    );
+    CREATE INDEX jobs_pending ON jobs (status, created_at);
+    """,
+]
+
+JOB_COLUMNS = "id, status, subject, request, result, error, attempts, created_at, updated_at"
+
+
+class Job(NamedTuple):
+    """
+    One render job: the QR code request it renders and where it stands.
+    """
+    id: str
+    status: str
+    subject: Optional[str]
+    request: dict
+    result: Optional[dict]
+    error: Optional[str]
+    attempts: int
+    created_at: str
+    updated_at: str
+
+    @classmethod
+    def from_row(cls, row: tuple) -> "Job":
+        """
+        Builds a job from a database row selected with JOB_COLUMNS.
+        """
+        result = json.loads(row[4]) if row[4] else None
+        return cls(row[0], row[1], row[2], json.loads(row[3]), result, *row[5:])
+
+
+def now_iso() -> str:
+    """
+    Returns the current UTC time in ISO 8601 format.
+    """
+    return datetime.now(timezone.utc).isoformat()
+
+
+class JobQueue:
+    """
+    A SQLite-backed queue of render jobs.
+
+    Parameters:
+    - db_path (Path): Location of the SQLite database; it is created on first use.
+    - max_attempts (int): Number of times a job is claimed before it is failed.
+    """
+
+    def __init__(self, db_path: Path, max_attempts: int = 3):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                conn.executescript(migration)
+                conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        """
+        Closes the database connection; it is reopened on next use.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def enqueue(self, request: dict, subject: Optional[str] = None) -> Job:
+        """
+        Adds a job rendering the given QR code request and returns it.
+
+        Parameters:
+        - request (dict): The QR code request, as JSON-serializable fields.
+        - subject (str): The user the job belongs to.
+        """
+        created_at = now_iso()
+        job = Job(uuid.uuid4().hex, 'queued', subject, request, None, None, 0,
+                  created_at, created_at)
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT INTO jobs (id, status, subject, request, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job.id, job.status, subject, json.dumps(request), created_at, created_at),
+            )
+            conn.commit()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        Returns a job by id, or None if there is no such job.
+        """
+        with self._lock:
+            row = self._connection().execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return Job.from_row(row) if row else None
+
+    def claim(self, lease_seconds: float) -> Optional[Job]:
+        """
+        Leases the oldest job that is queued or whose lease ran out.
+
+        Jobs claimed ``max_attempts`` times already are failed instead of run again.
+
+        Returns:
+        - The claimed job, or None when there is nothing to run.
+        """
+        while True:
+            now = time.time()
+            with self._lock:
+                conn = self._connection()
+                row = conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+                    "lease_until = ?, updated_at = ? "
+                    "WHERE id = (SELECT id FROM jobs WHERE status = 'queued' "
+                    "OR (status = 'running' AND lease_until < ?) ORDER BY created_at LIMIT 1) "
+                    f"RETURNING {JOB_COLUMNS}",
+                    (now + lease_seconds, now_iso(), now),
+                ).fetchone()
+                conn.commit()
+            if row is None:
+                return None
+            job = Job.from_row(row)
+            if job.attempts <= self.max_attempts:
+                return job
+            self.fail(job.id, f"Gave up after {self.max_attempts} attempts")
+
+    def complete(self, job_id: str, result: dict):
+        """
+        Marks a job as done with its result.
+        """
+        self._finish(job_id, 'done', json.dumps(result), None)
+
+    def fail(self, job_id: str, error: str):
+        """
+        Marks a job as failed with the reason.
+        """
+        self._finish(job_id, 'failed', None, error)
+
+    def _finish(self, job_id: str, status: str, result: Optional[str], error: Optional[str]):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, lease_until = NULL, "
+                "updated_at = ? WHERE id = ?",
+                (status, result, error, now_iso(), job_id),
+            )
+            conn.commit()
+
+    def purge(self, older_than: datetime) -> int:
+        """
+        Deletes the finished jobs last updated before ``older_than`` and returns how many.
+        """
+        with self._lock:
+            conn = self._connection()
+            deleted = conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (older_than.astimezone(timezone.utc).isoformat(),),
+            ).rowcount
+            conn.commit()
+        return deleted
+
+
+job_queue = JobQueue(JOB_QUEUE_PATH, JOB_MAX_ATTEMPTS)
@@ -0,0 +1,159 @@
+"""
+This module runs the asynchronous render jobs of the job queue.
+
+Job workers are asyncio tasks that claim jobs from the queue and render them
+through the same render-or-reuse path as synchronous requests, so the render
+executor still bounds the CPU they use. They run inside the app lifespan, or in
+a separate process started with ``python -m app.cli job-worker``. Workers in the
+same process are woken up as soon as a job is submitted; workers in other
+processes notice new jobs by polling.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Set
+
+from app.config import JOB_LEASE_SECONDS, JOB_POLL_INTERVAL, JOB_RETENTION, JOB_WORKERS
+from app.schema import QRCodeRequest
+from app.services.artifacts import ensure_qr_code
+from app.services.job_queue import Job, JobQueue, job_queue
+from app.services.render_executor import RenderUnavailable
+
+
+class JobWorker:
+    """
+    A group of asyncio tasks running the jobs of a queue.
+
+    Parameters:
+    - queue (JobQueue): The queue to take jobs from.
+    - concurrency (int): Number of jobs run at once.
+    - lease_seconds (float): How long a claimed job is reserved for its worker.
+    - poll_interval (float): Seconds an idle worker waits before checking the queue again.
+    - retention (float): Seconds finished jobs are kept before being purged.
+    """
+
+    def __init__(self, queue: JobQueue, concurrency: int = 2, lease_seconds: float = 300,
+                 poll_interval: float = 1.0, retention: float = 86400):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._tasks: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._last_purge = 0.0
+
+    def start(self):
+        """
+        Starts the worker tasks on the running event loop.
+        """
+        self._wakeup = asyncio.Event()
+        for _ in range(self.concurrency):
+            self._tasks.add(asyncio.create_task(self._run()))
+        logging.info("Job worker started with concurrency %d", self.concurrency)
+
+    async def stop(self):
+        """
+        Cancels the worker tasks. Jobs they were running stay leased and are claimed
+        again once the lease runs out.
+        """
+        tasks, self._tasks = self._tasks, set()
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with suppress(asyncio.CancelledError):
+                await task
+
+    def notify(self):
+        """
+        Wakes up idle workers of this process after a job was submitted.
+        """
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def submit(self, request: QRCodeRequest, subject: Optional[str] = None) -> Job:
+        """
+        Adds a job rendering ``request`` to the queue and returns it.
+        """
+        job = await asyncio.to_thread(
+            self.queue.enqueue, request.model_dump(mode="json"), subject
+        )
+        self.notify()
+        return job
+
+    async def run_job(self, job: Job):
+        """
+        Renders the QR code of a claimed job and records the outcome. When the render
+        executor is saturated the job waits and retries instead of failing.
+        """
+        try:
+            request = QRCodeRequest.model_validate(job.request)
+            while True:
+                try:
+                    qr_filename, created = await ensure_qr_code(request)
+                    break
+                except RenderUnavailable as e:
+                    await asyncio.sleep(e.retry_after)
+        except Exception as e:  # pylint: disable=broad-except
+            logging.error("Job %s failed: %s", job.id, e)
+            await asyncio.to_thread(self.queue.fail, job.id, str(e) or type(e).__name__)
+            return
+        await asyncio.to_thread(
+            self.queue.complete, job.id, {"filename": qr_filename, "created": created}
+        )
+
+    async def drain(self) -> int:
+        """
+        Runs queued jobs one after the other until none is left and returns how many ran.
+        """
+        count = 0
+        while (job := await asyncio.to_thread(self.queue.claim, self.lease_seconds)) is not None:
+            await self.run_job(job)
+            count += 1
+        return count
+
+    async def run_forever(self):
+        """
+        Runs the worker tasks until cancelled, e.g. in a dedicated process.
+        """
+        self.start()
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            await self.stop()
+
+    async def _run(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(self.queue.claim, self.lease_seconds)
+            except Exception as e:  # pylint: disable=broad-except
+                logging.error("Could not claim a job: %s", e)
+                job = None
+            if job is not None:
+                await self.run_job(job)
+                continue
+            await self._purge_finished()
+            self._wakeup.clear()
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+
+    async def _purge_finished(self):
+        # Finished jobs are purged at most once a minute per process, while idle.
+        if time.monotonic() - self._last_purge < max(self.poll_interval, 60):
+            return
+        self._last_purge = time.monotonic()
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.retention)
+        try:
+            purged = await asyncio.to_thread(self.queue.purge, cutoff)
+        except Exception as e:  # pylint: disable=broad-except
+            logging.error("Could not purge finished jobs: %s", e)
+            return
+        if purged:
+            logging.info("Purged %d finished jobs", purged)
+
+
+job_worker = JobWorker(job_queue, concurrency=JOB_WORKERS, lease_seconds=JOB_LEASE_SECONDS,
+                       poll_interval=JOB_POLL_INTERVAL, retention=JOB_RETENTION)
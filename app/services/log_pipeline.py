@@ -0,0 +1,239 @@
+"""
+This module provides the logging pipeline of the application.
+
+Log calls on the request path only enqueue their record: ``QueuedStreamHandler``
+puts it on a bounded queue and a dedicated writer thread formats and writes it, so
+a slow stdout never blocks a request. When the queue is full records are dropped
+and counted rather than waited for. Records are written as JSON lines by
+``JsonFormatter``, with the id of the request they were logged for and the render
+stage timings of that request so far. Debug records can be sampled: the debug
+records of a sampled request are kept together.
+
+The pipeline is set up from ``logging.conf`` by ``setup_logging``.
+"""
+
+import copy
+import json
+import logging
+import logging.config
+import os
+import queue
+import random
+import uuid
+import weakref
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from app.config import LOG_CONFIG, LOG_DEBUG_SAMPLE_RATE, LOG_LEVEL, LOG_QUEUE_SIZE
+from app.services.metrics import LOG_RECORDS_DROPPED
+
+# Fields of the request being served: its id and, once it rendered, its render timings.
+log_context: ContextVar[Optional[dict]] = ContextVar("log_context", default=None)
+
+# Attributes every LogRecord has; any other attribute was passed with ``extra``.
+# Uvicorn also passes a copy of its messages with terminal colours.
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message", "asctime", "context", "color_message",
+}
+
+
+def bind_log_context(**fields):
+    """
+    Adds fields to the records logged for the rest of the current request.
+    """
+    context = log_context.get()
+    if context is not None:
+        context.update(fields)
+
+
+def add_render_timings(timings: List[Tuple[str, float]]):
+    """
+    Adds render stage timings to the current request's log context, in milliseconds.
+    Several renders in one request, as in a batch, add up.
+    """
+    context = log_context.get()
+    if context is None:
+        return
+    render_ms = context.setdefault("render_ms", {})
+    for stage, seconds in timings:
+        render_ms[stage] = round(render_ms.get(stage, 0) + seconds * 1000, 3)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line: time, level, logger, message, the
+    request context and any ``extra`` fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        context = getattr(record, "context", None)
+        entry.update(context if context is not None else log_context.get() or {})
+        for name, value in vars(record).items():
+            if name not in RECORD_ATTRIBUTES:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+class DebugSampler(logging.Filter):
+    """
+    Keeps a fraction of the debug records. Records logged for a request are kept or
+    dropped depending on its id, so a sampled request keeps all its debug lines.
+
+    Parameters:
+    - rate (float): Fraction of debug records kept, from 0 to 1.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.threshold = int(max(0.0, min(rate, 1.0)) * 0xFFFFFFFF)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.threshold >= 0xFFFFFFFF:
+            return True
+        context = log_context.get()
+        if context and "request_id" in context:
+            return zlib.crc32(context["request_id"].encode()) <= self.threshold
+        return random.random() * 0xFFFFFFFF <= self.threshold
+
+
+class QueuedStreamHandler(QueueHandler):
+    """
+    A handler that enqueues records for a writer thread that writes them to a stream.
+
+    The record message is rendered and the request context captured in the logging
+    thread, because arguments and context may change afterwards; formatting and
+    writing happen on the writer thread. The writer thread is restarted in forked
+    processes, such as gunicorn and render workers.
+
+    Parameters:
+    - stream: The stream records are written to, by default stderr.
+    - queue_size (int): Number of records the queue holds before dropping new ones.
+    - debug_sample_rate (float): Fraction of debug records kept.
+    """
+
+    def __init__(self, stream=None, queue_size: int = LOG_QUEUE_SIZE,
+                 debug_sample_rate: float = LOG_DEBUG_SAMPLE_RATE):
+        super().__init__(queue.Queue(queue_size))
+        self.writer = logging.StreamHandler(stream)
+        self.addFilter(DebugSampler(debug_sample_rate))
+        self.listener = None
+        self._start_listener()
+        handler = weakref.ref(self)
+        os.register_at_fork(after_in_child=lambda: handler() and handler().restart())
+
+    def _start_listener(self):
+        self.listener = QueueListener(self.queue, self.writer, respect_handler_level=True)
+        self.listener.start()
+
+    def restart(self):
+        """
+        Starts a new writer thread on an empty queue, as the thread does not survive
+        a fork.
+        """
+        if self.listener is None:
+            return
+        self.queue = queue.Queue(self.queue.maxsize)
+        self._start_listener()
+
+    def setFormatter(self, fmt):
+        # The writer formats records, so it gets the formatter from the configuration.
+        self.writer.setFormatter(fmt)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        context = log_context.get()
+        record.context = dict(context) if context else {}
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        """
+        Writes the queued records, stops the writer thread and closes the stream handler.
+        """
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()
+        self.writer.close()
+        super().close()
+
+
+class RequestLogContextMiddleware:
+    """
+    ASGI middleware giving every HTTP request a log context with its id.
+
+    The id is taken from the ``X-Request-ID`` header when the client or a proxy sent
+    one, generated otherwise, and returned in the ``X-Request-ID`` response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []),
+                                      (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        token = log_context.set({"request_id": request_id})
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            log_context.reset(token)
+
+
+def setup_logging(config: Path = LOG_CONFIG, level: str = LOG_LEVEL):
+    """
+    Configures logging from ``config``, a ``logging.config.fileConfig`` file; its
+    ``%(log_level)s`` placeholders are replaced by ``level``. Without the file, the
+    root logger writes JSON lines to stderr through a queued handler.
+    """
+    if config.is_file():
+        logging.config.fileConfig(config, defaults={"log_level": level.upper()},
+                                  disable_existing_loggers=False)
+        return
+    handler = QueuedStreamHandler()
+    handler.setFormatter(JsonFormatter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level.upper())
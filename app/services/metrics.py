@@ -0,0 +1,329 @@
+"""
+This module provides the application metrics and exposes them in the Prometheus
+text format.
+
+Metrics are plain in-process counters and histograms, so recording one costs a
+lock and a few additions. Render stages run in worker processes: they are timed
+there with ``stage_timer``, shipped back with the job result by
+``call_with_stage_timings`` and recorded in the API process.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Bucket upper bounds, in seconds, from 100 microseconds to 10 seconds.
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def escape_label_value(value) -> str:
+    """
+    Escapes a label value for the Prometheus text format.
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labelnames: Sequence[str], values: Sequence[str], **extra) -> str:
+    """
+    Formats a label set as ``{name="value",...}``, or an empty string without labels.
+    """
+    pairs = list(zip(labelnames, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+class Metric:
+    """
+    Base class of the metrics: a name, a help text and labelled children.
+
+    Parameters:
+    - name (str): The metric name.
+    - documentation (str): The help text of the metric.
+    - labelnames: Names of the labels every sample carries.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[str]:
+        """
+        Yields the sample lines of the metric.
+        """
+        raise NotImplementedError
+
+    def exposition(self) -> str:
+        """
+        Returns the metric in the Prometheus text format.
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """
+    A monotonically increasing count.
+    """
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        """
+        Increments the counter of the given label values.
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        """
+        Returns the current count of the given label values.
+        """
+        return self._children.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        # Copied under the lock: a new label set may be added while the scrape runs.
+        with self._lock:
+            children = list(self._children.items())
+        for key, value in sorted(children):
+            yield f"{self.name}{format_labels(self.labelnames, key)} {value}"
+
+
+class Gauge(Metric):
+    """
+    A value read from a callback when the metrics are collected.
+
+    Parameters:
+    - read: Returns the current value.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.read = read
+
+    def samples(self) -> Iterator[str]:
+        yield f"{self.name} {self.read()}"
+
+
+class Histogram(Metric):
+    """
+    A distribution of observed values over cumulative buckets.
+
+    Parameters:
+    - buckets: Increasing bucket upper bounds; ``+Inf`` is implied.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        """
+        Records one observation for the given label values.
+        """
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                # One count per bucket plus +Inf, then the sum.
+                child = self._children[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            child[index] += 1
+            child[-1] += value
+
+    def count(self, **labels) -> int:
+        """
+        Returns the number of observations for the given label values.
+        """
+        child = self._children.get(self._key(labels))
+        return sum(child[:-1]) if child else 0
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observes the duration of the ``with`` block.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterator[str]:
+        # Copied under the lock, so each child's buckets and sum are consistent.
+        with self._lock:
+            children = [(key, list(child)) for key, child in self._children.items()]
+        for key, child in sorted(children):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{format_labels(self.labelnames, key, le=le)} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labelnames, key)} {child[-1]}"
+            yield f"{self.name}_count{format_labels(self.labelnames, key)} {cumulative}"
+
+
+class Registry:
+    """
+    The set of metrics exposed at ``/metrics``.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Adds a metric, replacing any earlier metric of the same name, and returns it.
+        """
+        self._metrics[metric.name] = metric
+        return metric
+
+    def exposition(self) -> str:
+        """
+        Returns every metric in the Prometheus text format.
+        """
+        return "\n".join(metric.exposition() for metric in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "http_request_duration_seconds", "Time to serve HTTP requests, by route template.",
+    ("method", "route", "status"),
+))
+RENDER_STAGE_SECONDS = registry.register(Histogram(
+    "qr_render_stage_seconds",
+    "Time spent in each render stage: matrix, encode and save.",
+    ("stage",),
+))
+RENDER_JOB_SECONDS = registry.register(Histogram(
+    "qr_render_job_seconds", "Time from submitting a render job to its result, queueing included.",
+))
+RENDER_CACHE_REQUESTS = registry.register(Counter(
+    "qr_render_cache_requests_total", "Render cache lookups, by result (hit or miss).",
+    ("result",),
+))
+RATE_LIMIT_DECISIONS = registry.register(Counter(
+    "qr_rate_limit_decisions_total",
+    "Admission decisions on the render path, by limit (rate or concurrency) and result.",
+    ("limit", "result"),
+))
+SHARED_CACHE_REQUESTS = registry.register(Counter(
+    "qr_shared_cache_requests_total",
+    "Lookups of rendered images in the host-wide shared cache, by result (hit or miss).",
+    ("result",),
+))
+LOG_RECORDS_DROPPED = registry.register(Counter(
+    "qr_log_records_dropped_total", "Log records dropped because the log queue was full.",
+))
+
+# Stage timings of the job running on the current thread, if any.
+_stage_timings = threading.local()
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """
+    Times a render stage of the job started by ``call_with_stage_timings``.
+
+    Outside of such a job the stage is not recorded.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = getattr(_stage_timings, "timings", None)
+        if timings is not None:
+            timings.append((stage, time.perf_counter() - start))
+
+
+def call_with_stage_timings(fn: Callable, *args,
+                            **kwargs) -> Tuple[object, List[Tuple[str, float]]]:
+    """
+    Calls ``fn(*args, **kwargs)`` and returns its result with the stage timings it recorded.
+
+    This runs on the render workers, so it must stay a picklable module-level function.
+    """
+    _stage_timings.timings = []
+    try:
+        return fn(*args, **kwargs), _stage_timings.timings
+    finally:
+        _stage_timings.timings = None
+
+
+def observe_stage_timings(timings: List[Tuple[str, float]]):
+    """
+    Records stage timings shipped back from a render worker.
+    """
+    for stage, seconds in timings:
+        RENDER_STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency of every HTTP request.
+
+    Requests are labelled with the path template of the route that served them,
+    never the raw path, so the number of series stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: Dict[Callable, str] = {}
+
+    def route_path(self, scope) -> str:
+        """
+        Returns the path template of the route that handled the request.
+        """
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if endpoint not in self._route_paths:
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    self._route_paths[endpoint] = route.path
+                    break
+            else:
+                return "unmatched"
+        return self._route_paths[endpoint]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope["method"], route=self.route_path(scope), status=status_code,
+            )
@@ -0,0 +1,360 @@
+"""
+This module provides the persistent metadata index of stored QR codes.
+
+The index is a local SQLite database, by default in the QR code directory. It is
+updated whenever a QR code is created or deleted, so listing the store is an
+indexed range query instead of a scan of the whole store. ``QRIndex.rebuild``
+reconciles the index with the store after files were added or removed behind its
+back.
+
+QR codes created with a time to live carry an expiry time, kept in a partial index
+so that finding the expired ones reads only those rows, oldest expiry first.
+"""
+
+import base64
+import binascii
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from app.config import QR_INDEX_PATH
+from app.services.qr_service import is_qr_code_file, metadata_name, read_qr_metadata
+from app.services.storage import Storage
+from app.utils.common import decode_legacy_filename
+
+# Schema migrations, applied in order; PRAGMA user_version records how many ran.
+MIGRATIONS = [
+    """
+    CREATE TABLE qr_codes (
+        filename TEXT PRIMARY KEY,
+        data TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    );
+    CREATE INDEX qr_codes_created ON qr_codes (created_at, filename);
+    CREATE INDEX qr_codes_data ON qr_codes (data);
+    """,
+    """
+    ALTER TABLE qr_codes ADD COLUMN expires_at TEXT;
+    CREATE INDEX qr_codes_expires ON qr_codes (expires_at) WHERE expires_at IS NOT NULL;
+    """,
+]
+
+# Number of rows written per statement while rebuilding.
+REBUILD_BATCH_SIZE = 1000
+
+
+class QRIndexEntry(NamedTuple):
+    """
+    One indexed QR code: its filename, the data it encodes, its creation time and,
+    for expiring codes, its expiry time.
+    """
+    filename: str
+    data: str
+    created_at: str
+    expires_at: Optional[str] = None
+
+    def is_expired(self, now: Optional[datetime] = None) -> bool:
+        """
+        Checks whether the QR code has expired at ``now`` (by default the current time).
+        """
+        return self.expires_at is not None and self.expires_at <= utc_timestamp(now)
+
+
+def utc_timestamp(moment: Optional[datetime] = None) -> str:
+    """
+    Formats a time (by default the current time) the way the index stores it, as a
+    UTC ISO 8601 string with microseconds so that strings sort chronologically.
+    """
+    moment = moment or datetime.now(timezone.utc)
+    return moment.astimezone(timezone.utc).isoformat(timespec='microseconds')
+
+
+def encode_cursor(entry: QRIndexEntry) -> str:
+    """
+    Encodes the position after ``entry`` as an opaque pagination cursor.
+    """
+    raw = json.dumps([entry.created_at, entry.filename]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Decodes a pagination cursor into its (created_at, filename) position.
+
+    Raises:
+    - ValueError: If the cursor is malformed.
+    """
+    try:
+        created_at, filename = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (binascii.Error, UnicodeError, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    return str(created_at), str(filename)
+
+
+def entry_from_storage(storage: Storage, filename: str) -> QRIndexEntry:
+    """
+    Builds the index entry of a stored QR code from its metadata.
+
+    QR codes saved before metadata existed have URL-derived filenames. Their data is
+    recovered from the filename and their creation time from the file, then written
+    to a metadata file flagged as legacy, so the best-effort decoding happens once
+    and later rebuilds read the same data back.
+    """
+    metadata = read_qr_metadata(filename, storage)
+    if metadata:
+        return QRIndexEntry(filename, metadata['data'], metadata['created_at'],
+                            metadata.get('expires_at'))
+    created_at = datetime.fromtimestamp(storage.modified(filename), timezone.utc).isoformat()
+    data = decode_legacy_filename(filename.rpartition('.')[0])
+    metadata = {"data": data, "created_at": created_at, "legacy": True}
+    try:
+        storage.put(metadata_name(filename), json.dumps(metadata).encode('utf-8'))
+    except OSError as e:
+        logging.warning("Could not save metadata of legacy QR code %s: %s", filename, e)
+    return QRIndexEntry(filename, data, created_at)
+
+
+class QRIndex:
+    """
+    A SQLite index of the QR codes stored in a directory.
+
+    Parameters:
+    - db_path (Path): Location of the SQLite database; it is created on first use.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                conn.executescript(migration)
+                conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        """
+        Closes the database connection; it is reopened on next use.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def add(self, entry: QRIndexEntry):
+        """
+        Adds or replaces the entry of a QR code.
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO qr_codes (filename, data, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                entry,
+            )
+            conn.commit()
+
+    def get(self, filename: str) -> Optional[QRIndexEntry]:
+        """
+        Returns the entry of a QR code, or None if it is not indexed.
+        """
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT filename, data, created_at, expires_at FROM qr_codes WHERE filename = ?",
+                (filename,),
+            ).fetchone()
+        return QRIndexEntry(*row) if row else None
+
+    def extend_expiry(self, filename: str, expires_at: Optional[str]) -> bool:
+        """
+        Pushes back the expiry of a QR code that was requested again.
+
+        Expiry only ever moves later: a code requested without a time to live becomes
+        permanent, and a permanent code stays permanent.
+
+        Parameters:
+        - filename (str): The name of the QR code image.
+        - expires_at (str): The expiry time the new request asks for, as formatted
+          by utc_timestamp, or None for a permanent code.
+
+        Returns:
+        - Whether the stored expiry changed.
+        """
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT expires_at FROM qr_codes WHERE filename = ?", (filename,)
+            ).fetchone()
+            # Most requests hit permanent codes, which are settled by this read alone.
+            if row is None or row[0] is None or (expires_at is not None and expires_at <= row[0]):
+                return False
+            conn.execute("UPDATE qr_codes SET expires_at = ? WHERE filename = ?",
+                         (expires_at, filename))
+            conn.commit()
+        return True
+
+    def claim_expired(self, limit: int, now: Optional[datetime] = None) -> List[str]:
+        """
+        Removes up to ``limit`` expired entries, earliest expiry first, and returns
+        their filenames so the caller can delete the files.
+
+        Entries are removed before their files, so a code cannot be listed after its
+        file is gone, and two sweepers never claim the same entry.
+        """
+        cutoff = utc_timestamp(now)
+        with self._lock:
+            conn = self._connection()
+            candidates = [row[0] for row in conn.execute(
+                "SELECT filename FROM qr_codes WHERE expires_at IS NOT NULL AND expires_at <= ? "
+                "ORDER BY expires_at LIMIT ?",
+                (cutoff, limit),
+            )]
+            # Another process may have claimed or extended a candidate since the read.
+            claimed = [
+                filename for filename in candidates
+                if conn.execute(
+                    "DELETE FROM qr_codes WHERE filename = ? AND expires_at <= ?",
+                    (filename, cutoff),
+                ).rowcount
+            ]
+            conn.commit()
+        return claimed
+
+    def remove(self, filename: str):
+        """
+        Removes the entry of a QR code if it is indexed.
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM qr_codes WHERE filename = ?", (filename,))
+            conn.commit()
+
+    def count(self) -> int:
+        """
+        Returns the number of indexed QR codes.
+        """
+        with self._lock:
+            return self._connection().execute("SELECT COUNT(*) FROM qr_codes").fetchone()[0]
+
+    def page(self, limit: int, cursor: Optional[str] = None, prefix: Optional[str] = None,
+             created_after: Optional[datetime] = None,
+             created_before: Optional[datetime] = None, data: Optional[str] = None
+             ) -> Tuple[List[QRIndexEntry], Optional[str]]:
+        """
+        Returns one page of unexpired QR codes, oldest first.
+
+        Parameters:
+        - limit (int): Maximum number of entries to return.
+        - cursor (str): Cursor returned with the previous page, if any.
+        - prefix (str): Only include QR codes whose data starts with this prefix.
+        - created_after (datetime): Only include QR codes created at or after this time.
+        - created_before (datetime): Only include QR codes created before this time.
+        - data (str): Only include QR codes encoding exactly this data.
+
+        Returns:
+        - The entries and the cursor of the next page, or None on the last page.
+
+        Raises:
+        - ValueError: If the cursor is malformed.
+        """
+        clauses = ["(expires_at IS NULL OR expires_at > ?)"]
+        args = [utc_timestamp()]
+        if cursor:
+            clauses.append("(created_at, filename) > (?, ?)")
+            args.extend(decode_cursor(cursor))
+        if data is not None:
+            # An equality lookup on the data index.
+            clauses.append("data = ?")
+            args.append(data)
+        if prefix:
+            # A range on the data index; U+10FFFF sorts after every other character.
+            clauses.append("data >= ? AND data < ?")
+            args.extend([prefix, prefix + '\U0010ffff'])
+        if created_after:
+            clauses.append("created_at >= ?")
+            args.append(created_after.astimezone(timezone.utc).isoformat())
+        if created_before:
+            clauses.append("created_at < ?")
+            args.append(created_before.astimezone(timezone.utc).isoformat())
+        query = (
+            f"SELECT filename, data, created_at, expires_at FROM qr_codes "
+            f"WHERE {' AND '.join(clauses)} "
+            "ORDER BY created_at, filename LIMIT ?"
+        )
+        with self._lock:
+            rows = self._connection().execute(query, [*args, limit + 1]).fetchall()
+        entries = [QRIndexEntry(*row) for row in rows[:limit]]
+        next_cursor = encode_cursor(entries[-1]) if len(rows) > limit else None
+        return entries, next_cursor
+
+    def rebuild(self, storage: Storage) -> Tuple[int, int]:
+        """
+        Reconciles the index with the QR codes actually present in a store.
+
+        Parameters:
+        - storage (Storage): The store containing the QR code images.
+
+        Returns:
+        - The number of entries added and removed.
+        """
+        with self._lock:
+            conn = self._connection()
+            indexed = {row[0] for row in conn.execute("SELECT filename FROM qr_codes")}
+
+        present = set()
+        batch = []
+        added = 0
+        for qr_file in iter_image_files(storage):
+            present.add(qr_file)
+            if qr_file not in indexed:
+                batch.append(entry_from_storage(storage, qr_file))
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                added += self._insert_many(batch)
+                batch = []
+        added += self._insert_many(batch)
+
+        missing = [(filename,) for filename in indexed - present]
+        with self._lock:
+            conn = self._connection()
+            conn.executemany("DELETE FROM qr_codes WHERE filename = ?", missing)
+            conn.commit()
+        logging.info("QR index rebuilt: %d added, %d removed", added, len(missing))
+        return added, len(missing)
+
+    def _insert_many(self, entries: List[QRIndexEntry]) -> int:
+        if not entries:
+            return 0
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO qr_codes (filename, data, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                entries,
+            )
+            conn.commit()
+        return len(entries)
+
+
+def iter_image_files(storage: Storage) -> Iterator[str]:
+    """
+    Yields the filenames of the QR codes in a store without listing it all at once.
+    """
+    for name in storage.iterate():
+        if is_qr_code_file(name):
+            yield name
+
+
+qr_index = QRIndex(QR_INDEX_PATH)
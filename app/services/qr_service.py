@@ -1,61 +1,256 @@
 """
 This module provides functions to list, generate, and delete QR code images,
-as well as create directories for saving QR codes. The QR codes are saved as PNG
-images and stored at a specified file path.
+as well as create directories for saving QR codes. The QR codes are saved as PNG,
+SVG, PDF or EPS files through the configured storage driver, next to a JSON metadata
+file that records the parameters they were rendered with.
 """
 
+import io
+import json
 import logging
-import os
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 import qrcode
+from qrcode import constants
+from app.config import PNG_COMPRESSION_LEVEL, PNG_FILTER, PNG_ZLIB_STRATEGY
+from app.services.metrics import stage_timer
+from app.services.storage import Storage, qr_storage
+from app.services.rasterizer import write_png_rows
+from app.services.segments import plan_encoding
+from app.services.vector import VECTOR_RENDERERS
+from app.utils.colors import parse_color
 
+ERROR_CORRECTION_LEVELS = {
+    'L': constants.ERROR_CORRECT_L,
+    'M': constants.ERROR_CORRECT_M,
+    'Q': constants.ERROR_CORRECT_Q,
+    'H': constants.ERROR_CORRECT_H,
+}
 
-def list_qr_codes(directory_path: Path) -> List[str]:
+# Formats render_qr_code can produce, with their media types.
+RENDER_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'pdf': 'application/pdf',
+    'eps': 'application/postscript',
+}
+
+
+def is_qr_code_file(filename: str) -> bool:
+    """
+    Checks whether a filename in the QR code directory is a stored QR code, as opposed
+    to metadata, the index or a temporary file.
+    """
+    return not filename.startswith('.') and filename.rpartition('.')[2] in RENDER_FORMATS
+
+
+def media_type(filename: str) -> str:
     """
-    Lists all QR code images in the specified directory by returning their filenames.
+    Returns the media type of a stored QR code from its extension.
+    """
+    return RENDER_FORMATS.get(filename.rpartition('.')[2], 'application/octet-stream')
+
+
+def list_qr_codes(storage: Optional[Storage] = None) -> List[str]:
+    """
+    Lists all QR code images in the store by returning their filenames.
 
     Parameters:
-    - directory_path (Path): The filesystem path to the directory containing QR code images.
+    - storage (Storage): The store to list; defaults to the configured one.
 
     Returns:
-    - A list of filenames (str) for QR codes found in the directory.
+    - A list of filenames (str) for QR codes found in the store.
     """
+    storage = storage or qr_storage
     try:
-        # List all files ending with '.png' in the specified directory.
+        # List all QR code files in the store.
         return [
-            f for f in os.listdir(directory_path) if f.endswith('.png')
+            f for f in storage.iterate() if is_qr_code_file(f)
         ]
-    except FileNotFoundError:
-        logging.error("Directory not found: %s", directory_path)
-        raise
     except OSError as e:
         logging.error("An OS error occurred while listing QR codes: %s", e)
         raise
 
 
-def generate_qr_code(data: str, path: Path, fill_color: str = 'red',
-                     back_color: str = 'white', size: int = 10):
+def metadata_name(filename: str) -> str:
+    """
+    Returns the name of the metadata file stored alongside a QR code image.
+    """
+    return filename.rpartition('.')[0] + '.json'
+
+
+def read_qr_metadata(filename: str, storage: Optional[Storage] = None) -> Optional[dict]:
+    """
+    Reads the render parameters stored alongside a QR code image.
+
+    Parameters:
+    - filename (str): The name of the QR code image.
+    - storage (Storage): The store holding the image; defaults to the configured one.
+
+    Returns:
+    - The metadata dictionary, or None for images saved without metadata.
+    """
+    storage = storage or qr_storage
+    try:
+        return json.loads(storage.get(metadata_name(filename)))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning("Unreadable metadata for QR code %s: %s", filename, e)
+        return None
+
+
+def build_qr_code(data: str, size: int = 10, border: int = 5,
+                  error_correction: str = 'M') -> qrcode.QRCode:
+    """
+    Builds the QR code module matrix for the provided data.
+
+    The data is split into numeric, alphanumeric and byte segments so that it takes
+    as few bits as possible, and encoded at the smallest version that holds them.
+
+    Parameters:
+    - data (str): The data to encode in the QR code.
+    - size (int): The size of each box in the QR code grid.
+    - border (int): Width of the quiet zone around the code, in modules.
+    - error_correction (str): Error correction level (L, M, Q or H).
+
+    Returns:
+    - The QR code, with its matrix already computed.
+
+    Raises:
+    - qrcode.exceptions.DataOverflowError: If the data does not fit in a QR code.
+    """
+    level = ERROR_CORRECTION_LEVELS[error_correction.upper()]
+    plan = plan_encoding(data, level)
+    qr = qrcode.QRCode(
+        version=plan.version,
+        error_correction=level,
+        box_size=size,
+        border=border
+    )
+    for segment in plan.segments:
+        qr.add_data(segment)
+    qr.make(fit=False)
+    return qr
+
+
+def render_qr_code(data: str, fill_color: str = 'red', back_color: str = 'white',
+                   size: int = 10, border: int = 5, error_correction: str = 'M',
+                   fmt: str = 'png', compression_level: int = PNG_COMPRESSION_LEVEL,
+                   png_filter: str = PNG_FILTER) -> bytes:
+    """
+    Renders a QR code into memory without touching the filesystem.
+
+    Vector formats are written straight from the module matrix. PNG images are
+    encoded one scanline at a time, so a large render never holds its pixels in
+    memory, only the compressed image.
+
+    Parameters:
+    - data (str): The data to encode in the QR code.
+    - fill_color (str): Color of the QR code.
+    - back_color (str): Background color of the QR code.
+    - size (int): The size of each box in the QR code grid.
+    - border (int): Width of the quiet zone around the code, in modules.
+    - error_correction (str): Error correction level (L, M, Q or H).
+    - fmt (str): Output format, one of RENDER_FORMATS.
+    - compression_level (int): zlib compression level of PNG images, from 0 to 9.
+    - png_filter (str): PNG scanline filter, 'none' or 'up'.
+
+    Returns:
+    - The encoded image.
+
+    Raises:
+    - ValueError: If the format, a colour or an encoder option is not supported.
+    - qrcode.exceptions.DataOverflowError: If the data does not fit in a QR code.
+    """
+    if fmt not in RENDER_FORMATS:
+        raise ValueError(f"Unsupported QR code format: {fmt}")
+    with stage_timer("matrix"):
+        matrix = build_qr_code(
+            data, size=size, border=border, error_correction=error_correction
+        ).get_matrix()
+    if fmt in VECTOR_RENDERERS:
+        with stage_timer("encode"):
+            return VECTOR_RENDERERS[fmt](
+                matrix, size, parse_color(fill_color), parse_color(back_color)
+            )
+    with stage_timer("encode"):
+        buffer = io.BytesIO()
+        write_png_rows(
+            matrix, size, [parse_color(back_color), parse_color(fill_color)], buffer,
+            compression_level=compression_level, png_filter=png_filter,
+            zlib_strategy=PNG_ZLIB_STRATEGY
+        )
+        return buffer.getvalue()
+
+
+def preload_renderers():
     """
-    Generates a QR code based on the provided data and saves it to a specified file path.
+    Imports the render backends and renders a small QR code in every format, so the
+    first real render pays no import or table-building cost.
+
+    Render workers run this when they start. Under ``gunicorn --preload`` it also runs
+    once in the master process, and the forked workers share the loaded modules
+    copy-on-write.
+    """
+    for fmt in RENDER_FORMATS:
+        render_qr_code("https://example.com/", size=1, border=0, fmt=fmt)
+
+
+def generate_qr_code(data: str, filename: str, fill_color: str = 'red',
+                     back_color: str = 'white', size: int = 10, border: int = 5,
+                     error_correction: str = 'M', fmt: str = 'png',
+                     compression_level: int = PNG_COMPRESSION_LEVEL,
+                     png_filter: str = PNG_FILTER, expires_at: Optional[str] = None,
+                     storage: Optional[Storage] = None) -> dict:
+    """
+    Generates a QR code based on the provided data and saves it under the given name.
 
     Parameters:
     - data (str): The data to encode in the QR code.
-    - path (Path): The filesystem path where the QR code image will be saved.
+    - filename (str): The name the QR code image is stored under.
     - fill_color (str): Color of the QR code.
     - back_color (str): Background color of the QR code.
     - size (int): The size of each box in the QR code grid.
+    - border (int): Width of the quiet zone around the code, in modules.
+    - error_correction (str): Error correction level (L, M, Q or H).
+    - fmt (str): Output format, one of RENDER_FORMATS.
+    - compression_level (int): zlib compression level of PNG images, from 0 to 9.
+    - png_filter (str): PNG scanline filter, 'none' or 'up'.
+    - expires_at (str): When the QR code expires, as an ISO 8601 UTC time; None keeps it.
+    - storage (Storage): The store to save to; defaults to the configured one.
+
+    Returns:
+    - The metadata written alongside the image.
     """
     logging.debug("QR code generation started")
+    storage = storage or qr_storage
     try:
-        qr = qrcode.QRCode(version=1, box_size=size, border=5)
-        qr.add_data(data)
-        qr.make(fit=True)
-        img = qr.make_image(fill_color=fill_color, back_color=back_color)
-        img.save(str(path))
+        body = render_qr_code(data, fill_color=fill_color, back_color=back_color, size=size,
+                              border=border, error_correction=error_correction, fmt=fmt,
+                              compression_level=compression_level, png_filter=png_filter)
+        metadata = {
+            "data": data,
+            "size": size,
+            "fill_color": fill_color,
+            "back_color": back_color,
+            "border": border,
+            "error_correction": error_correction.upper(),
+            "format": fmt,
+            "compression_level": compression_level,
+            "png_filter": png_filter,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "expires_at": expires_at,
+        }
+        # The image is written last: once it exists, its metadata does too.
+        with stage_timer("save"):
+            storage.put(metadata_name(filename), json.dumps(metadata).encode('utf-8'))
+            storage.put(filename, body)
         logging.info(
-            "QR code successfully saved to %s", path
+            "QR code successfully saved to %s", storage.key(filename)
         )
+        return metadata
     except Exception as e:
         logging.error(
             "Failed to generate/save QR code: %s", e
@@ -63,24 +258,26 @@ def generate_qr_code(data: str, path: Path, fill_color: str = 'red',
         raise
 
 
-def delete_qr_code(file_path: Path):
+def delete_qr_code(filename: str, storage: Optional[Storage] = None):
     """
-    Deletes the specified QR code image file.
+    Deletes the specified QR code image and its metadata.
 
     Parameters:
-    - file_path (Path): The filesystem path of the QR code image to delete.
+    - filename (str): The name of the QR code image to delete.
+    - storage (Storage): The store holding the image; defaults to the configured one.
     """
-    if file_path.is_file():
-        file_path.unlink()
+    storage = storage or qr_storage
+    if storage.delete(filename):
+        storage.delete(metadata_name(filename))
         logging.info(
-            "QR code %s deleted successfully", file_path.name
+            "QR code %s deleted successfully", filename
         )
     else:
         logging.error(
-            "QR code %s not found for deletion", file_path.name
+            "QR code %s not found for deletion", filename
         )
         raise FileNotFoundError(
-            f"QR code {file_path.name} not found"
+            f"QR code {filename} not found"
         )
 
 
@@ -0,0 +1,289 @@
+"""
+This module provides the native raster backend for QR code images.
+
+Instead of letting an image library draw every module box one at a time, QR
+codes are encoded directly as 1-bit PNGs: greyscale for black and white codes, a
+two entry palette otherwise. ``write_png_rows`` renders them: it expands one
+module row at a time into a scanline and streams it through the compressor, so
+memory use grows with the width of the image rather than its area.
+
+The NumPy encoder works on whole pixel arrays; it re-encodes existing images.
+NumPy is optional: when it is not installed ``NATIVE_RASTER_AVAILABLE`` is False
+and re-encoding is unavailable. NumPy is only imported on first use, because
+importing it is a large share of start-up time.
+"""
+
+import importlib
+import importlib.util
+import struct
+import zlib
+from typing import BinaryIO, List, Optional, Sequence, Tuple
+
+import png
+
+NATIVE_RASTER_AVAILABLE = importlib.util.find_spec("numpy") is not None
+
+
+def load_numpy():
+    """
+    Returns the NumPy module, importing it on first use.
+    """
+    return importlib.import_module("numpy")
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# PNG colour types for 1-bit greyscale and palette images.
+PNG_COLOR_TYPE_GREYSCALE = 0
+PNG_COLOR_TYPE_PALETTE = 3
+
+# PNG scanline filter types by name. Deflate already matches the repeated rows
+# of a scaled QR code, so unfiltered rows usually compress best.
+PNG_FILTERS = {'none': 0, 'up': 2}
+
+# Size of the IDAT chunks written by the streaming encoder.
+IDAT_CHUNK_SIZE = 64 * 1024
+
+# zlib strategies by name.
+ZLIB_STRATEGIES = {
+    'default': zlib.Z_DEFAULT_STRATEGY,
+    'filtered': zlib.Z_FILTERED,
+    'huffman': zlib.Z_HUFFMAN_ONLY,
+    'rle': zlib.Z_RLE,
+    'fixed': zlib.Z_FIXED,
+}
+
+BLACK = (0, 0, 0)
+WHITE = (255, 255, 255)
+
+RGB = Tuple[int, int, int]
+
+
+def rasterize(matrix: Sequence[Sequence[bool]], box_size: int) -> "np.ndarray":
+    """
+    Scales a module matrix into a boolean pixel array.
+
+    Parameters:
+    - matrix: The QR code modules, border included, True for dark modules.
+    - box_size (int): Number of pixels per module along each axis.
+
+    Returns:
+    - A (height, width) boolean array, True for dark pixels.
+    """
+    np = load_numpy()
+    modules = np.asarray(matrix, dtype=bool)
+    return modules.repeat(box_size, axis=0).repeat(box_size, axis=1)
+
+
+def png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    """
+    Frames one PNG chunk with its length and CRC.
+    """
+    crc = zlib.crc32(data, zlib.crc32(chunk_type))
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", crc)
+
+
+def png_color_mode(palette: List[RGB]) -> Tuple[int, bytes, bool]:
+    """
+    Chooses how a two-colour image is stored: black and white images are written as
+    greyscale, which needs no palette chunk; other colour pairs use a two-entry palette.
+
+    Returns:
+    - The PNG colour type, the palette chunk (empty for greyscale) and whether pixel
+      values must be inverted, for black on white.
+    """
+    if list(palette) == [WHITE, BLACK]:
+        return PNG_COLOR_TYPE_GREYSCALE, b"", True
+    if list(palette) == [BLACK, WHITE]:
+        return PNG_COLOR_TYPE_GREYSCALE, b"", False
+    return PNG_COLOR_TYPE_PALETTE, png_chunk(
+        b"PLTE", bytes(component for color in palette for component in color)
+    ), False
+
+
+def check_encoder_options(png_filter: str, zlib_strategy: str):
+    """
+    Raises ValueError if the scanline filter or the zlib strategy is unknown.
+    """
+    if png_filter not in PNG_FILTERS:
+        raise ValueError(f"Unknown PNG filter: {png_filter}")
+    if zlib_strategy not in ZLIB_STRATEGIES:
+        raise ValueError(f"Unknown zlib strategy: {zlib_strategy}")
+
+
+def encode_png(pixels: "np.ndarray", palette: List[RGB], compression_level: int = 6,
+               png_filter: str = 'none', zlib_strategy: str = 'default') -> bytes:
+    """
+    Encodes a boolean pixel array as a 1-bit PNG.
+
+    Black and white images are written as greyscale, which needs no palette chunk;
+    other colour pairs use a two-entry palette.
+
+    Parameters:
+    - pixels: A (height, width) boolean array; False pixels use ``palette[0]``
+      and True pixels ``palette[1]``.
+    - palette: The background and foreground colours.
+    - compression_level (int): The zlib compression level, from 0 to 9.
+    - png_filter (str): Scanline filter, one of PNG_FILTERS.
+    - zlib_strategy (str): zlib strategy, one of ZLIB_STRATEGIES.
+
+    Returns:
+    - The PNG file contents.
+
+    Raises:
+    - ValueError: If the filter or strategy is unknown.
+    """
+    check_encoder_options(png_filter, zlib_strategy)
+    color_type, palette_chunk, inverted = png_color_mode(palette)
+    if inverted:
+        pixels = ~pixels
+
+    np = load_numpy()
+    height, width = pixels.shape
+    packed = np.packbits(pixels, axis=1)
+    if png_filter == 'up':
+        # Each byte minus the byte above it, modulo 256; the first row is unchanged
+        packed[1:] -= packed[:-1].copy()
+    # Each scanline starts with its filter type
+    scanlines = np.full((height, packed.shape[1] + 1), PNG_FILTERS[png_filter], dtype=np.uint8)
+    scanlines[:, 1:] = packed
+
+    compressor = zlib.compressobj(
+        compression_level, zlib.DEFLATED, zlib.MAX_WBITS, 9, ZLIB_STRATEGIES[zlib_strategy]
+    )
+    image_data = compressor.compress(scanlines.tobytes()) + compressor.flush()
+    header = struct.pack(">IIBBBBB", width, height, 1, color_type, 0, 0, 0)
+    return b"".join((
+        PNG_SIGNATURE,
+        png_chunk(b"IHDR", header),
+        palette_chunk,
+        png_chunk(b"IDAT", image_data),
+        png_chunk(b"IEND", b""),
+    ))
+
+
+def pack_module_row(row: Sequence[bool], box_size: int, inverted: bool = False) -> bytes:
+    """
+    Expands one row of modules into a packed 1-bit scanline, without its filter byte.
+
+    Parameters:
+    - row: The modules of the row, True for dark modules.
+    - box_size (int): Number of pixels per module.
+    - inverted (bool): Whether dark modules are 0 bits rather than 1 bits.
+
+    Returns:
+    - The scanline, padded with 0 bits to a whole byte.
+    """
+    dark, light = ("0", "1") if inverted else ("1", "0")
+    dark, light = dark * box_size, light * box_size
+    bits = "".join(dark if module else light for module in row)
+    bits += "0" * (-len(bits) % 8)
+    return int(bits, 2).to_bytes(len(bits) // 8, "big")
+
+
+def write_png_rows(matrix: Sequence[Sequence[bool]], box_size: int, palette: List[RGB],
+                   out: BinaryIO, compression_level: int = 6, png_filter: str = 'none',
+                   zlib_strategy: str = 'default', chunk_size: int = IDAT_CHUNK_SIZE):
+    """
+    Writes a module matrix to a file as a 1-bit PNG, one scanline at a time.
+
+    Each module row is expanded into a scanline once and fed to the compressor
+    ``box_size`` times, and compressed data is written out in IDAT chunks as it is
+    produced, so memory use grows with the image width, not with its area. NumPy
+    is not needed.
+
+    Parameters:
+    - matrix: The QR code modules, border included, True for dark modules.
+    - box_size (int): Number of pixels per module along each axis.
+    - palette: The background and foreground colours.
+    - out: A binary file object the PNG is written to.
+    - compression_level (int): The zlib compression level, from 0 to 9.
+    - png_filter (str): Scanline filter, one of PNG_FILTERS.
+    - zlib_strategy (str): zlib strategy, one of ZLIB_STRATEGIES.
+    - chunk_size (int): Size of the IDAT chunks.
+
+    Raises:
+    - ValueError: If the filter or strategy is unknown.
+    """
+    check_encoder_options(png_filter, zlib_strategy)
+    color_type, palette_chunk, inverted = png_color_mode(palette)
+    height = len(matrix) * box_size
+    width = len(matrix[0]) * box_size if matrix else 0
+    out.write(PNG_SIGNATURE)
+    out.write(png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 1, color_type, 0, 0, 0)))
+    out.write(palette_chunk)
+
+    compressor = zlib.compressobj(
+        compression_level, zlib.DEFLATED, zlib.MAX_WBITS, 9, ZLIB_STRATEGIES[zlib_strategy]
+    )
+    pending = bytearray()
+
+    def feed(data: bytes):
+        pending.extend(data)
+        while len(pending) >= chunk_size:
+            out.write(png_chunk(b"IDAT", bytes(pending[:chunk_size])))
+            del pending[:chunk_size]
+
+    filter_type = bytes([PNG_FILTERS[png_filter]])
+    previous = None
+    for row in matrix:
+        scanline = pack_module_row(row, box_size, inverted)
+        if png_filter == 'up':
+            # Only the first pixel row of a module row differs from the one above it
+            first = scanline if previous is None else bytes(
+                (byte - above) & 0xFF for byte, above in zip(scanline, previous)
+            )
+            feed(compressor.compress(filter_type + first))
+            repeated = filter_type + bytes(len(scanline))
+            for _ in range(box_size - 1):
+                feed(compressor.compress(repeated))
+        else:
+            filtered = filter_type + scanline
+            for _ in range(box_size):
+                feed(compressor.compress(filtered))
+        previous = scanline
+    feed(compressor.flush())
+    if pending or not height:
+        out.write(png_chunk(b"IDAT", bytes(pending)))
+    out.write(png_chunk(b"IEND", b""))
+
+
+def render_png(matrix: Sequence[Sequence[bool]], box_size: int,
+               fill_color: RGB, back_color: RGB, **encoder_options) -> bytes:
+    """
+    Renders a module matrix straight to PNG bytes.
+
+    Parameters:
+    - matrix: The QR code modules, border included, True for dark modules.
+    - box_size (int): Number of pixels per module along each axis.
+    - fill_color: RGB colour of the dark modules.
+    - back_color: RGB colour of the background.
+    - encoder_options: Keyword arguments for ``encode_png``.
+    """
+    return encode_png(rasterize(matrix, box_size), [back_color, fill_color], **encoder_options)
+
+
+def reencode_png(body: bytes, **encoder_options) -> Optional[bytes]:
+    """
+    Re-encodes an existing two-colour PNG with the native encoder.
+
+    Parameters:
+    - body: The PNG file contents.
+    - encoder_options: Keyword arguments for ``encode_png``.
+
+    Returns:
+    - The new PNG file contents, or None if the image has more than two colours.
+    """
+    np = load_numpy()
+    width, height, rows, _ = png.Reader(bytes=body).asRGB8()
+    pixels = np.vstack([np.frombuffer(bytes(row), dtype=np.uint8) for row in rows])
+    pixels = pixels.reshape(height, width, 3)
+    colors = np.unique(pixels.reshape(-1, 3), axis=0)
+    if len(colors) > 2:
+        return None
+    # The darker colour is the foreground
+    colors = sorted((tuple(int(c) for c in color) for color in colors), key=sum)
+    fill_color, back_color = colors[0], colors[-1]
+    dark = np.all(pixels == fill_color, axis=2) if len(colors) == 2 else np.zeros(
+        (height, width), dtype=bool
+    )
+    return encode_png(dark, [back_color, fill_color], **encoder_options)
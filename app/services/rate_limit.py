@@ -0,0 +1,401 @@
+"""
+This module provides admission control on the render path, per authenticated subject.
+
+Two limits apply to the ``sub`` claim of the bearer token:
+
+- A token bucket: every request takes a token, and tokens come back at
+  RATE_LIMIT_RATE per second up to RATE_LIMIT_BURST, so short bursts pass while the
+  sustained rate is capped.
+- A cap on the renders a subject has in flight at once, RENDER_CONCURRENCY_PER_SUBJECT,
+  so one client cannot occupy every render worker.
+
+The state lives in the worker process by default. The ``sqlite`` backend keeps it
+in a local SQLite database instead, so the limits hold across the gunicorn workers
+of a host; its operations run on a thread to keep the event loop free.
+"""
+
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from app.config import (
+    RATE_LIMIT_BACKEND, RATE_LIMIT_BURST, RATE_LIMIT_PATH, RATE_LIMIT_RATE,
+    RENDER_CONCURRENCY_PER_SUBJECT
+)
+from app.services.metrics import RATE_LIMIT_DECISIONS, Gauge, registry
+
+# Renders held longer than this are assumed to belong to a crashed worker.
+STALE_RENDER_SECONDS = 300
+# Number of subjects the in-process backend tracks before forgetting idle ones.
+MAX_TRACKED_SUBJECTS = 10000
+
+
+class RateLimitDecision(NamedTuple):
+    """
+    The outcome of taking a token: whether the request is allowed, and the values of
+    the RateLimit response headers.
+
+    Attributes:
+    - allowed (bool): Whether a token was available.
+    - limit (int): Capacity of the bucket.
+    - remaining (int): Whole tokens left after this request.
+    - reset (int): Seconds until the bucket is full again.
+    - retry_after (int): Seconds until a token is available, for rejected requests.
+    """
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: int
+    retry_after: int = 0
+
+    def headers(self) -> Dict[str, str]:
+        """
+        Returns the RateLimit headers describing this decision, with Retry-After
+        for rejected requests.
+        """
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(self.reset),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+
+def refill(tokens: float, updated_at: float, now: float, rate: float, burst: int) -> float:
+    """
+    Returns the tokens in a bucket at ``now``, given its content at ``updated_at``.
+    """
+    return min(float(burst), tokens + max(0.0, now - updated_at) * rate)
+
+
+def take_token(tokens: float, rate: float, burst: int) -> Tuple[float, RateLimitDecision]:
+    """
+    Takes one token from a bucket holding ``tokens`` and returns what is left with
+    the decision.
+    """
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    decision = RateLimitDecision(
+        allowed=allowed,
+        limit=burst,
+        remaining=int(tokens),
+        reset=math.ceil((burst - tokens) / rate),
+        retry_after=0 if allowed else math.ceil((1 - tokens) / rate),
+    )
+    return tokens, decision
+
+
+class MemoryRateLimitStore:
+    """
+    Rate limiter state held in the current process.
+    """
+
+    shared = False
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._renders: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def take(self, subject: str, rate: float, burst: int) -> RateLimitDecision:
+        """
+        Takes a token from the subject's bucket.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(subject, (float(burst), now))
+            tokens, decision = take_token(refill(tokens, updated_at, now, rate, burst),
+                                          rate, burst)
+            self._buckets[subject] = (tokens, now)
+            if len(self._buckets) > MAX_TRACKED_SUBJECTS:
+                self._forget_full_buckets(now, rate, burst)
+        return decision
+
+    def _forget_full_buckets(self, now: float, rate: float, burst: int):
+        # A full bucket holds no information: it is recreated full on next use.
+        for subject, (tokens, updated_at) in list(self._buckets.items()):
+            if refill(tokens, updated_at, now, rate, burst) >= burst:
+                del self._buckets[subject]
+
+    def acquire(self, subject: str, limit: int) -> Optional[str]:
+        """
+        Reserves a render slot for the subject and returns its handle, or None when
+        the subject already holds ``limit`` slots.
+        """
+        with self._lock:
+            if self._renders.get(subject, 0) >= limit:
+                return None
+            self._renders[subject] = self._renders.get(subject, 0) + 1
+        return subject
+
+    def release(self, subject: str, handle: str):  # pylint: disable=unused-argument
+        """
+        Frees a render slot reserved with acquire().
+        """
+        with self._lock:
+            count = self._renders.get(subject, 0) - 1
+            if count > 0:
+                self._renders[subject] = count
+            else:
+                self._renders.pop(subject, None)
+
+    def renders_in_flight(self) -> int:
+        """
+        Returns the number of render slots currently held.
+        """
+        return sum(self._renders.values())
+
+    def close(self):
+        """
+        Does nothing; the state lives as long as the process.
+        """
+
+
+class SQLiteRateLimitStore:
+    """
+    Rate limiter state in a local SQLite database, shared by the processes of a host.
+
+    Parameters:
+    - db_path (Path): Location of the SQLite database; it is created on first use.
+    """
+
+    shared = True
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            # Transactions are explicit: each operation is one BEGIN IMMEDIATE ... COMMIT.
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False,
+                                   isolation_level=None, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS buckets (
+                    subject TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS renders (
+                    handle TEXT PRIMARY KEY, subject TEXT NOT NULL, started_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS renders_subject ON renders (subject, started_at);
+                """
+            )
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        """
+        Closes the database connection; it is reopened on next use.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def take(self, subject: str, rate: float, burst: int) -> RateLimitDecision:
+        """
+        Takes a token from the subject's bucket.
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE subject = ?",
+                                   (subject,)).fetchone()
+                tokens = refill(*row, now, rate, burst) if row else float(burst)
+                tokens, decision = take_token(tokens, rate, burst)
+                conn.execute("INSERT OR REPLACE INTO buckets (subject, tokens, updated_at) "
+                             "VALUES (?, ?, ?)", (subject, tokens, now))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return decision
+
+    def acquire(self, subject: str, limit: int) -> Optional[str]:
+        """
+        Reserves a render slot for the subject and returns its handle, or None when
+        the subject already holds ``limit`` slots. Slots older than
+        STALE_RENDER_SECONDS are not counted, so a crashed worker cannot hold them forever.
+        """
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                held = conn.execute(
+                    "SELECT COUNT(*) FROM renders WHERE subject = ? AND started_at > ?",
+                    (subject, now - STALE_RENDER_SECONDS),
+                ).fetchone()[0]
+                handle = None
+                if held < limit:
+                    handle = f"{os.getpid()}-{uuid.uuid4().hex}"
+                    conn.execute("INSERT INTO renders (handle, subject, started_at) "
+                                 "VALUES (?, ?, ?)", (handle, subject, now))
+                conn.execute("DELETE FROM renders WHERE started_at <= ?",
+                             (now - STALE_RENDER_SECONDS,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return handle
+
+    def release(self, subject: str, handle: str):  # pylint: disable=unused-argument
+        """
+        Frees a render slot reserved with acquire().
+        """
+        with self._lock:
+            self._connection().execute("DELETE FROM renders WHERE handle = ?", (handle,))
+
+    def renders_in_flight(self) -> int:
+        """
+        Returns the number of render slots currently held on the host.
+        """
+        with self._lock:
+            return self._connection().execute(
+                "SELECT COUNT(*) FROM renders WHERE started_at > ?",
+                (time.time() - STALE_RENDER_SECONDS,),
+            ).fetchone()[0]
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """
+    Raised when a subject already has as many renders in flight as allowed.
+
+    Attributes:
+    - limit (int): The number of concurrent renders allowed per subject.
+    """
+
+    def __init__(self, limit: int):
+        super().__init__(f"At most {limit} concurrent renders are allowed")
+        self.limit = limit
+
+
+class RateLimiter:
+    """
+    Applies the token bucket and the concurrent render cap to subjects.
+
+    Parameters:
+    - store: MemoryRateLimitStore or SQLiteRateLimitStore.
+    - rate (float): Tokens added per second; 0 disables the token bucket.
+    - burst (int): Capacity of the bucket.
+    - max_renders (int): Renders a subject may have in flight; 0 disables the cap.
+    """
+
+    def __init__(self, store, rate: float, burst: int, max_renders: int):
+        self.store = store
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_renders = max_renders
+
+    async def _call(self, fn, *args):
+        if self.store.shared:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def check(self, subject: str) -> Optional[RateLimitDecision]:
+        """
+        Takes a token for a request of the subject.
+
+        Returns:
+        - The decision, or None when the token bucket is disabled.
+        """
+        if self.rate <= 0:
+            return None
+        decision = await self._call(self.store.take, subject, self.rate, self.burst)
+        RATE_LIMIT_DECISIONS.inc(limit="rate",
+                                 result="allowed" if decision.allowed else "rejected")
+        return decision
+
+    @asynccontextmanager
+    async def render_slot(self, subject: Optional[str]):
+        """
+        Holds one of the subject's concurrent render slots for the duration of the block.
+        Renders without a subject, such as those of job workers, take no slot.
+
+        Raises:
+        - ConcurrencyLimitExceeded: If every slot of the subject is taken.
+        """
+        if subject is None or self.max_renders <= 0:
+            yield
+            return
+        handle = await self._call(self.store.acquire, subject, self.max_renders)
+        RATE_LIMIT_DECISIONS.inc(limit="concurrency",
+                                 result="rejected" if handle is None else "allowed")
+        if handle is None:
+            raise ConcurrencyLimitExceeded(self.max_renders)
+        try:
+            yield
+        finally:
+            await self._call(self.store.release, subject, handle)
+
+
+class RateLimitHeadersMiddleware:
+    """
+    ASGI middleware adding the RateLimit headers of an admitted request to its
+    response, whatever kind of response the endpoint returns.
+
+    The headers are left in the request state by the enforce_rate_limit dependency.
+    Rejected requests carry them already, on their 429 response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = scope.get("state", {}).get("rate_limit_headers")
+                if headers:
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        *((name.lower().encode("latin-1"), value.encode("latin-1"))
+                          for name, value in headers.items()),
+                    ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+def create_rate_limit_store(backend: str = RATE_LIMIT_BACKEND, path: Path = RATE_LIMIT_PATH):
+    """
+    Creates the rate limiter state store from its backend name, 'memory' or 'sqlite'.
+
+    Raises:
+    - ValueError: If the backend is unknown.
+    """
+    if backend == 'memory':
+        return MemoryRateLimitStore()
+    if backend == 'sqlite':
+        return SQLiteRateLimitStore(path)
+    raise ValueError(f"Unknown rate limit backend: {backend}")
+
+
+rate_limiter = RateLimiter(create_rate_limit_store(), RATE_LIMIT_RATE, RATE_LIMIT_BURST,
+                           RENDER_CONCURRENCY_PER_SUBJECT)
+
+registry.register(Gauge(
+    "qr_renders_in_flight",
+    "Render slots held by subjects; host-wide with the sqlite backend.",
+    lambda: rate_limiter.store.renders_in_flight(),
+))
@@ -0,0 +1,169 @@
+"""
+This module provides the content-addressed render cache.
+
+Every rendered artifact is identified by a stable hash of the parameters that
+produced it, so two requests only share a file when they would render the same
+bytes. An in-memory LRU tier, bounded by the total size of its entries, sits in
+front of the storage driver so repeat hits skip both the render and the store
+lookup.
+
+The in-memory tier is local to each worker process, so it cannot see files deleted
+by another worker or outside the app. A remembered artifact is therefore only
+trusted for ``RENDER_CACHE_TTL`` seconds before the store is checked again.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from app.config import RENDER_CACHE_BYTES, RENDER_CACHE_TTL
+from app.services.storage import Storage
+
+# Approximate bookkeeping cost of an entry, on top of its filename.
+ENTRY_OVERHEAD = 256
+
+
+def render_key(data: str, size: int, fill_color: str, back_color: str,
+               border: int, error_correction: str, fmt: str, **encoder_options) -> str:
+    """
+    Computes the content address of a render.
+
+    Encoder options such as the PNG compression level change how the image is
+    compressed but not the image itself, so they are not part of the address.
+
+    Parameters:
+    - data (str): The data encoded in the QR code.
+    - size (int): The size of each box in the QR code grid.
+    - fill_color (str): Color of the QR code.
+    - back_color (str): Background color of the QR code.
+    - border (int): Width of the quiet zone, in modules.
+    - error_correction (str): Error correction level (L, M, Q or H).
+    - fmt (str): Output format, such as 'png'.
+    - encoder_options: Ignored encoder options, accepted so render parameters can be
+      passed through unchanged.
+
+    Returns:
+    - The hex SHA-256 digest of the canonical parameter set.
+    """
+    canonical = json.dumps(
+        {
+            "data": str(data),
+            "size": int(size),
+            "fill_color": fill_color.strip().lower(),
+            "back_color": back_color.strip().lower(),
+            "border": int(border),
+            "error_correction": error_correction.upper(),
+            "format": fmt.lower(),
+        },
+        sort_keys=True,
+        separators=(',', ':'),
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class CacheEntry(NamedTuple):
+    """
+    A cached artifact: its filename in the store and when it was last seen there.
+    """
+    filename: str
+    checked_at: float
+
+    @property
+    def weight(self) -> int:
+        """
+        Number of bytes charged against the cache budget for this entry.
+        """
+        return ENTRY_OVERHEAD + len(self.filename)
+
+
+class RenderCache:
+    """
+    An LRU cache of rendered artifacts evicting by the total byte size of its entries.
+
+    Parameters:
+    - max_bytes (int): Budget for all entries; 0 disables the in-memory tier.
+    - ttl (float): Seconds a remembered artifact is trusted before the store is checked again.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float = 5.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def current_bytes(self) -> int:
+        """
+        Number of bytes currently charged against the budget.
+        """
+        return self._bytes
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """
+        Returns the cached entry for ``key`` and marks it as recently used.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, filename: str):
+        """
+        Records that the artifact for ``key`` is stored as ``filename``, evicting least
+        recently used entries until it fits the budget.
+        """
+        entry = CacheEntry(filename, time.monotonic())
+        if entry.weight > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.weight
+            self._entries[key] = entry
+            self._bytes += entry.weight
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.weight
+
+    def discard(self, key: str):
+        """
+        Removes ``key`` from the cache if present.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.weight
+
+    def clear(self):
+        """
+        Removes every entry from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def exists(self, key: str, filename: str, storage: Storage) -> bool:
+        """
+        Checks whether the artifact for ``key`` is available, consulting the
+        in-memory tier before looking ``filename`` up in ``storage``. Entries older
+        than ``ttl`` are checked against the store again.
+        """
+        entry = self.get(key)
+        if entry is not None and time.monotonic() - entry.checked_at < self.ttl:
+            return True
+        if storage.exists(filename):
+            self.put(key, filename)
+            return True
+        self.discard(key)
+        return False
+
+
+render_cache = RenderCache(RENDER_CACHE_BYTES, RENDER_CACHE_TTL)
@@ -0,0 +1,169 @@
+"""
+This module provides the render executor used to run CPU-bound QR code rendering
+outside of the event loop. Render jobs are dispatched to a process pool, and the
+number of jobs that may be running or waiting at once is bounded so that a burst
+of requests is rejected early instead of piling up behind busy workers.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from app.config import RENDER_EXECUTOR, RENDER_QUEUE_SIZE, RENDER_RETRY_AFTER, RENDER_WORKERS
+from app.services.log_pipeline import add_render_timings
+from app.services.metrics import (
+    RENDER_JOB_SECONDS, Gauge, call_with_stage_timings, observe_stage_timings, registry
+)
+from app.services.qr_service import preload_renderers
+
+
+class RenderUnavailable(Exception):
+    """
+    Raised when the render executor cannot run a job right now.
+
+    Attributes:
+    - retry_after (int): Suggested number of seconds the client should wait before retrying.
+    """
+
+    def __init__(self, retry_after: int, message: str = "Render workers are unavailable"):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RenderQueueFull(RenderUnavailable):
+    """
+    Raised when the render executor cannot accept any more work.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(retry_after, "Render queue is full")
+
+
+class RenderExecutor:
+    """
+    A bounded pool of render workers that can be awaited from request handlers.
+
+    Parameters:
+    - max_workers (int): Number of worker processes (or threads) used for rendering.
+    - queue_size (int): Number of jobs allowed to wait once every worker is busy.
+    - retry_after (int): Retry-After hint, in seconds, reported when the queue is full.
+    - kind (str): Either 'process' or 'thread'.
+    """
+
+    def __init__(self, max_workers: int, queue_size: int, retry_after: int,
+                 kind: str = 'process'):
+        if kind not in ('process', 'thread'):
+            raise ValueError(f"Unknown render executor kind: {kind}")
+        self.max_workers = max(1, max_workers)
+        self.max_pending = self.max_workers + max(0, queue_size)
+        self.retry_after = retry_after
+        self.kind = kind
+        self._pool: Optional[Executor] = None
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._closing = False
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Number of render jobs currently running or waiting for a worker.
+        """
+        return self._pending
+
+    def start(self):
+        """
+        Creates the worker pool. Calling it on a running executor is a no-op.
+        """
+        self._closing = False
+        if self._pool is None:
+            if self.kind == 'process':
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers, initializer=preload_renderers
+                )
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix='qr-render'
+                )
+            logging.info(
+                "Render executor started with %d %s workers", self.max_workers, self.kind
+            )
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stops accepting new jobs and shuts the worker pool down.
+
+        Parameters:
+        - wait (bool): Whether to block until the jobs already submitted have finished.
+        """
+        self._closing = True
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+            logging.info("Render executor stopped")
+
+    def _discard_pool(self, pool: Executor):
+        """
+        Shuts a broken pool down, unless another job already replaced it.
+        """
+        if self._pool is pool:
+            self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def submit(self, fn: Callable, *args, **kwargs):
+        """
+        Runs ``fn(*args, **kwargs)`` on a worker and waits for its result.
+
+        Raises:
+        - RenderQueueFull: If the executor is shutting down or already holds
+          ``max_pending`` jobs.
+        - RenderUnavailable: If a worker process died while the job was running.
+          The broken pool is discarded and a new one is started on the next job.
+        """
+        with self._pending_lock:
+            if self._closing or self._pending >= self.max_pending:
+                raise RenderQueueFull(self.retry_after)
+            self._pending += 1
+        if self._pool is None:
+            self.start()
+        pool = self._pool
+        try:
+            try:
+                future = pool.submit(
+                    functools.partial(call_with_stage_timings, fn, *args, **kwargs)
+                )
+            except BaseException:
+                self._release()
+                raise
+            # The job holds its slot until it finishes in the pool, even when the caller
+            # stops waiting for it, so cancelled requests cannot overfill the queue.
+            future.add_done_callback(self._release)
+            with RENDER_JOB_SECONDS.time():
+                result, timings = await asyncio.wrap_future(future)
+            observe_stage_timings(timings)
+            add_render_timings(timings)
+            return result
+        except BrokenProcessPool as e:
+            logging.error("Render worker died unexpectedly, restarting the pool")
+            self._discard_pool(pool)
+            raise RenderUnavailable(self.retry_after, "Render worker crashed") from e
+
+    def _release(self, _future=None):
+        # Called from a pool thread when a job finishes.
+        with self._pending_lock:
+            self._pending -= 1
+
+render_executor = RenderExecutor(
+    max_workers=RENDER_WORKERS,
+    queue_size=RENDER_QUEUE_SIZE,
+    retry_after=RENDER_RETRY_AFTER,
+    kind=RENDER_EXECUTOR,
+)
+
+registry.register(Gauge(
+    "qr_render_queue_depth", "Render jobs submitted and not finished yet.",
+    lambda: render_executor.queue_depth,
+))
@@ -0,0 +1,126 @@
+"""
+This module plans how QR code payloads are encoded.
+
+A QR code payload is a sequence of segments, each in one mode: numeric (3.33 bits
+per digit), alphanumeric (5.5 bits per character of ``0-9A-Z $%*+-./:``) or byte
+(8 bits per byte). Every segment also pays a mode indicator and a character count
+whose width depends on the version, so switching modes only pays off for long
+enough runs. The planner finds the segmentation with the fewest bits by dynamic
+programming over the payload bytes, once per range of versions sharing the same
+count widths, and picks the smallest version whose capacity holds the result for
+the requested error correction level. The ``qrcode`` package then encodes the
+planned segments at that version directly, instead of trying versions one by one.
+"""
+
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple
+
+from qrcode import util
+from qrcode.exceptions import DataOverflowError
+
+# Modes in the order of the cost arrays below.
+MODES = (util.MODE_8BIT_BYTE, util.MODE_ALPHA_NUM, util.MODE_NUMBER)
+
+# Cost of one byte in each mode, in sixths of a bit so that 10/3 and 11/2 are whole.
+CHAR_COSTS = (8 * 6, 33, 20)
+
+# Versions sharing the same character count widths.
+VERSION_RANGES = ((1, 9), (10, 26), (27, 40))
+
+NUMERIC = frozenset(b"0123456789")
+ALPHANUMERIC = frozenset(util.ALPHA_NUM)
+
+
+class EncodingPlan(NamedTuple):
+    """
+    How a payload is encoded: the smallest version it fits in, its segments, and
+    the number of data bits they take.
+    """
+    version: int
+    segments: Tuple[util.QRData, ...]
+    bits: int
+
+
+def optimal_modes(data: bytes, count_bits: Tuple[int, int, int]) -> Tuple[List[int], int]:
+    """
+    Chooses the mode of every byte of the payload so that the encoded size is minimal.
+
+    Parameters:
+    - data (bytes): The payload.
+    - count_bits (tuple): Width of the character count of each mode in MODES.
+
+    Returns:
+    - The mode of each byte and the total number of bits, headers included.
+    """
+    head_costs = [(4 + bits) * 6 for bits in count_bits]
+    costs = list(head_costs)
+    # came_from[i][j]: mode of byte i when the segmentation is in mode j after it.
+    came_from = []
+    for byte in data:
+        current = [costs[0] + CHAR_COSTS[0], float("inf"), float("inf")]
+        modes = [0, None, None]
+        if byte in ALPHANUMERIC:
+            current[1] = costs[1] + CHAR_COSTS[1]
+            modes[1] = 1
+        if byte in NUMERIC:
+            current[2] = costs[2] + CHAR_COSTS[2]
+            modes[2] = 2
+        # Starting a new segment after this byte: pad the segment to whole bits.
+        for to_mode, head_cost in enumerate(head_costs):
+            for from_mode in range(len(MODES)):
+                if modes[from_mode] is None:
+                    continue
+                cost = -(-current[from_mode] // 6) * 6 + head_cost
+                if cost < current[to_mode]:
+                    current[to_mode] = cost
+                    modes[to_mode] = modes[from_mode]
+        came_from.append(modes)
+        costs = current
+
+    mode = min(range(len(MODES)), key=costs.__getitem__)
+    bits = -(-int(costs[mode]) // 6)
+    chosen = [0] * len(data)
+    for index in range(len(data) - 1, -1, -1):
+        mode = came_from[index][mode]
+        chosen[index] = mode
+    return chosen, bits
+
+
+def split_segments(data: bytes, modes: List[int]) -> Tuple[util.QRData, ...]:
+    """
+    Groups consecutive bytes of the same mode into segments.
+    """
+    segments = []
+    start = 0
+    for index in range(1, len(data) + 1):
+        if index == len(data) or modes[index] != modes[start]:
+            segments.append(util.QRData(data[start:index], mode=MODES[modes[start]],
+                                        check_data=False))
+            start = index
+    return tuple(segments)
+
+
+@lru_cache(maxsize=1024)
+def plan_encoding(data: str, error_correction: int) -> EncodingPlan:
+    """
+    Plans the segments of a payload and the smallest version that holds them.
+
+    Parameters:
+    - data (str): The payload, encoded as UTF-8.
+    - error_correction (int): Error correction level, a ``qrcode.constants`` value.
+
+    Returns:
+    - The encoding plan.
+
+    Raises:
+    - DataOverflowError: If the payload does not fit in a version 40 QR code.
+    """
+    payload = data.encode("utf-8")
+    limits = util.BIT_LIMIT_TABLE[error_correction]
+    for first, last in VERSION_RANGES:
+        sizes = util.mode_sizes_for_version(first)
+        modes, bits = optimal_modes(payload, tuple(sizes[mode] for mode in MODES))
+        for version in range(first, last + 1):
+            if bits <= limits[version]:
+                return EncodingPlan(version, split_segments(payload, modes), bits)
+    raise DataOverflowError()
@@ -0,0 +1,226 @@
+"""
+This module provides a render cache shared by every worker process on a host.
+
+It holds the images rendered in memory by ``GET /qr-codes/render``, which are
+never stored. They are kept in a file mapped into memory, by default under
+``/dev/shm``, so the gunicorn workers of a host share one warm cache of them
+instead of each rendering its own. Codes created through the other endpoints,
+warm-ups and jobs are not kept here: they are written to the store, which every
+worker already checks before rendering.
+
+The file is a slab of fixed-size slots grouped in sets: a render key always maps
+to the same set, and its image is stored in one of the set's slots. When a set is full, a CLOCK hand picks the slot to reuse:
+slots hit since the hand last passed get a second chance.
+
+Lookups take no lock: a reader copies the image out of its slot once and checks
+it against the key and the checksum written with it, so an image being replaced
+concurrently is seen as a miss, never as corrupt data. Writers lock their set
+with a lock shared between processes. Images larger than a slot are not cached.
+"""
+
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Optional
+
+from app.config import SHARED_CACHE_BYTES, SHARED_CACHE_PATH, SHARED_CACHE_SLOT_BYTES
+from app.services.metrics import SHARED_CACHE_REQUESTS
+
+# Bump when the layout or the rendered images change, so stale caches are reset.
+MAGIC = b"QRSHM002"
+# Magic, slots per set, number of sets and slot size.
+HEADER = struct.Struct("<8sIII")
+HEADER_SIZE = 64
+# Key, image length, image CRC-32 and CLOCK reference bit.
+SLOT_HEADER = struct.Struct("<32sIIB")
+SLOT_DATA_OFFSET = 48
+EMPTY_KEY = bytes(32)
+
+
+class SharedRenderCache:
+    """
+    A set-associative cache of rendered images in shared memory, with CLOCK eviction
+    within each set.
+
+    The file is mapped on first use, so processes forked before that, such as
+    gunicorn workers of a preloaded app, each map it themselves. Its space is
+    reserved when it is mapped; if the file system is full, the cache is disabled.
+
+    Parameters:
+    - path (Path): The file backing the cache; it is created or reset as needed.
+    - max_bytes (int): Size of the cache; 0 disables it.
+    - slot_bytes (int): Size of a slot, which bounds the size of a cached image.
+    - ways (int): Number of slots per set.
+    """
+
+    def __init__(self, path: Path, max_bytes: int, slot_bytes: int = 16384, ways: int = 8):
+        self.path = Path(path)
+        self.slot_bytes = max(slot_bytes, SLOT_DATA_OFFSET + 1)
+        self.ways = ways
+        self.sets = max_bytes // (self.slot_bytes * ways)
+        self.enabled = self.sets > 0
+        self._hands_offset = HEADER_SIZE
+        self._slots_offset = HEADER_SIZE + -(-self.sets // 64) * 64
+        self._size = self._slots_offset + self.sets * ways * self.slot_bytes
+        self._map: Optional[mmap.mmap] = None
+        self._fd: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def max_image_bytes(self) -> int:
+        """
+        Size of the largest image a slot holds.
+        """
+        return self.slot_bytes - SLOT_DATA_OFFSET
+
+    def _mapping(self) -> Optional[mmap.mmap]:
+        if self._map is None and self.enabled:
+            with self._lock:
+                if self._map is None and self.enabled:
+                    self._open()
+        return self._map
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            # Workers starting at once must not reset the file under each other.
+            fcntl.lockf(fd, fcntl.LOCK_EX, HEADER_SIZE, 0)
+            try:
+                header = HEADER.pack(MAGIC, self.ways, self.sets, self.slot_bytes)
+                if (os.fstat(fd).st_size != self._size
+                        or os.pread(fd, HEADER.size, 0) != header):
+                    os.ftruncate(fd, 0)
+                    os.ftruncate(fd, self._size)
+                    os.pwrite(fd, header, 0)
+                # A truncated file is sparse: on a full tmpfs, writing to a page that
+                # was never allocated raises SIGBUS. Allocate every page up front.
+                os.posix_fallocate(fd, 0, self._size)
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN, HEADER_SIZE, 0)
+            self._map = mmap.mmap(fd, self._size, mmap.MAP_SHARED)
+        except OSError as e:
+            os.close(fd)
+            logging.warning("Shared render cache %s disabled: %s", self.path, e)
+            self.enabled = False
+            return
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def _set_slots(self, key: bytes) -> range:
+        first = int.from_bytes(key[:8], "little") % self.sets * self.ways
+        return range(first, first + self.ways)
+
+    def _slot_offset(self, slot: int) -> int:
+        return self._slots_offset + slot * self.slot_bytes
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Returns the image cached for a render key, or None.
+        """
+        mapping = self._mapping()
+        if mapping is None:
+            return None
+        digest = bytes.fromhex(key)
+        for slot in self._set_slots(digest):
+            offset = self._slot_offset(slot)
+            slot_key, length, crc, _ = SLOT_HEADER.unpack_from(mapping, offset)
+            if slot_key != digest or length > self.max_image_bytes:
+                continue
+            start = offset + SLOT_DATA_OFFSET
+            body = mapping[start:start + length]
+            if zlib.crc32(body) != crc or mapping[offset:offset + 32] != digest:
+                break
+            # Reference bit for the CLOCK hand; a lost update only costs a second chance.
+            mapping[offset + SLOT_HEADER.size - 1] = 1
+            SHARED_CACHE_REQUESTS.inc(result="hit")
+            return body
+        SHARED_CACHE_REQUESTS.inc(result="miss")
+        return None
+
+    def put(self, key: str, body: bytes) -> bool:
+        """
+        Caches the image of a render key, replacing a slot of its set if it is full.
+
+        Returns:
+        - Whether the image was cached; images larger than a slot are not.
+        """
+        if len(body) > self.max_image_bytes:
+            return False
+        mapping = self._mapping()
+        if mapping is None:
+            return False
+        digest = bytes.fromhex(key)
+        slots = self._set_slots(digest)
+        set_index = slots.start // self.ways
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, self._hands_offset + set_index)
+            try:
+                slot = self._victim(mapping, slots, digest, set_index)
+                offset = self._slot_offset(slot)
+                # Invalidate the slot before overwriting it, then publish the key last.
+                mapping[offset:offset + 32] = EMPTY_KEY
+                start = offset + SLOT_DATA_OFFSET
+                mapping[start:start + len(body)] = body
+                SLOT_HEADER.pack_into(mapping, offset, EMPTY_KEY, len(body), zlib.crc32(body), 0)
+                mapping[offset:offset + 32] = digest
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, self._hands_offset + set_index)
+        return True
+
+    def _victim(self, mapping: mmap.mmap, slots: range, digest: bytes, set_index: int) -> int:
+        # The slot already holding the key, else an empty one, else the CLOCK choice.
+        empty = None
+        for slot in slots:
+            slot_key = mapping[self._slot_offset(slot):self._slot_offset(slot) + 32]
+            if slot_key == digest:
+                return slot
+            if empty is None and slot_key == EMPTY_KEY:
+                empty = slot
+        if empty is not None:
+            return empty
+        hand_offset = self._hands_offset + set_index
+        hand = mapping[hand_offset] % self.ways
+        while True:
+            slot = slots.start + hand
+            reference = self._slot_offset(slot) + SLOT_HEADER.size - 1
+            hand = (hand + 1) % self.ways
+            if mapping[reference]:
+                mapping[reference] = 0
+                continue
+            mapping[hand_offset] = hand
+            return slot
+
+    def clear(self):
+        """
+        Empties the cache for every process sharing it.
+        """
+        mapping = self._mapping()
+        if mapping is None:
+            return
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, self.sets, self._hands_offset)
+            try:
+                mapping[self._hands_offset:self._size] = bytes(self._size - self._hands_offset)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self.sets, self._hands_offset)
+
+    def close(self):
+        """
+        Unmaps the cache; it is mapped again on next use. The shared file is kept.
+        """
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                os.close(self._fd)
+                self._map = self._fd = None
+
+
+shared_cache = SharedRenderCache(SHARED_CACHE_PATH, SHARED_CACHE_BYTES, SHARED_CACHE_SLOT_BYTES)
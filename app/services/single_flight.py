@@ -0,0 +1,50 @@
+"""
+This module provides per-key single-flight deduplication for coroutines.
+
+When several callers ask for the same key while a call for that key is already
+running, they all await the result of that one call instead of repeating it.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls sharing a key into a single in-flight call.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def in_flight(self, key: str) -> bool:
+        """
+        Checks whether a call for ``key`` is currently running.
+        """
+        return key in self._calls
+
+    async def do(self, key: str, fn: Callable[..., Awaitable], *args, **kwargs):
+        """
+        Awaits ``fn(*args, **kwargs)``, or the call already running for ``key``.
+
+        The result, or the exception, of the leading call is delivered to every
+        caller that joined it. A caller being cancelled does not cancel the call
+        the other callers are waiting for.
+        """
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._run(key, fn, *args, **kwargs))
+            self._calls[key] = future
+        return await asyncio.shield(future)
+
+    async def _run(self, key: str, fn: Callable[..., Awaitable], *args, **kwargs):
+        try:
+            return await fn(*args, **kwargs)
+        finally:
+            self._calls.pop(key, None)
+
+
+render_flight = SingleFlight()
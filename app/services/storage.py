@@ -0,0 +1,339 @@
+"""
+This module provides the storage drivers holding QR code images and their metadata.
+
+Every driver implements the same small interface: put, get, exists, delete and
+iterate over object names. Three drivers are available:
+
+- ``flat``: every object in one directory, the original layout.
+- ``sharded``: objects spread over two levels of hash-named subdirectories, so no
+  directory grows past a few thousand entries.
+- ``s3``: objects in an S3-compatible bucket, through a boto3 client.
+
+Objects are addressed by name only; a QR code image and its metadata file share a
+stem, and the sharded layout keeps them in the same subdirectory.
+"""
+
+import hashlib
+import mimetypes
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterator, Optional
+
+from app.config import (
+    QR_DIRECTORY, S3_BUCKET, S3_ENDPOINT_URL, S3_PREFIX, S3_PUBLIC_URL, SERVER_BASE_URL,
+    SERVER_DOWNLOAD_FOLDER, STORAGE_DRIVER
+)
+
+STORAGE_DRIVERS = ('flat', 'sharded', 's3')
+
+
+def atomic_write_bytes(path: Path, body: bytes):
+    """
+    Writes ``body`` to ``path`` so that readers only ever see the old or the complete new file.
+
+    The data is written to a hidden temporary file in the same directory, which is then
+    renamed over ``path``. The file is made world-readable so nginx can serve it.
+
+    Parameters:
+    - path (Path): The destination file.
+    - body (bytes): The content to write.
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    try:
+        os.fchmod(fd, 0o644)
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(body)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+class Storage(ABC):
+    """
+    The interface of the storage drivers.
+
+    Parameters:
+    - base_url (str): Public URL under which the stored objects are downloaded.
+    """
+
+    driver = ''
+    # Whether operations go over the network and should stay off the event loop.
+    remote = False
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip('/')
+
+    @abstractmethod
+    def put(self, name: str, body: bytes):
+        """
+        Stores ``body`` under ``name``, atomically replacing any previous object.
+        """
+
+    @abstractmethod
+    def get(self, name: str) -> bytes:
+        """
+        Returns the object stored under ``name``.
+
+        Raises:
+        - FileNotFoundError: If there is no such object.
+        """
+
+    @abstractmethod
+    def exists(self, name: str) -> bool:
+        """
+        Checks whether an object is stored under ``name``.
+        """
+
+    @abstractmethod
+    def delete(self, name: str) -> bool:
+        """
+        Deletes the object stored under ``name`` and returns whether there was one.
+        """
+
+    @abstractmethod
+    def iterate(self) -> Iterator[str]:
+        """
+        Yields the names of the stored objects, in no particular order.
+        """
+
+    @abstractmethod
+    def modified(self, name: str) -> float:
+        """
+        Returns the last modification time of an object as a POSIX timestamp.
+
+        Raises:
+        - FileNotFoundError: If there is no such object.
+        """
+
+    def key(self, name: str) -> str:
+        """
+        Returns the location of an object relative to the storage root.
+        """
+        return name
+
+    def url(self, name: str) -> str:
+        """
+        Returns the public download URL of an object.
+        """
+        return f"{self.base_url}/{self.key(name)}"
+
+    def local_path(self, name: str) -> Optional[Path]:
+        """
+        Returns the filesystem path of an object, or None when it is not stored locally.
+        """
+        return None
+
+
+class LocalStorage(Storage):
+    """
+    Base class of the drivers keeping objects in a local directory.
+
+    Parameters:
+    - directory (Path): The root directory of the store.
+    """
+
+    def __init__(self, directory: Path, base_url: str):
+        super().__init__(base_url)
+        self.directory = Path(directory)
+
+    def local_path(self, name: str) -> Path:
+        return self.directory / self.key(name)
+
+    def put(self, name: str, body: bytes):
+        path = self.local_path(name)
+        try:
+            atomic_write_bytes(path, body)
+        except FileNotFoundError:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_bytes(path, body)
+
+    def get(self, name: str) -> bytes:
+        return self.local_path(name).read_bytes()
+
+    def exists(self, name: str) -> bool:
+        return self.local_path(name).is_file()
+
+    def delete(self, name: str) -> bool:
+        try:
+            self.local_path(name).unlink()
+        except FileNotFoundError:
+            return False
+        return True
+
+    def modified(self, name: str) -> float:
+        return self.local_path(name).stat().st_mtime
+
+    @staticmethod
+    def _iter_files(directory: Path) -> Iterator[str]:
+        # Hidden files are temporary files of writes in progress.
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.name.startswith('.') and entry.is_file():
+                        yield entry.name
+        except FileNotFoundError:
+            return
+
+
+class FlatStorage(LocalStorage):
+    """
+    Stores every object directly in the root directory.
+    """
+
+    driver = 'flat'
+
+    def iterate(self) -> Iterator[str]:
+        return self._iter_files(self.directory)
+
+
+class ShardedStorage(LocalStorage):
+    """
+    Stores objects two subdirectories deep, e.g. ``3f/a2/<name>``.
+
+    The subdirectories come from a hash of the name up to its first dot, so they are
+    evenly filled whatever the names look like, and an image and its metadata end up
+    side by side.
+    """
+
+    driver = 'sharded'
+
+    def key(self, name: str) -> str:
+        digest = hashlib.sha256(name.partition('.')[0].encode('utf-8')).hexdigest()
+        return f"{digest[:2]}/{digest[2:4]}/{name}"
+
+    def iterate(self) -> Iterator[str]:
+        for level1 in sorted(self.directory.glob('[0-9a-f][0-9a-f]')):
+            for level2 in sorted(level1.glob('[0-9a-f][0-9a-f]')):
+                yield from self._iter_files(level2)
+
+
+class S3Storage(Storage):
+    """
+    Stores objects in an S3-compatible bucket.
+
+    The boto3 client is created on first use, in each process, so the driver can be
+    handed to render workers. Any object with the same methods as a boto3 S3 client
+    can be passed instead, such as a client for a local stand-in of S3.
+
+    Parameters:
+    - bucket (str): The bucket name.
+    - prefix (str): Prefix of every object key, e.g. ``qr-codes/``.
+    - endpoint_url (str): Endpoint of an S3-compatible service; None for AWS.
+    - client: A ready S3 client; by default one is created with boto3.
+    """
+
+    driver = 's3'
+    remote = True
+
+    # Error codes S3 uses for a missing key, depending on the operation.
+    MISSING_CODES = {'NoSuchKey', 'NotFound', '404'}
+
+    def __init__(self, bucket: str, base_url: str, prefix: str = '',
+                 endpoint_url: Optional[str] = None, client=None):
+        super().__init__(base_url)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.endpoint_url = endpoint_url
+        self._client = client
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_client'] = None
+        return state
+
+    @property
+    def client(self):
+        """
+        The S3 client, created with boto3 on first use.
+        """
+        if self._client is None:
+            try:
+                import boto3  # pylint: disable=import-outside-toplevel
+            except ImportError as e:
+                raise RuntimeError("The s3 storage driver requires boto3") from e
+            self._client = boto3.client('s3', endpoint_url=self.endpoint_url)
+        return self._client
+
+    def key(self, name: str) -> str:
+        return f"{self.prefix}{name}"
+
+    def _is_missing(self, error: Exception) -> bool:
+        code = getattr(error, 'response', {}).get('Error', {}).get('Code')
+        return code in self.MISSING_CODES
+
+    def _head(self, name: str) -> dict:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.key(name))
+        except Exception as e:  # pylint: disable=broad-except
+            if self._is_missing(e):
+                raise FileNotFoundError(name) from e
+            raise
+
+    def put(self, name: str, body: bytes):
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        self.client.put_object(
+            Bucket=self.bucket, Key=self.key(name), Body=body, ContentType=content_type
+        )
+
+    def get(self, name: str) -> bytes:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.key(name))
+        except Exception as e:  # pylint: disable=broad-except
+            if self._is_missing(e):
+                raise FileNotFoundError(name) from e
+            raise
+        return response['Body'].read()
+
+    def exists(self, name: str) -> bool:
+        try:
+            self._head(name)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def delete(self, name: str) -> bool:
+        # Deleting a missing key succeeds on S3, so check first to report it.
+        if not self.exists(name):
+            return False
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(name))
+        return True
+
+    def modified(self, name: str) -> float:
+        return self._head(name)['LastModified'].timestamp()
+
+    def iterate(self) -> Iterator[str]:
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get('Contents', []):
+                yield item['Key'][len(self.prefix):]
+
+
+def create_storage(driver: str = STORAGE_DRIVER, directory: Path = QR_DIRECTORY) -> Storage:
+    """
+    Creates a storage driver from its name and the application settings.
+
+    Parameters:
+    - driver (str): One of STORAGE_DRIVERS.
+    - directory (Path): Root directory of the local drivers.
+
+    Raises:
+    - ValueError: If the driver is unknown or the s3 driver has no bucket.
+    """
+    local_url = f"{SERVER_BASE_URL}/{SERVER_DOWNLOAD_FOLDER}"
+    if driver == 'flat':
+        return FlatStorage(directory, local_url)
+    if driver == 'sharded':
+        return ShardedStorage(directory, local_url)
+    if driver == 's3':
+        if not S3_BUCKET:
+            raise ValueError("The s3 storage driver requires S3_BUCKET")
+        endpoint = S3_ENDPOINT_URL or 'https://s3.amazonaws.com'
+        public_url = S3_PUBLIC_URL or f"{endpoint}/{S3_BUCKET}"
+        return S3Storage(S3_BUCKET, public_url, prefix=S3_PREFIX, endpoint_url=S3_ENDPOINT_URL)
+    raise ValueError(f"Unknown storage driver: {driver}")
+
+
+qr_storage = create_storage()
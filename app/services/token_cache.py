@@ -0,0 +1,166 @@
+"""
+This module provides the cache of verified access tokens and the revocation list.
+
+Verifying a JWT means an HMAC check plus JSON decoding. Clients send the same
+token on every request, so successfully verified claims are remembered for a
+short, bounded time that never outlives the token's own ``exp``.
+
+Revoked token ids are kept in a local SQLite database shared by the processes of
+a host, so a token revoked through one gunicorn worker is rejected by all of them.
+They are kept until their tokens would have expired anyway; ids of tokens without
+an ``exp`` are kept for good.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from app.config import AUTH_CACHE_SIZE, AUTH_CACHE_TTL, REVOCATION_PATH
+
+
+class RevocationList:
+    """
+    The ids of revoked tokens, in a local SQLite database.
+
+    Parameters:
+    - db_path (Path): Location of the SQLite database; it is created on first use.
+      None keeps the list in memory, private to this object.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.db_path is None:
+                conn = sqlite3.connect(":memory:", check_same_thread=False)
+            else:
+                self.db_path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=5)
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS revoked_tokens "
+                "(token_id TEXT PRIMARY KEY, expires_at REAL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def add(self, token_id: str, expires_at: Optional[float]):
+        """
+        Revokes a token id until ``expires_at``, or for good when it is None. Ids of
+        tokens that have expired since are dropped.
+        """
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO revoked_tokens (token_id, expires_at) "
+                             "VALUES (?, ?)", (token_id, expires_at))
+                conn.execute("DELETE FROM revoked_tokens WHERE expires_at <= ?", (time.time(),))
+
+    def __contains__(self, token_id: str) -> bool:
+        with self._lock:
+            return self._connection().execute(
+                "SELECT 1 FROM revoked_tokens WHERE token_id = ?", (token_id,)
+            ).fetchone() is not None
+
+    def clear(self):
+        """
+        Forgets every revocation.
+        """
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM revoked_tokens")
+
+    def close(self):
+        """
+        Closes the database connection; it is reopened on next use. An in-memory
+        list is lost.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class TokenCache:
+    """
+    A bounded LRU cache of verified token claims with per-entry expiry.
+
+    Parameters:
+    - max_entries (int): Maximum number of cached tokens; 0 disables caching.
+    - ttl (float): Longest time, in seconds, a verification is reused.
+    - revocations (RevocationList): Where revoked token ids are kept; by default in
+      memory.
+    """
+
+    def __init__(self, max_entries: int, ttl: float,
+                 revocations: Optional[RevocationList] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.revocations = revocations if revocations is not None else RevocationList()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> Optional[dict]:
+        """
+        Returns the cached claims of ``token``, or None if it must be verified again.
+        """
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            claims, expires_at = entry
+            if time.time() >= expires_at:
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return claims
+
+    def put(self, token: str, claims: dict):
+        """
+        Caches the claims of a verified token until the earlier of its ``exp`` and the TTL.
+        """
+        expires_at = min(float(claims.get("exp", 0)), time.time() + self.ttl)
+        if self.max_entries <= 0 or expires_at <= time.time():
+            return
+        with self._lock:
+            self._entries[token] = (claims, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def revoke(self, token: str, claims: dict):
+        """
+        Revokes a token: its id is rejected until the token expires, or for good if
+        it has no ``exp``.
+        """
+        with self._lock:
+            self._entries.pop(token, None)
+        exp = claims.get("exp")
+        self.revocations.add(claims.get("jti", token), None if exp is None else float(exp))
+
+    def is_revoked(self, token: str, claims: dict) -> bool:
+        """
+        Checks whether the token with these claims has been revoked.
+        """
+        return claims.get("jti", token) in self.revocations
+
+    def clear(self):
+        """
+        Forgets every cached verification and revocation.
+        """
+        with self._lock:
+            self._entries.clear()
+        self.revocations.clear()
+
+
+token_cache = TokenCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL, RevocationList(REVOCATION_PATH))
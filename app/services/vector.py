@@ -0,0 +1,152 @@
+"""
+This module provides vector renderers for QR codes.
+
+SVG, PDF and EPS documents are written straight from the module matrix. Each
+horizontal run of dark modules becomes a single rectangle, so a code needs far
+fewer path segments than one square per module, and the output stays sharp at
+any print size.
+"""
+
+import zlib
+from typing import Iterator, Sequence, Tuple
+
+RGB = Tuple[int, int, int]
+
+
+def dark_runs(matrix: Sequence[Sequence[bool]]) -> Iterator[Tuple[int, int, int]]:
+    """
+    Yields every horizontal run of dark modules as (row, first column, length).
+    """
+    for y, row in enumerate(matrix):
+        x, width = 0, len(row)
+        while x < width:
+            if row[x]:
+                start = x
+                while x < width and row[x]:
+                    x += 1
+                yield y, start, x - start
+            else:
+                x += 1
+
+
+def hex_color(color: RGB) -> str:
+    """
+    Formats an RGB tuple as a #rrggbb code.
+    """
+    return "#{:02x}{:02x}{:02x}".format(*color)
+
+
+def unit_color(color: RGB) -> str:
+    """
+    Formats an RGB tuple as three components from 0 to 1, as PDF and PostScript expect.
+    """
+    return " ".join(f"{component / 255:.4g}" for component in color)
+
+
+def render_svg(matrix: Sequence[Sequence[bool]], box_size: int,
+               fill_color: RGB, back_color: RGB) -> bytes:
+    """
+    Renders a module matrix as an SVG document drawn in module units.
+
+    Parameters:
+    - matrix: The QR code modules, border included, True for dark modules.
+    - box_size (int): Displayed size of a module, in pixels.
+    - fill_color: RGB colour of the dark modules.
+    - back_color: RGB colour of the background.
+    """
+    modules = len(matrix)
+    side = modules * box_size
+    path = "".join(f"M{x} {y}h{length}v1h-{length}z" for y, x, length in dark_runs(matrix))
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{side}" height="{side}" '
+        f'viewBox="0 0 {modules} {modules}" shape-rendering="crispEdges">'
+        f'<rect width="100%" height="100%" fill="{hex_color(back_color)}"/>'
+        f'<path fill="{hex_color(fill_color)}" d="{path}"/>'
+        '</svg>\n'
+    ).encode("utf-8")
+
+
+def render_pdf(matrix: Sequence[Sequence[bool]], box_size: int,
+               fill_color: RGB, back_color: RGB) -> bytes:
+    """
+    Renders a module matrix as a single-page PDF, one point per pixel.
+
+    Parameters:
+    - matrix: The QR code modules, border included, True for dark modules.
+    - box_size (int): Size of a module, in points.
+    - fill_color: RGB colour of the dark modules.
+    - back_color: RGB colour of the background.
+    """
+    modules = len(matrix)
+    side = modules * box_size
+    # One unit per module with the origin at the bottom left, as PDF expects
+    operators = [
+        f"{box_size} 0 0 {box_size} 0 0 cm",
+        f"{unit_color(back_color)} rg",
+        f"0 0 {modules} {modules} re f",
+        f"{unit_color(fill_color)} rg",
+        *(f"{x} {modules - y - 1} {length} 1 re" for y, x, length in dark_runs(matrix)),
+        "f",
+    ]
+    content = zlib.compress("\n".join(operators).encode("ascii"), 9)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {side} {side}] "
+        "/Contents 4 0 R /Resources << >> >>".encode(),
+        f"<< /Length {len(content)} /Filter /FlateDecode >>\nstream\n".encode()
+        + content + b"\nendstream",
+    ]
+    document = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(document))
+        document += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_offset = len(document)
+    document += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    document += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    document += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n"
+        f"startxref\n{xref_offset}\n%%EOF\n"
+    ).encode()
+    return bytes(document)
+
+
+def render_eps(matrix: Sequence[Sequence[bool]], box_size: int,
+               fill_color: RGB, back_color: RGB) -> bytes:
+    """
+    Renders a module matrix as an Encapsulated PostScript document, one point per pixel.
+
+    Parameters:
+    - matrix: The QR code modules, border included, True for dark modules.
+    - box_size (int): Size of a module, in points.
+    - fill_color: RGB colour of the dark modules.
+    - back_color: RGB colour of the background.
+    """
+    modules = len(matrix)
+    side = modules * box_size
+    lines = [
+        "%!PS-Adobe-3.0 EPSF-3.0",
+        f"%%BoundingBox: 0 0 {side} {side}",
+        "%%LanguageLevel: 2",
+        "%%EndComments",
+        "gsave",
+        f"{box_size} {box_size} scale",
+        f"{unit_color(back_color)} setrgbcolor",
+        f"0 0 {modules} {modules} rectfill",
+        f"{unit_color(fill_color)} setrgbcolor",
+        *(f"{x} {modules - y - 1} {length} 1 rectfill" for y, x, length in dark_runs(matrix)),
+        "grestore",
+        "showpage",
+        "%%EOF",
+    ]
+    return ("\n".join(lines) + "\n").encode("ascii")
+
+
+# Vector renderers by output format.
+VECTOR_RENDERERS = {
+    'svg': render_svg,
+    'pdf': render_pdf,
+    'eps': render_eps,
+}
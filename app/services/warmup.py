@@ -0,0 +1,215 @@
+"""
+This module pre-renders QR codes so that the first request for a known URL is a
+cache hit.
+
+A warm-up reads a URL list, one item per line: either a bare URL or a JSON object
+with the fields of a QR code request, as in an NDJSON file. Every item can be
+expanded into several variants (sizes and formats). Items go through the same
+render-or-reuse path as the API, so artifacts already in the store are skipped
+after a cache or store lookup.
+
+Progress is reported as a line number below which every item is done, which is all
+a caller needs to resume an interrupted warm-up where it stopped.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Callable, Iterable, List, Optional, Sequence
+
+from app.config import WARMUP_CONCURRENCY
+from app.schema import QRCodeRequest
+from app.services.artifacts import ensure_qr_code
+from app.services.render_executor import RenderUnavailable, render_executor
+
+
+class WarmupProgress:
+    """
+    Counters of a warm-up, updated as items complete.
+
+    Attributes:
+    - total (int): Number of lines in the input, when known.
+    - resume_line (int): Every line before this one is done.
+    - lines (int): Lines processed, including those skipped on resume.
+    - rendered (int): Variants rendered by this warm-up.
+    - skipped (int): Variants that were already stored.
+    - failed (int): Lines that could not be parsed plus variants that failed to render.
+    """
+
+    def __init__(self, total: Optional[int] = None, resume_line: int = 0):
+        self.total = total
+        self.resume_line = resume_line
+        self.lines = resume_line
+        self.rendered = 0
+        self.skipped = 0
+        self.failed = 0
+        self.finished = False
+        self.started_at = time.monotonic()
+
+    @property
+    def elapsed(self) -> float:
+        """
+        Seconds since the warm-up started.
+        """
+        return time.monotonic() - self.started_at
+
+    @property
+    def rate(self) -> float:
+        """
+        Variants rendered or skipped per second.
+        """
+        elapsed = self.elapsed
+        return (self.rendered + self.skipped) / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        """
+        Returns the progress as a JSON-serializable dictionary.
+        """
+        return {
+            "total": self.total,
+            "lines": self.lines,
+            "resume_line": self.resume_line,
+            "rendered": self.rendered,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "elapsed": round(self.elapsed, 3),
+            "rate": round(self.rate, 1),
+            "finished": self.finished,
+        }
+
+    def __str__(self) -> str:
+        total = "?" if self.total is None else self.total
+        return (f"{self.lines}/{total} lines, {self.rendered} rendered, {self.skipped} skipped, "
+                f"{self.failed} failed, {self.rate:.1f}/s")
+
+
+def parse_warmup_line(line: str) -> Optional[QRCodeRequest]:
+    """
+    Parses one line of a URL list; blank lines and ``#`` comments yield None.
+
+    Raises:
+    - ValueError: If the line is neither a valid URL nor a valid QR code request.
+    """
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    if line.startswith('{'):
+        return QRCodeRequest.model_validate(json.loads(line))
+    return QRCodeRequest(url=line)
+
+
+def expand_variants(request: QRCodeRequest, sizes: Sequence[int] = (),
+                    formats: Sequence[str] = ()) -> List[QRCodeRequest]:
+    """
+    Returns the variants of a request for every combination of the given sizes and
+    formats; an empty sequence keeps the request's own value.
+
+    Raises:
+    - ValueError: If a size or format is not valid for a QR code request.
+    """
+    fields = request.model_dump(mode="json")
+    return [
+        QRCodeRequest.model_validate({**fields, "size": size, "format": fmt})
+        for size in (sizes or [request.size])
+        for fmt in (formats or [request.format])
+    ]
+
+
+async def warm_variant(request: QRCodeRequest) -> bool:
+    """
+    Makes sure one variant is stored and returns whether it had to be rendered.
+
+    A warm-up shares the render executor with live traffic, so when the executor is
+    saturated it waits and retries instead of failing.
+    """
+    while True:
+        try:
+            _, created = await ensure_qr_code(request)
+            return created
+        except RenderUnavailable as e:
+            await asyncio.sleep(e.retry_after)
+
+
+async def warm_line(line: str, sizes: Sequence[int], formats: Sequence[str],
+                    progress: WarmupProgress):
+    """
+    Warms up every variant of one input line and updates the counters.
+    """
+    try:
+        request = parse_warmup_line(line)
+        variants = expand_variants(request, sizes, formats) if request else []
+    except ValueError as e:
+        logging.warning("Skipping invalid warm-up line %r: %s", line.strip()[:200], e)
+        progress.failed += 1
+        return
+    for variant in variants:
+        try:
+            created = await warm_variant(variant)
+        except Exception as e:  # pylint: disable=broad-except
+            logging.error("Warm-up of %s failed: %s", variant.url, e)
+            progress.failed += 1
+            continue
+        if created:
+            progress.rendered += 1
+        else:
+            progress.skipped += 1
+
+
+async def warm_up(lines: Iterable[str], sizes: Sequence[int] = (),
+                  formats: Sequence[str] = (), progress: Optional[WarmupProgress] = None,
+                  concurrency: int = 0,
+                  on_progress: Optional[Callable[[WarmupProgress], None]] = None,
+                  report_interval: float = 2.0) -> WarmupProgress:
+    """
+    Pre-renders every variant of every line, several lines at a time.
+
+    Parameters:
+    - lines: The URL list, one item per line.
+    - sizes: Box sizes to render each item at; empty keeps the item's own size.
+    - formats: Formats to render each item in; empty keeps the item's own format.
+    - progress (WarmupProgress): Counters to update; lines before its ``resume_line``
+      are skipped without being parsed.
+    - concurrency (int): Lines in flight at once; 0 uses WARMUP_CONCURRENCY, or half
+      of the render workers so that live traffic keeps the other half.
+    - on_progress: Called with the counters at most every ``report_interval``
+      seconds and once at the end, e.g. to print them or save a checkpoint.
+
+    Returns:
+    - The final counters.
+    """
+    progress = progress or WarmupProgress()
+    concurrency = concurrency or WARMUP_CONCURRENCY or max(1, render_executor.max_workers // 2)
+    in_flight = {}
+    done_lines = set()
+    last_report = time.monotonic()
+
+    def complete(tasks):
+        nonlocal last_report
+        for task in tasks:
+            done_lines.add(in_flight.pop(task))
+            progress.lines += 1
+        # Only advance the resume point past lines with no unfinished line before them.
+        while progress.resume_line in done_lines:
+            done_lines.remove(progress.resume_line)
+            progress.resume_line += 1
+        if on_progress and time.monotonic() - last_report >= report_interval:
+            last_report = time.monotonic()
+            on_progress(progress)
+
+    for number, line in enumerate(lines):
+        if number < progress.resume_line:
+            continue
+        task = asyncio.ensure_future(warm_line(line, sizes, formats, progress))
+        in_flight[task] = number
+        if len(in_flight) >= concurrency:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            complete(done)
+
+    while in_flight:
+        done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        complete(done)
+    progress.finished = True
+    if on_progress:
+        on_progress(progress)
+    return progress
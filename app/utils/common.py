@@ -6,26 +6,19 @@ This module provides functions to:
 - Generate and validate JWT tokens.
 - Verify passwords.
 - Check if a URL has expired based on timestamp.
-- Encode/decode filename for URL-safe usage.
+- Recover the URL of QR codes saved under legacy filenames.
+- Match HTTP entity tags and parse byte ranges for conditional and partial requests.
 - Generate links based on a URL pattern.
 """
 
-import logging
+import uuid
+from typing import List, Optional, Tuple
 from urllib.parse import urlparse,parse_qs
 from datetime import datetime, timedelta
 from jose import jwt, JWTError
 import validators
 from app.config import ALGORITHM, SECRET_KEY
 
-def setup_logging():
-    """
-    Set up logging configuration for the application.
-    """
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    )
-
 def authenticate_user(username: str, password: str):
     """
     Authenticate a user based on the provided credentials.
@@ -55,7 +48,7 @@ def create_access_token(data: dict, expires_delta: timedelta = timedelta(hours=1
     """
     to_encode = data.copy()
     expire = datetime.utcnow() + expires_delta
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -104,20 +97,81 @@ def is_url_expired(url: str, expiration_time: int = 3600) -> bool:
     expiration_datetime = datetime.utcfromtimestamp(timestamp) + expiration_delta
     return current_time > expiration_datetime
 
-def decode_filename_to_url(filename: str) -> str:
+def decode_legacy_filename(stem: str) -> str:
     """
-    Decodes a filename to a URL-safe format.
+    Recovers the URL of a QR code saved under the legacy URL-derived filename scheme.
+
+    That scheme replaced '/' with '_' and '+' with '-', so it cannot be inverted
+    exactly. '_' is read back as '/', and '-' is kept as is because hyphens are far
+    more common in URLs than plus signs. QR codes are now stored under a hash of their
+    parameters, with the exact data in a metadata file.
+
+    Args:
+        stem (str): The legacy filename without its extension.
+
+    Returns:
+        str: The most likely original URL.
     """
-    return filename.replace('_', '/').replace('-', '+')
+    return stem.replace('_', '/')
 
-def encode_url_to_filename(url: str) -> str:
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
     """
-    Encodes a URL into a filename-safe format.
+    Checks whether an If-None-Match header matches the given entity tag.
+
+    Args:
+        if_none_match (str): The raw If-None-Match header value, if any.
+        etag (str): The quoted entity tag of the current representation.
+
+    Returns:
+        bool: True if the client's cached representation is still current.
+    """
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    return "*" in candidates or etag.removeprefix("W/") in (
+        candidate.removeprefix("W/") for candidate in candidates
+    )
+
+def parse_byte_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
     """
-    url_str = str(url)
-    return url_str.replace('/', '_').replace('+', '-')
+    Parses a Range header asking for a single byte range of a representation.
 
-def generate_links(filename: str, base_url: str, download_url: str):
+    Malformed headers and requests for several ranges yield None, and the whole
+    representation is served instead, as HTTP allows.
+
+    Args:
+        range_header (str): The raw Range header value, e.g. ``bytes=0-99`` or ``bytes=-500``.
+        size (int): The size of the representation in bytes.
+
+    Returns:
+        tuple: The first and last byte positions, inclusive, or None.
+
+    Raises:
+        ValueError: If the range lies entirely past the end of the representation.
+    """
+    unit, _, ranges = range_header.partition("=")
+    first, dash, last = ranges.strip().partition("-")
+    if unit.strip().lower() != "bytes" or not dash or "," in ranges:
+        return None
+    if not first.isdigit():
+        # A suffix range: the last N bytes
+        if first or not last.isdigit():
+            return None
+        if int(last) == 0 or size == 0:
+            raise ValueError(f"Unsatisfiable range: {range_header}")
+        return max(0, size - int(last)), size - 1
+    if last and not last.isdigit():
+        return None
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(f"Unsatisfiable range: {range_header}")
+    return start, min(int(last), size - 1) if last else size - 1
+
+def generate_links(filename: str, base_url: str, download_url: str,
+                   media_type: str = "image/png") -> List[dict]:
     """
     Generates HATEOAS (Hypermedia as the Engine of Application State) links for the given resource.
 
@@ -125,12 +179,28 @@ def generate_links(filename: str, base_url: str, download_url: str):
         filename (str): The name of the file for which links are generated.
         base_url (str): The base URL of the server.
         download_url (str): The specific download URL for the file.
+        media_type (str): The media type of the downloaded file.
 
     Returns:
-        dict: A dictionary containing HATEOAS links.
-    """
-    return {
-        "self": f"{base_url}/qr-codes/{filename}",
-        "download": download_url,
-        "delete": f"{base_url}/qr-codes/{filename}/delete"
-    }
+        list: HATEOAS links matching the ``Link`` schema.
+    """
+    return [
+        {
+            "rel": "self",
+            "href": f"{base_url}/qr-codes/{filename}",
+            "action": "GET",
+            "type": "application/json"
+        },
+        {
+            "rel": "download",
+            "href": download_url,
+            "action": "GET",
+            "type": media_type
+        },
+        {
+            "rel": "delete",
+            "href": f"{base_url}/qr-codes/{filename}",
+            "action": "DELETE",
+            "type": "application/json"
+        }
+    ]
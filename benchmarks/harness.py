@@ -0,0 +1,134 @@
+"""
+Shared helpers of the benchmark suites: timing, percentile summaries and JSON
+baselines.
+
+Every suite produces a mapping of scenario name to summary. A run is compared with
+the stored baseline of its suite and any scenario that got slower than the
+tolerance allows is reported as a regression, making the suite exit non-zero.
+Baselines depend on the machine they were recorded on; record a new one with
+``--update-baseline`` when moving to other hardware or after an intended change.
+"""
+
+import argparse
+import json
+import math
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+BASELINE_DIRECTORY = Path(__file__).parent / "baselines"
+
+# Summary keys where higher is worse and where lower is worse.
+LATENCY_KEYS = ("p50_ms", "p95_ms")
+THROUGHPUT_KEYS = ("rps",)
+
+Summary = Dict[str, float]
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """
+    Returns the nearest-rank percentile of already sorted values.
+    """
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(timings: Sequence[float], elapsed: Optional[float] = None) -> Summary:
+    """
+    Summarises durations in seconds as milliseconds percentiles and a rate.
+
+    Parameters:
+    - timings: One duration per operation.
+    - elapsed: Wall-clock time of the whole run; defaults to the sum of the
+      durations, which is right for operations that ran one after another.
+    """
+    ordered = sorted(timings)
+    elapsed = sum(ordered) if elapsed is None else elapsed
+    return {
+        "count": len(ordered),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 4),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 4),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 4),
+        "rps": round(len(ordered) / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+def time_calls(fn: Callable[[], object], repeat: int, warmup: int = 3) -> List[float]:
+    """
+    Runs ``fn`` ``warmup`` times untimed, then ``repeat`` times, returning each duration.
+    """
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def compare(results: Dict[str, Summary], baseline: Dict[str, Summary],
+            tolerance: float) -> List[str]:
+    """
+    Compares a run with a baseline and describes every regression beyond ``tolerance``.
+
+    Scenarios missing from either side are ignored, so adding a scenario does not
+    fail the suite until a baseline for it is recorded.
+    """
+    regressions = []
+    for name, summary in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        for key in LATENCY_KEYS:
+            if key in reference and summary[key] > reference[key] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: {key} {summary[key]:.3f} > baseline {reference[key]:.3f}"
+                )
+        for key in THROUGHPUT_KEYS:
+            if key in reference and summary[key] < reference[key] * (1 - tolerance):
+                regressions.append(
+                    f"{name}: {key} {summary[key]:.1f} < baseline {reference[key]:.1f}"
+                )
+    return regressions
+
+
+def add_baseline_arguments(parser: argparse.ArgumentParser, suite: str):
+    """
+    Adds the baseline options shared by every suite to ``parser``.
+    """
+    parser.add_argument("--baseline", type=Path, default=BASELINE_DIRECTORY / f"{suite}.json",
+                        help="JSON baseline to compare with (default: %(default)s).")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store this run as the new baseline instead of comparing.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown as a fraction of the baseline (default: 0.25).")
+
+
+def report(results: Dict[str, Summary], args: argparse.Namespace) -> int:
+    """
+    Prints the results, then stores or checks the baseline.
+
+    Returns:
+    - The exit status: 1 when a regression was found, 0 otherwise.
+    """
+    print(f"{'scenario':<40} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rps':>9}")
+    for name, summary in results.items():
+        print(f"{name:<40} {summary['p50_ms']:>9.3f} {summary['p95_ms']:>9.3f} "
+              f"{summary['p99_ms']:>9.3f} {summary['rps']:>9.1f}")
+
+    if args.update_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --update-baseline to record one.")
+        return 0
+    regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        return 1
+    print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+    return 0
@@ -0,0 +1,136 @@
+"""
+In-process load scenarios against the ASGI application.
+
+Requests go through ``httpx.AsyncClient`` straight into ``app.main.app``, so the run
+needs no network and no server, yet covers routing, authentication, the render
+executor, the cache and the index. The store is a temporary directory.
+
+Usage:
+    python -m benchmarks.load_bench [--requests N] [--concurrency C] [--update-baseline]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from benchmarks.harness import Summary, add_baseline_arguments, report, summarize
+
+# Number of QR codes stored before the listing scenario runs.
+SEEDED_CODES = 200
+
+
+async def load(send: Callable[[int], Awaitable[object]], requests: int,
+               concurrency: int) -> Summary:
+    """
+    Sends ``requests`` requests with at most ``concurrency`` of them in flight.
+
+    Parameters:
+    - send: Sends request number ``i`` and raises on an unexpected response.
+    """
+    timings: List[float] = []
+    counter = iter(range(requests))
+
+    async def worker():
+        for number in counter:
+            started = time.perf_counter()
+            await send(number)
+            timings.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(timings, time.perf_counter() - started)
+
+
+def expect(status_code: int):
+    """
+    Returns a response check failing the run on any other status code.
+    """
+    def check(response):
+        if response.status_code != status_code:
+            raise RuntimeError(
+                f"{response.request.method} {response.request.url} returned "
+                f"{response.status_code}: {response.text[:200]}"
+            )
+        return response
+    return check
+
+
+async def run(requests: int, concurrency: int) -> Dict[str, Summary]:
+    """
+    Runs every load scenario and returns the summaries by scenario name.
+    """
+    # pylint: disable=import-outside-toplevel
+    from httpx import AsyncClient
+    from app.main import app, lifespan
+
+    # Per-request log lines would dominate the measurements.
+    logging.disable(logging.WARNING)
+    ok = expect(200)
+    results: Dict[str, Summary] = {}
+    async with lifespan(app), AsyncClient(app=app, base_url="http://bench") as client:
+        response = ok(await client.post("/token", data={"username": "admin", "password": "secret"}))
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        async def token(_):
+            ok(await client.post("/token", data={"username": "admin", "password": "secret"}))
+
+        async def create_fresh(number):
+            ok(await client.post("/qr-codes/", json={"url": f"https://example.com/fresh/{number}"},
+                                 headers=headers))
+
+        async def create_cached(_):
+            ok(await client.post("/qr-codes/", json={"url": "https://example.com/cached"},
+                                 headers=headers))
+
+        async def render(number):
+            params = {"data": f"https://example.com/{number}"}
+            ok(await client.get("/qr-codes/render", params=params, headers=headers))
+
+        async def list_page(_):
+            ok(await client.get("/qr-codes/", params={"limit": 100}))
+
+        async def delete_missing(number):
+            response = await client.delete(f"/qr-codes/missing-{number}.png", headers=headers)
+            expect(404)(response)
+
+        results["token/issue"] = await load(token, requests, concurrency)
+        results["auth/delete-missing"] = await load(delete_missing, requests, concurrency)
+        results["create/fresh"] = await load(create_fresh, requests, concurrency)
+        await create_cached(0)
+        results["create/cached"] = await load(create_cached, requests, concurrency)
+        results["render/png"] = await load(render, requests, concurrency)
+        for number in range(SEEDED_CODES):
+            await create_fresh(requests + number)
+        results["list/page"] = await load(list_page, requests, concurrency)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs the load scenarios on a temporary store and checks them against the baseline.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    add_baseline_arguments(parser, "load")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # The configuration is read at import time, so it is set before the app is imported.
+        os.environ["QR_CODE_DIR"] = directory
+        os.environ["QR_INDEX_PATH"] = os.path.join(directory, "index.sqlite")
+        os.environ.setdefault("RENDER_QUEUE_SIZE", str(max(32, args.concurrency * 2)))
+        # Every request uses the same token, so per-subject limits would throttle the run.
+        os.environ.setdefault("RATE_LIMIT_RATE", "0")
+        os.environ.setdefault("RENDER_CONCURRENCY_PER_SUBJECT", "0")
+        results = asyncio.run(run(args.requests, args.concurrency))
+    return report(results, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Micro-benchmarks of the render stages and of token verification.
+
+The matrix build is measured across payload lengths and error correction levels,
+rasterisation and PNG encoding across payload lengths and box sizes, and the token
+path both with a full JWT verification and with a cached one.
+
+Usage:
+    python -m benchmarks.micro_bench [--repeat N] [--update-baseline] [--tolerance F]
+"""
+
+import argparse
+import sys
+from typing import Dict, List, Optional
+
+from app.services.qr_service import build_qr_code
+from app.services.rasterizer import BLACK, NATIVE_RASTER_AVAILABLE, WHITE, encode_png, rasterize
+from app.services.token_cache import token_cache
+from app.dependencies import get_current_user
+from app.utils.common import create_access_token, validate_jwt_token
+from benchmarks.harness import Summary, add_baseline_arguments, report, summarize, time_calls
+
+PAYLOAD_LENGTHS = [32, 128, 512]
+ERROR_CORRECTION_LEVELS = ["L", "M", "Q", "H"]
+BOX_SIZES = [1, 5, 10, 20]
+
+
+def payload(length: int) -> str:
+    """
+    Returns a URL of exactly ``length`` characters.
+    """
+    return ("https://example.com/" + "p" * length)[:length]
+
+
+def run(repeat: int) -> Dict[str, Summary]:
+    """
+    Runs every micro-benchmark and returns the summaries by scenario name.
+    """
+    results: Dict[str, Summary] = {}
+    for length in PAYLOAD_LENGTHS:
+        data = payload(length)
+        for level in ERROR_CORRECTION_LEVELS:
+            results[f"matrix/len={length}/ec={level}"] = summarize(time_calls(
+                lambda: build_qr_code(data, error_correction=level).get_matrix(), repeat
+            ))
+        if not NATIVE_RASTER_AVAILABLE:
+            continue
+        matrix = build_qr_code(data).get_matrix()
+        for box_size in BOX_SIZES:
+            results[f"raster/len={length}/box={box_size}"] = summarize(time_calls(
+                lambda: rasterize(matrix, box_size), repeat
+            ))
+            pixels = rasterize(matrix, box_size)
+            results[f"encode/len={length}/box={box_size}"] = summarize(time_calls(
+                lambda: encode_png(pixels, [WHITE, BLACK]), repeat
+            ))
+
+    token = create_access_token({"sub": "admin"})
+    results["token/verify"] = summarize(time_calls(lambda: validate_jwt_token(token), repeat))
+    token_cache.clear()
+    results["token/cached"] = summarize(time_calls(lambda: get_current_user(token), repeat))
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Runs the micro-benchmarks and checks them against the baseline.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=50)
+    add_baseline_arguments(parser, "micro")
+    args = parser.parse_args(argv)
+
+    if not NATIVE_RASTER_AVAILABLE:
+        print("numpy is not installed; skipping the raster and encode benchmarks.")
+    return report(run(args.repeat), args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
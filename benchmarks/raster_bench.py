@@ -0,0 +1,86 @@
+"""
+Benchmark of the PNG encoders against the qrcode image factory.
+
+For each box size, the same module matrix is encoded to PNG by the image factory,
+the NumPy rasteriser and the row-streaming encoder used for renders, and the
+median time per render is reported together with the speedup of the streaming
+encoder over the factory.
+
+Usage:
+    python -m benchmarks.raster_bench [--data URL] [--repeat N]
+"""
+
+import argparse
+import io
+import statistics
+import sys
+import time
+from typing import Callable, List, Optional
+
+from app.services.qr_service import build_qr_code
+from app.services.rasterizer import NATIVE_RASTER_AVAILABLE, render_png, write_png_rows
+
+BOX_SIZES = [1, 2, 5, 10, 20, 40]
+
+
+def median_seconds(fn: Callable[[], object], repeat: int) -> float:
+    """
+    Runs ``fn`` ``repeat`` times and returns the median duration in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def factory_png(qr) -> bytes:
+    """
+    Encodes a QR code with the image factory the qrcode package picks by default.
+    """
+    buffer = io.BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buffer)
+    return buffer.getvalue()
+
+
+def streamed_png(matrix, box_size: int) -> bytes:
+    """
+    Encodes a module matrix with the row-streaming encoder.
+    """
+    buffer = io.BytesIO()
+    write_png_rows(matrix, box_size, [(255, 255, 255), (0, 0, 0)], buffer)
+    return buffer.getvalue()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Prints one line per box size with the timing of every encoder.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--data", default="https://example.com/" + "campaign/" * 8)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if not NATIVE_RASTER_AVAILABLE:
+        print("numpy is not installed; the native rasteriser is unavailable.")
+        return 1
+
+    print(f"{'box':>4} {'pixels':>8} {'factory ms':>11} {'native ms':>10} "
+          f"{'stream ms':>10} {'speedup':>8}")
+    for box_size in BOX_SIZES:
+        qr = build_qr_code(args.data, size=box_size)
+        matrix = qr.get_matrix()
+        factory = median_seconds(lambda: factory_png(qr), args.repeat)
+        native = median_seconds(
+            lambda: render_png(matrix, box_size, (0, 0, 0), (255, 255, 255)), args.repeat
+        )
+        streamed = median_seconds(lambda: streamed_png(matrix, box_size), args.repeat)
+        side = len(matrix) * box_size
+        print(f"{box_size:>4} {side:>8} {factory * 1000:>11.2f} {native * 1000:>10.2f} "
+              f"{streamed * 1000:>10.2f} {factory / streamed:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""
+Start-up profile of the API: import-time breakdown and time to first request.
+
+Each run starts a fresh interpreter, so nothing is cached between samples:
+
+- ``startup/import``: time to ``import app.main``.
+- ``startup/first-request``: from spawning uvicorn to the first successful ``GET /``.
+- ``startup/first-render``: from spawning uvicorn to the first rendered QR code,
+  token request included.
+
+The first-request p50 must also stay under ``--target-ms``.
+
+Usage:
+    python -m benchmarks.startup_bench [--runs N] [--target-ms MS] [--profile] [--update-baseline]
+"""
+
+import argparse
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.harness import Summary, add_baseline_arguments, report, summarize
+
+# Time to first successful request that a cold start must not exceed.
+DEFAULT_TARGET_MS = 2000
+
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_profile() -> List[Tuple[str, float]]:
+    """
+    Returns the self import time of every top-level package imported by the app, in
+    milliseconds, slowest first.
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, check=True,
+    ).stderr
+    totals: Dict[str, float] = defaultdict(float)
+    for match in IMPORT_TIME_LINE.finditer(output):
+        module = match.group(4)
+        # Application modules are reported one by one, libraries as a whole.
+        package = module if module.startswith("app.") else module.split(".")[0]
+        totals[package] += int(match.group(1)) / 1000
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def time_import() -> float:
+    """
+    Returns the time a fresh interpreter takes to import the app, in seconds.
+    """
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    """
+    Returns a TCP port that is free on the loopback interface.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_first_requests(directory: str) -> Tuple[float, float]:
+    """
+    Starts uvicorn and returns the times, in seconds, to the first successful request
+    and to the first rendered QR code.
+    """
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, QR_CODE_DIR=directory,
+               QR_INDEX_PATH=os.path.join(directory, "index.sqlite"))
+    started = time.perf_counter()
+    server = subprocess.Popen(  # pylint: disable=consider-using-with
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+         "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=base_url, timeout=10) as client:
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError("uvicorn exited before serving a request")
+                try:
+                    if client.get("/").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    time.sleep(0.005)
+            first_request = time.perf_counter() - started
+            token = client.post(
+                "/token", data={"username": "admin", "password": "secret"}
+            ).json()["access_token"]
+            response = client.get("/qr-codes/render", params={"data": "https://example.com/"},
+                                  headers={"Authorization": f"Bearer {token}"})
+            response.raise_for_status()
+            first_render = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+    return first_request, first_render
+
+
+def run(runs: int) -> Dict[str, Summary]:
+    """
+    Runs every start-up measurement ``runs`` times and returns the summaries.
+    """
+    imports, first_requests, first_renders = [], [], []
+    for _ in range(runs):
+        imports.append(time_import())
+        with tempfile.TemporaryDirectory() as directory:
+            first_request, first_render = time_first_requests(directory)
+        first_requests.append(first_request)
+        first_renders.append(first_render)
+    return {
+        "startup/import": summarize(imports),
+        "startup/first-request": summarize(first_requests),
+        "startup/first-render": summarize(first_renders),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Measures start-up, checks the target and compares with the baseline.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target-ms", type=float, default=DEFAULT_TARGET_MS,
+                        help="Maximum p50 time to first request (default: %(default)s).")
+    parser.add_argument("--profile", action="store_true",
+                        help="Print the import-time breakdown by package first.")
+    add_baseline_arguments(parser, "startup")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        print(f"{'package':<40} {'self ms':>9}")
+        for package, milliseconds in import_profile()[:20]:
+            print(f"{package:<40} {milliseconds:>9.1f}")
+        print()
+
+    results = run(args.runs)
+    status = report(results, args)
+    first_request = results["startup/first-request"]["p50_ms"]
+    if first_request > args.target_ms:
+        print(f"REGRESSION startup/first-request: p50 {first_request:.0f} ms "
+              f"> target {args.target_ms:.0f} ms")
+        return 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,28 @@
+"""
+Gunicorn settings for production.
+
+The application is loaded once in the master process (``preload_app``) and the
+render backends are warmed there too, so every forked worker starts with them
+already imported and shares those pages copy-on-write. Each worker still runs the
+app lifespan itself, which starts its own render executor. Stored QR codes are
+shared between the workers through the store, and images rendered in memory by
+``GET /qr-codes/render`` through the shared render cache (SHARED_CACHE_BYTES).
+
+Usage:
+    gunicorn -c gunicorn.conf.py app.main:app
+"""
+
+import os
+
+bind = os.getenv("BIND", ":8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+
+def on_starting(server):  # pylint: disable=unused-argument
+    """
+    Imports and warms the render backends in the master before any worker forks.
+    """
+    from app.services.qr_service import preload_renderers  # pylint: disable=import-outside-toplevel
+    preload_renderers()
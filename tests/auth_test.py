@@ -0,0 +1,94 @@
+"""
+Tests for the cached verification and revocation of access tokens.
+"""
+
+import time
+import pytest
+from app import dependencies
+from app.services.token_cache import RevocationList, TokenCache, token_cache
+from app.utils.common import validate_jwt_token
+
+def test_token_cache_entry_never_outlives_token():
+    """
+    A cached verification expires with the token even when the TTL is longer.
+    """
+    cache = TokenCache(max_entries=10, ttl=300)
+    cache.put("expired", {"sub": "admin", "exp": time.time() - 1})
+    cache.put("valid", {"sub": "admin", "exp": time.time() + 60})
+    assert cache.get("expired") is None
+    assert cache.get("valid")["sub"] == "admin"
+
+def test_token_cache_is_bounded():
+    """
+    The least recently used verification is evicted first.
+    """
+    cache = TokenCache(max_entries=2, ttl=300)
+    exp = time.time() + 60
+    cache.put("a", {"exp": exp})
+    cache.put("b", {"exp": exp})
+    cache.get("a")
+    cache.put("c", {"exp": exp})
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+def test_revocation_is_seen_by_every_process(tmp_path):
+    """
+    A token revoked through one worker's cache is rejected by another sharing the
+    database, and a token without ``exp`` stays revoked after expired ids are purged.
+    """
+    path = tmp_path / "revocations.sqlite"
+    worker_a = TokenCache(10, 300, RevocationList(path))
+    worker_b = TokenCache(10, 300, RevocationList(path))
+    claims = {"sub": "admin", "jti": "a", "exp": time.time() + 60}
+    worker_b.put("token-a", claims)
+    worker_a.revoke("token-a", claims)
+    assert worker_b.is_revoked("token-a", claims)
+
+    worker_a.revoke("token-b", {"sub": "admin", "jti": "b"})
+    worker_a.revoke("token-c", {"sub": "admin", "jti": "c", "exp": time.time() - 1})
+    assert worker_b.is_revoked("token-b", {"sub": "admin", "jti": "b"})
+    assert not worker_b.is_revoked("token-c", {"sub": "admin", "jti": "c"})
+    worker_a.revocations.close()
+    worker_b.revocations.close()
+
+@pytest.mark.asyncio
+async def test_verification_is_cached(client, get_access_token_for_test, monkeypatch):
+    """
+    Repeated requests with the same token verify its signature once.
+    """
+    token_cache.clear()
+    calls = []
+
+    def counting_validate(token):
+        calls.append(token)
+        return validate_jwt_token(token)
+
+    monkeypatch.setattr(dependencies, "validate_jwt_token", counting_validate)
+    headers = {"Authorization": f"Bearer {get_access_token_for_test}"}
+    for _ in range(3):
+        response = await client.delete("/qr-codes/missing.png", headers=headers)
+        assert response.status_code == 404
+    assert len(calls) == 1
+
+@pytest.mark.asyncio
+async def test_invalid_token_is_rejected(client):
+    """
+    A token with a bad signature is rejected with a Bearer challenge.
+    """
+    headers = {"Authorization": "Bearer not-a-token"}
+    response = await client.delete("/qr-codes/missing.png", headers=headers)
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == "Bearer"
+
+@pytest.mark.asyncio
+async def test_revoked_token_is_rejected(client, get_access_token_for_test):
+    """
+    A revoked token is rejected even though its verification is cached.
+    """
+    headers = {"Authorization": f"Bearer {get_access_token_for_test}"}
+    assert (await client.delete("/qr-codes/missing.png", headers=headers)).status_code == 404
+    assert (await client.post("/token/revoke", headers=headers)).status_code == 204
+    response = await client.delete("/qr-codes/missing.png", headers=headers)
+    assert response.status_code == 401
+    token_cache.clear()
@@ -0,0 +1,67 @@
+"""
+Test suite for the batch QR code endpoint.
+"""
+
+import json
+
+import pytest
+
+
+@pytest.mark.asyncio
+async def test_batch_dedupes_and_reports_each_item(client, get_access_token_for_test):
+    """
+    Test that a JSON list batch yields one result per item, rendering duplicates once.
+    """
+    headers = {"Authorization": f"Bearer {get_access_token_for_test}"}
+    items = [
+        {"url": "https://example.com/batch/1", "size": 2},
+        {"url": "https://example.com/batch/2", "size": 2},
+        {"url": "https://example.com/batch/1", "size": 2},
+        {"url": "not a url"},
+    ]
+    response = await client.post("/qr-codes/batch", json=items, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    results = {
+        result["index"]: result
+        for result in map(json.loads, response.text.splitlines())
+    }
+
+    assert sorted(results) == [0, 1, 2, 3]
+    assert results[0]["status"] in (200, 201)
+    assert results[2]["duplicate_of"] == 0
+    assert results[3]["status"] == 422
+
+    for index in (0, 1):
+        qr_filename = results[index]["qr_code_url"].split("/")[-1]
+        await client.delete(f"/qr-codes/{qr_filename}", headers=headers)
+
+
+@pytest.mark.asyncio
+async def test_batch_accepts_ndjson_body(client, get_access_token_for_test):
+    """
+    Test that an NDJSON body is parsed line by line, reporting malformed lines.
+    """
+    headers = {
+        "Authorization": f"Bearer {get_access_token_for_test}",
+        "Content-Type": "application/x-ndjson",
+    }
+    body = '{"url": "https://example.com/batch/ndjson", "size": 2}\n{broken\n'
+    response = await client.post("/qr-codes/batch", content=body, headers=headers)
+    results = sorted(map(json.loads, response.text.splitlines()), key=lambda r: r["index"])
+
+    assert [result["status"] for result in results][1] == 400
+    assert results[0]["status"] in (200, 201)
+    qr_filename = results[0]["qr_code_url"].split("/")[-1]
+    await client.delete(f"/qr-codes/{qr_filename}", headers=headers)
+
+
+@pytest.mark.asyncio
+async def test_batch_rejects_non_list_body(client, get_access_token_for_test):
+    """
+    Test that a JSON body that is not a list is rejected before streaming starts.
+    """
+    headers = {"Authorization": f"Bearer {get_access_token_for_test}"}
+    response = await client.post("/qr-codes/batch", json={"url": "https://example.com"},
+                                 headers=headers)
+    assert response.status_code == 422
@@ -0,0 +1,28 @@
+"""
+Tests for the benchmark harness: summaries and baseline comparison.
+"""
+
+from benchmarks.harness import compare, percentile, summarize
+
+def test_summary_percentiles():
+    """
+    Percentiles use the nearest rank and the rate follows the elapsed time.
+    """
+    summary = summarize([i / 1000 for i in range(1, 101)], elapsed=2.0)
+    assert summary["p50_ms"] == 50
+    assert summary["p95_ms"] == 95
+    assert summary["p99_ms"] == 99
+    assert summary["rps"] == 50
+    assert percentile([1.0], 0.99) == 1.0
+
+def test_compare_flags_regressions_beyond_tolerance():
+    """
+    Slower latency or lower throughput than the tolerance allows is a regression.
+    """
+    baseline = {"a": {"p50_ms": 10, "p95_ms": 20, "rps": 100}, "gone": {"p50_ms": 1}}
+    within = {"a": {"p50_ms": 12, "p95_ms": 24, "rps": 80}, "new": {"p50_ms": 99}}
+    assert not compare(within, baseline, tolerance=0.25)
+    slower = {"a": {"p50_ms": 13, "p95_ms": 20, "rps": 70}}
+    regressions = compare(slower, baseline, tolerance=0.25)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("a: p50_ms")
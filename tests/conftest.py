@@ -2,11 +2,11 @@
 This module contains pytest fixtures for the test suite.
 """
 
-import pytest
+import pytest_asyncio
 from httpx import AsyncClient
 from app.main import app  # Adjust import path as necessary
 
-@pytest.fixture
+@pytest_asyncio.fixture
 async def client():
     """
     Creates an asynchronous HTTP client for testing FastAPI routes.
@@ -14,7 +14,7 @@ async def client():
     async with AsyncClient(app=app, base_url="http://testserver") as ac:
         yield ac
 
-@pytest.fixture
+@pytest_asyncio.fixture
 async def get_access_token_for_test(client):  # pylint: disable=redefined-outer-name
     """
     Retrieves an access token for testing by posting valid credentials to the token endpoint.
@@ -0,0 +1,77 @@
+"""
+Test suite for QR code downloads served by the API: validators, caching and ranges.
+"""
+
+import hashlib
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from app.services.downloads import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, cache_control
+from app.utils.common import parse_byte_range
+
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def test_parse_byte_range():
+    """
+    Test that single ranges are parsed, others ignored and unsatisfiable ones rejected.
+    """
+    assert parse_byte_range("bytes=0-9", 20) == (0, 9)
+    assert parse_byte_range("bytes=5-", 20) == (5, 19)
+    assert parse_byte_range("bytes=-3", 20) == (17, 19)
+    assert parse_byte_range("bytes=10-99", 20) == (10, 19)
+    assert parse_byte_range("bytes=0-1,4-5", 20) is None
+    assert parse_byte_range("bytes=9-3", 20) is None
+    assert parse_byte_range("lines=0-1", 20) is None
+    with pytest.raises(ValueError):
+        parse_byte_range("bytes=20-", 20)
+
+
+def test_cache_control_depends_on_name_and_expiry():
+    """
+    Test that content-addressed files are immutable until they expire, if ever.
+    """
+    name = "a" * 64 + ".png"
+    assert cache_control(name) == IMMUTABLE_CACHE_CONTROL
+    expires_at = (NOW + timedelta(minutes=5)).isoformat()
+    assert cache_control(name, expires_at, NOW) == "public, max-age=300"
+    assert cache_control("https:__example.com_.png") == REVALIDATE_CACHE_CONTROL
+
+
+@pytest.mark.asyncio
+async def test_download_validators_and_ranges(client, get_access_token_for_test):
+    """
+    Test that downloads carry a content-hash ETag and answer conditional and range requests.
+    """
+    headers = {"Authorization": f"Bearer {get_access_token_for_test}"}
+    response = await client.post("/qr-codes/", json={"url": "https://example.com/download"},
+                                 headers=headers)
+    qr_filename = response.json()["links"][0]["href"].split("/")[-1]
+    url = f"/downloads/{qr_filename}"
+
+    response = await client.get(url)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["etag"] == f'"{hashlib.sha256(response.content).hexdigest()}"'
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    body, etag = response.content, response.headers["etag"]
+
+    response = await client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    response = await client.get(
+        url, headers={"If-Modified-Since": response.headers["last-modified"]}
+    )
+    assert response.status_code == 304
+
+    response = await client.get(url, headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 0-9/{len(body)}"
+    assert response.content == body[:10]
+    response = await client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    response = await client.get(url, headers={"Range": f"bytes={len(body)}-"})
+    assert response.status_code == 416
+
+    for name in ("index.sqlite", qr_filename.replace(".png", ".json"), "missing.png"):
+        response = await client.get(f"/downloads/{name}")
+        assert response.status_code == 404
@@ -0,0 +1,93 @@
+"""
+Test suite for expiring QR codes: expiry bookkeeping, the sweeper and the 410 answer.
+"""
+
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from app.services.expiry import expiry_time, sweep_expired
+from app.services.qr_index import QRIndex, QRIndexEntry, qr_index
+from app.services.qr_service import generate_qr_code
+from app.services.storage import FlatStorage
+
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def test_expiry_only_moves_later_and_expired_codes_leave_listings(tmp_path):
+    """
+    Test that extending never shortens an expiry, and that listings skip expired codes.
+    """
+    index = QRIndex(tmp_path / "index.sqlite")
+    created = "2024-01-01T00:00:00+00:00"
+    index.add(QRIndexEntry("expiring.png", "https://example.com/a", created,
+                           expiry_time(60, NOW)))
+    index.add(QRIndexEntry("expired.png", "https://example.com/b", created,
+                           expiry_time(1, NOW - timedelta(days=1))))
+    index.add(QRIndexEntry("permanent.png", "https://example.com/c", created))
+
+    assert not index.extend_expiry("expiring.png", expiry_time(30, NOW))
+    assert index.extend_expiry("expiring.png", expiry_time(120, NOW))
+    assert index.get("expiring.png").expires_at == expiry_time(120, NOW)
+    assert not index.extend_expiry("permanent.png", expiry_time(30, NOW))
+    assert index.extend_expiry("expired.png", None)
+    assert index.get("expired.png").expires_at is None
+
+    index.add(QRIndexEntry("expired.png", "https://example.com/b", created,
+                           expiry_time(1, NOW - timedelta(days=1))))
+    entries, _ = index.page(limit=10)
+    assert [entry.filename for entry in entries] == ["permanent.png"]
+    index.close()
+
+
+def test_sweeper_deletes_expired_codes_in_batches(tmp_path):
+    """
+    Test that the sweeper deletes every expired code and its metadata, and nothing else.
+    """
+    storage = FlatStorage(tmp_path, "http://testserver/downloads")
+    index = QRIndex(tmp_path / "index.sqlite")
+    for number, ttl in enumerate([1, 2, 3, None]):
+        filename = f"{number}.png"
+        expires_at = expiry_time(ttl, NOW)
+        metadata = generate_qr_code(f"https://example.com/{number}", filename, size=1,
+                                    expires_at=expires_at, storage=storage)
+        index.add(QRIndexEntry(filename, metadata["data"], metadata["created_at"], expires_at))
+
+    assert sweep_expired(storage, index, batch_size=2, now=NOW + timedelta(seconds=10)) == 3
+    assert sorted(path.name for path in tmp_path.glob("*.*")
+                  if path.suffix in (".png", ".json")) == ["3.json", "3.png"]
+    assert index.count() == 1
+    assert json.loads((tmp_path / "3.json").read_text())["expires_at"] is None
+    index.close()
+
+
+@pytest.mark.asyncio
+async def test_expired_code_answers_gone(client, get_access_token_for_test):
+    """
+    Test that a code created with a time to live reports its expiry, and that once
+    expired it answers 410 until a request without a time to live keeps it again.
+    """
+    headers = {"Authorization": f"Bearer {get_access_token_for_test}"}
+    body = {"url": f"https://example.com/expiring/{uuid.uuid4().hex}", "size": 2,
+            "ttl_seconds": 3600}
+    response = await client.post("/qr-codes/", json=body, headers=headers)
+    filename = response.json()["links"][0]["href"].split("/")[-1]
+
+    response = await client.get(f"/qr-codes/{filename}")
+    assert response.status_code == 200
+    assert response.json()["expires_at"] is not None
+
+    entry = qr_index.get(filename)
+    qr_index.add(entry._replace(expires_at=expiry_time(1, NOW)))
+    response = await client.get(f"/qr-codes/{filename}")
+    assert response.status_code == 410
+
+    body.pop("ttl_seconds")
+    await client.post("/qr-codes/", json=body, headers=headers)
+    response = await client.get(f"/qr-codes/{filename}")
+    assert response.status_code == 200
+    assert response.json()["expires_at"] is None
+
+    response = await client.get("/qr-codes/missing.png")
+    assert response.status_code == 404
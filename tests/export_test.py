@@ -0,0 +1,72 @@
+"""
+Test suite for streaming ZIP and TAR exports of stored QR codes.
+"""
+
+import csv
+import io
+import tarfile
+import uuid
+import zipfile
+
+import pytest
+from app.services import export
+from app.services.export import export_entries, stream_archive
+from app.services.qr_index import QRIndex, QRIndexEntry
+from app.services.storage import FlatStorage
+
+
+def test_tar_export_streams_files_in_chunks(tmp_path, monkeypatch):
+    """
+    Test that a TAR export copies files chunk by chunk, leaves out codes missing from
+    the store, and ends with a manifest of the exported codes.
+    """
+    monkeypatch.setattr(export, "EXPORT_CHUNK_SIZE", 1000)
+    monkeypatch.setattr(export, "EXPORT_PAGE_SIZE", 1)
+    storage = FlatStorage(tmp_path, "http://testserver/downloads")
+    index = QRIndex(tmp_path / "index.sqlite")
+    storage.put("a.png", b"a" * 2500)
+    storage.put("b.svg", b"<svg/>")
+    index.add(QRIndexEntry("a.png", "https://example.com/a", "2024-01-01T00:00:00+00:00"))
+    index.add(QRIndexEntry("b.svg", "https://example.com/b", "2024-01-02T00:00:00+00:00"))
+    index.add(QRIndexEntry("gone.png", "https://example.com/gone", "2024-01-03T00:00:00+00:00"))
+
+    chunks = list(stream_archive("tar", export_entries(index), storage))
+    assert max(len(chunk) for chunk in chunks) <= 1024
+    with tarfile.open(fileobj=io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.getnames() == ["a.png", "b.svg", "manifest.csv"]
+        assert archive.extractfile("a.png").read() == b"a" * 2500
+        manifest = archive.extractfile("manifest.csv").read().decode("utf-8")
+    rows = list(csv.DictReader(io.StringIO(manifest)))
+    assert [(row["filename"], row["size"]) for row in rows] == [("a.png", "2500"), ("b.svg", "6")]
+    index.close()
+
+
+@pytest.mark.asyncio
+async def test_zip_export_of_a_campaign(client, get_access_token_for_test):
+    """
+    Test that the export endpoint streams a ZIP archive of the codes whose data starts
+    with the prefix, and requires authentication.
+    """
+    headers = {"Authorization": f"Bearer {get_access_token_for_test}"}
+    campaign = f"https://example.com/campaign/{uuid.uuid4().hex}/"
+    filenames = set()
+    for number in range(3):
+        response = await client.post("/qr-codes/", json={"url": f"{campaign}{number}"},
+                                     headers=headers)
+        filenames.add(response.json()["qr_code_url"].split("/")[-1])
+
+    response = await client.get("/qr-codes/export", params={"prefix": campaign},
+                                headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    assert "qr-codes.zip" in response.headers["content-disposition"]
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert archive.testzip() is None
+        assert set(archive.namelist()) == filenames | {"manifest.csv"}
+        manifest = archive.read("manifest.csv").decode("utf-8")
+    assert sorted(row["data"] for row in csv.DictReader(io.StringIO(manifest))) == [
+        f"{campaign}{number}" for number in range(3)
+    ]
+
+    response = await client.get("/qr-codes/export")
+    assert response.status_code == 401
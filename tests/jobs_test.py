@@ -0,0 +1,64 @@
+"""
+Test suite for asynchronous render jobs: the persistent queue and the job endpoints.
+"""
+
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from app.services.job_queue import JobQueue
+from app.services.job_worker import job_worker
+
+
+def test_claim_leases_jobs_and_gives_up_after_max_attempts(tmp_path):
+    """
+    Test that a claimed job is not claimed again until its lease runs out, and is
+    failed once it used up its attempts.
+    """
+    queue = JobQueue(tmp_path / "jobs.sqlite", max_attempts=2)
+    first = queue.enqueue({"url": "https://example.com/1"}, "admin")
+    second = queue.enqueue({"url": "https://example.com/2"}, "admin")
+
+    assert queue.claim(lease_seconds=60).id == first.id
+    assert queue.claim(lease_seconds=-1).id == second.id
+    # The second lease already ran out, so the job is claimed again, once more only.
+    assert queue.claim(lease_seconds=-1).id == second.id
+    assert queue.claim(lease_seconds=60) is None
+    assert queue.get(second.id).status == "failed"
+
+    queue.complete(first.id, {"filename": "a.png", "created": True})
+    assert queue.get(first.id).result == {"filename": "a.png", "created": True}
+    assert queue.purge(datetime.now(timezone.utc) + timedelta(seconds=1)) == 2
+    queue.close()
+
+
+@pytest.mark.asyncio
+async def test_async_create_returns_job_until_rendered(client, get_access_token_for_test):
+    """
+    Test that an async create of a new code answers 202 with a job that reports the
+    QR code links once a worker ran it, and that stored codes are answered directly.
+    """
+    headers = {"Authorization": f"Bearer {get_access_token_for_test}"}
+    body = {"url": f"https://example.com/async/{uuid.uuid4().hex}", "size": 2}
+    response = await client.post("/qr-codes/", params={"async": "true"}, json=body,
+                                 headers=headers)
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == "queued"
+    assert response.headers["location"] == f"/jobs/{job['job_id']}"
+
+    assert await job_worker.drain() >= 1
+    response = await client.get(response.headers["location"], headers=headers)
+    assert response.status_code == 200
+    assert response.json()["status"] == "done"
+    qr_filename = response.json()["qr_code_url"].split("/")[-1]
+    assert [link["rel"] for link in response.json()["links"]] == ["self", "download", "delete"]
+
+    response = await client.post("/qr-codes/", params={"async": "true"}, json=body,
+                                 headers=headers)
+    assert response.status_code == 200
+    assert response.json()["message"] == "QR code already exists."
+    assert (await client.get(f"/downloads/{qr_filename}")).status_code == 200
+
+    response = await client.get("/jobs/unknown", headers=headers)
+    assert response.status_code == 404
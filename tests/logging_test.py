@@ -0,0 +1,77 @@
+"""
+Test suite for the queued JSON logging pipeline.
+"""
+
+import io
+import json
+import logging
+
+import pytest
+from app.services.log_pipeline import (
+    DebugSampler, JsonFormatter, QueuedStreamHandler, add_render_timings, log_context
+)
+
+
+def test_queued_handler_writes_json_with_request_context():
+    """
+    Test that records are written as JSON lines by the writer thread, with the message
+    rendered when logged, the request context, extra fields and exceptions.
+    """
+    stream = io.StringIO()
+    handler = QueuedStreamHandler(stream)
+    handler.setFormatter(JsonFormatter())
+    logger = logging.getLogger("tests.logging")
+    logger.propagate = False
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    token = log_context.set({"request_id": "req-1"})
+    try:
+        add_render_timings([("matrix", 0.002), ("encode", 0.001)])
+        add_render_timings([("matrix", 0.001)])
+        items = ["a"]
+        logger.info("Rendered %s", items, extra={"qr_filename": "a.png"})
+        items.append("b")
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("Render failed")
+    finally:
+        log_context.reset(token)
+        logger.removeHandler(handler)
+        handler.close()
+
+    first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert first["message"] == "Rendered ['a']"
+    assert first["request_id"] == "req-1"
+    assert first["render_ms"] == {"matrix": 3.0, "encode": 1.0}
+    assert first["qr_filename"] == "a.png"
+    assert second["level"] == "ERROR" and "ValueError: boom" in second["exception"]
+
+
+def test_debug_sampling_keeps_whole_requests():
+    """
+    Test that debug records are sampled per request while other levels are all kept.
+    """
+    sampler = DebugSampler(0.5)
+    debug = logging.LogRecord("t", logging.DEBUG, __file__, 1, "debug", None, None)
+    info = logging.LogRecord("t", logging.INFO, __file__, 1, "info", None, None)
+    kept = 0
+    for number in range(200):
+        token = log_context.set({"request_id": f"request-{number}"})
+        decisions = {sampler.filter(debug) for _ in range(3)}
+        assert len(decisions) == 1 and sampler.filter(info)
+        kept += decisions.pop()
+        log_context.reset(token)
+    assert 50 < kept < 150
+    assert not DebugSampler(0).filter(debug) and DebugSampler(1).filter(debug)
+
+
+@pytest.mark.asyncio
+async def test_responses_carry_the_request_id(client):
+    """
+    Test that a request id sent by the client is echoed back and one is generated
+    otherwise.
+    """
+    response = await client.get("/", headers={"X-Request-ID": "from-proxy"})
+    assert response.headers["x-request-id"] == "from-proxy"
+    assert len((await client.get("/")).headers["x-request-id"]) == 32
@@ -0,0 +1,55 @@
+"""
+Tests for the metrics subsystem and the /metrics endpoint.
+"""
+
+import pytest
+from app.services.metrics import (
+    RENDER_STAGE_SECONDS, Counter, Histogram, call_with_stage_timings, observe_stage_timings
+)
+from app.services.qr_service import render_qr_code
+
+def test_histogram_buckets_are_cumulative():
+    """
+    Observations land in every bucket whose bound is at least the value.
+    """
+    histogram = Histogram("test_seconds", "Test.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, stage="a")
+    lines = histogram.exposition().splitlines()
+    assert 'test_seconds_bucket{stage="a",le="0.1"} 2' in lines
+    assert 'test_seconds_bucket{stage="a",le="1.0"} 3' in lines
+    assert 'test_seconds_bucket{stage="a",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{stage="a"} 4' in lines
+
+def test_counter_escapes_label_values():
+    """
+    Label values are escaped so that any value yields a valid exposition.
+    """
+    counter = Counter("test_total", "Test.", ("path",))
+    counter.inc(path='a"b')
+    assert 'test_total{path="a\\"b"} 1' in counter.exposition()
+
+def test_render_stages_are_timed():
+    """
+    A render reports its matrix and encode stages back to the caller.
+    """
+    body, timings = call_with_stage_timings(render_qr_code, "https://example.com/stages")
+    assert body.startswith(b"\x89PNG")
+    assert [stage for stage, _ in timings] == ["matrix", "encode"]
+    before = RENDER_STAGE_SECONDS.count(stage="encode")
+    observe_stage_timings(timings)
+    assert RENDER_STAGE_SECONDS.count(stage="encode") == before + 1
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(client):
+    """
+    The endpoint exposes route latency by path template along with the render metrics.
+    """
+    await client.get("/")
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_request_duration_seconds_count{method="GET",route="/",status="200"}' \
+        in response.text
+    assert "# TYPE qr_render_queue_depth gauge" in response.text
+    assert "# TYPE qr_render_cache_requests_total counter" in response.text
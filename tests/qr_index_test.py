@@ -0,0 +1,92 @@
+"""
+Test suite for the QR code metadata index and the paginated listing endpoint.
+"""
+
+import json
+from datetime import datetime, timezone
+
+import pytest
+from app.services.qr_index import QRIndex, QRIndexEntry
+from app.services.storage import FlatStorage
+
+
+def test_index_pages_with_cursor_and_filters(tmp_path):
+    """
+    Test that pages follow the cursor without overlap and honour the data and date filters.
+    """
+    index = QRIndex(tmp_path / "index.sqlite")
+    for number in range(5):
+        index.add(QRIndexEntry(f"{number}.png", f"https://example.com/{number}",
+                               f"2024-01-0{number + 1}T00:00:00+00:00"))
+    index.add(QRIndexEntry("other.png", "https://other.org/", "2024-01-09T00:00:00+00:00"))
+
+    first, cursor = index.page(limit=4)
+    second, last_cursor = index.page(limit=4, cursor=cursor)
+    assert [entry.filename for entry in first + second] == [
+        "0.png", "1.png", "2.png", "3.png", "4.png", "other.png"
+    ]
+    assert last_cursor is None
+
+    matches, _ = index.page(limit=10, prefix="https://example.com/",
+                            created_after=datetime(2024, 1, 2, tzinfo=timezone.utc),
+                            created_before=datetime(2024, 1, 4, tzinfo=timezone.utc))
+    assert [entry.filename for entry in matches] == ["1.png", "2.png"]
+    exact, _ = index.page(limit=10, data="https://example.com/3")
+    assert [entry.filename for entry in exact] == ["3.png"]
+
+    with pytest.raises(ValueError):
+        index.page(limit=1, cursor="not-a-cursor")
+    index.close()
+
+
+def test_index_rebuild_reconciles_with_directory(tmp_path):
+    """
+    Test that rebuilding indexes new files, including legacy ones, and drops missing ones.
+    """
+    (tmp_path / "https:__my-site.example.com_.png").write_bytes(b"png")
+    index = QRIndex(tmp_path / "index.sqlite")
+    index.add(QRIndexEntry("gone.png", "https://example.com/gone", "2024-01-01T00:00:00+00:00"))
+
+    assert index.rebuild(FlatStorage(tmp_path, "http://testserver/downloads")) == (1, 1)
+    entries, _ = index.page(limit=10)
+    assert [(entry.filename, entry.data) for entry in entries] == [
+        ("https:__my-site.example.com_.png", "https://my-site.example.com/")
+    ]
+    # The decoded data is saved once, so later rebuilds read it back unchanged.
+    metadata = json.loads((tmp_path / "https:__my-site.example.com_.json").read_text())
+    assert metadata["legacy"] is True
+    assert metadata["data"] == "https://my-site.example.com/"
+    index.close()
+
+
+@pytest.mark.asyncio
+async def test_listing_endpoint_returns_created_codes_and_cursor(
+        client, get_access_token_for_test):
+    """
+    Test that created codes are listed through the index with a next-page cursor.
+    """
+    headers = {"Authorization": f"Bearer {get_access_token_for_test}"}
+    filenames = []
+    for number in range(2):
+        response = await client.post(
+            "/qr-codes/", json={"url": f"https://example.com/listing/{number}", "size": 2},
+            headers=headers
+        )
+        filenames.append(response.json()["links"][0]["href"].split("/")[-1])
+
+    response = await client.get(
+        "/qr-codes/", params={"prefix": "https://example.com/listing/", "limit": 1}
+    )
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    next_page = await client.get(
+        "/qr-codes/", params={"prefix": "https://example.com/listing/",
+                              "cursor": response.headers["X-Next-Cursor"]}
+    )
+    urls = [item["qr_code_url"] for item in response.json() + next_page.json()]
+    assert sorted(urls) == ["https://example.com/listing/0", "https://example.com/listing/1"]
+    lookup = await client.get("/qr-codes/", params={"url": "https://example.com/listing/1"})
+    assert [item["qr_code_url"] for item in lookup.json()] == ["https://example.com/listing/1"]
+
+    for filename in filenames:
+        await client.delete(f"/qr-codes/{filename}", headers=headers)
@@ -0,0 +1,70 @@
+"""
+Test suite for per-user rate limiting and concurrent render caps on the render path.
+"""
+
+import pytest
+from app.services.rate_limit import (
+    ConcurrencyLimitExceeded, MemoryRateLimitStore, RateLimiter, SQLiteRateLimitStore,
+    rate_limiter
+)
+
+
+def test_token_bucket_empties_and_reports_headers():
+    """
+    Test that a bucket admits a burst, then rejects with a retry delay until refilled.
+    """
+    store = MemoryRateLimitStore()
+    first = store.take("alice", rate=1, burst=2)
+    assert first.allowed and first.headers()["RateLimit-Remaining"] == "1"
+    assert store.take("alice", rate=1, burst=2).allowed
+    rejected = store.take("alice", rate=1, burst=2)
+    assert not rejected.allowed
+    assert rejected.headers()["RateLimit-Remaining"] == "0"
+    assert int(rejected.headers()["Retry-After"]) >= 1
+    # Buckets are per subject.
+    assert store.take("bob", rate=1, burst=2).allowed
+
+
+@pytest.mark.asyncio
+async def test_render_slots_are_capped_across_connections(tmp_path):
+    """
+    Test that the sqlite store shares render slots between stores opened on the same
+    database, as gunicorn workers do, and frees them when the render ends.
+    """
+    limiter = RateLimiter(SQLiteRateLimitStore(tmp_path / "limits.sqlite"), 1, 1, 1)
+    other = RateLimiter(SQLiteRateLimitStore(tmp_path / "limits.sqlite"), 1, 1, 1)
+    async with limiter.render_slot("alice"):
+        with pytest.raises(ConcurrencyLimitExceeded):
+            async with other.render_slot("alice"):
+                pass
+        async with other.render_slot("bob"):
+            assert other.store.renders_in_flight() == 2
+    async with other.render_slot("alice"):
+        pass
+    assert limiter.store.renders_in_flight() == 0
+    limiter.store.close()
+    other.store.close()
+
+
+@pytest.mark.asyncio
+async def test_render_endpoint_answers_429_when_bucket_is_empty(
+        client, get_access_token_for_test, monkeypatch):
+    """
+    Test that admitted requests carry the RateLimit headers and that a user over the
+    limit is answered with 429 and Retry-After.
+    """
+    monkeypatch.setattr(rate_limiter, "store", MemoryRateLimitStore())
+    monkeypatch.setattr(rate_limiter, "rate", 0.01)
+    monkeypatch.setattr(rate_limiter, "burst", 1)
+    headers = {"Authorization": f"Bearer {get_access_token_for_test}"}
+    params = {"data": "rate limited", "format": "svg"}
+
+    response = await client.get("/qr-codes/render", params=params, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["ratelimit-limit"] == "1"
+    assert response.headers["ratelimit-remaining"] == "0"
+
+    response = await client.get("/qr-codes/render", params=params, headers=headers)
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert "ratelimit-reset" in response.headers
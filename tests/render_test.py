@@ -0,0 +1,420 @@
+"""
+Tests for the render pipeline: the bounded render executor, its HTTP backpressure,
+the content-addressed render cache and single-flight rendering.
+"""
+
+import asyncio
+import io
+import os
+import threading
+import tracemalloc
+
+import png
+import pytest
+from httpx import AsyncClient
+from app.main import app
+from app.services.qr_index import qr_index
+from app.services.qr_service import (
+    build_qr_code, generate_qr_code, render_qr_code
+)
+from app.services.rasterizer import (
+    NATIVE_RASTER_AVAILABLE, encode_png, rasterize, reencode_png, render_png, write_png_rows
+)
+from app.services.render_cache import ENTRY_OVERHEAD, RenderCache, render_cache, render_key
+from app.services.render_executor import (
+    RenderExecutor, RenderQueueFull, RenderUnavailable, render_executor
+)
+from app.services.single_flight import SingleFlight
+from app.services.storage import FlatStorage, atomic_write_bytes
+from app.services.vector import render_eps, render_pdf, render_svg
+from app.utils.colors import parse_color
+
+
+@pytest.mark.asyncio
+async def test_render_executor_rejects_when_saturated():
+    """
+    Test that jobs beyond the worker and queue capacity are rejected with a retry hint.
+    """
+    executor = RenderExecutor(max_workers=1, queue_size=1, retry_after=3, kind='thread')
+    release = threading.Event()
+    try:
+        jobs = [asyncio.ensure_future(executor.submit(release.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert executor.queue_depth == 2
+
+        with pytest.raises(RenderQueueFull) as exc_info:
+            await executor.submit(release.wait, 5)
+        assert exc_info.value.retry_after == 3
+
+        release.set()
+        assert await asyncio.gather(*jobs) == [True, True]
+        assert executor.queue_depth == 0
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_render_keeps_its_slot_until_the_job_finishes():
+    """
+    Test that a job whose caller stopped waiting still counts against the queue bound
+    while it runs in the pool.
+    """
+    executor = RenderExecutor(max_workers=1, queue_size=0, retry_after=1, kind='thread')
+    release = threading.Event()
+    try:
+        job = asyncio.ensure_future(executor.submit(release.wait, 5))
+        await asyncio.sleep(0.05)
+        job.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await job
+        assert executor.queue_depth == 1
+        with pytest.raises(RenderQueueFull):
+            await executor.submit(release.wait, 5)
+
+        release.set()
+        for _ in range(100):
+            if executor.queue_depth == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert await executor.submit(abs, -1) == 1
+        assert executor.queue_depth == 0
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_render_executor_recovers_from_crashed_worker():
+    """
+    Test that a dead worker surfaces as RenderUnavailable and the next job gets a fresh pool.
+    """
+    executor = RenderExecutor(max_workers=1, queue_size=0, retry_after=2, kind='process')
+    try:
+        with pytest.raises(RenderUnavailable) as exc_info:
+            await executor.submit(os._exit, 1)  # pylint: disable=protected-access
+        assert exc_info.value.retry_after == 2
+        assert await executor.submit(abs, -3) == 3
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_create_qr_code_returns_503_when_render_queue_full(monkeypatch):
+    """
+    Test that a saturated render executor surfaces as 503 with a Retry-After header.
+    """
+    monkeypatch.setattr(render_executor, "max_pending", 0)
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        token_response = await ac.post("/token", data={"username": "admin", "password": "secret"})
+        headers = {"Authorization": f"Bearer {token_response.json()['access_token']}"}
+        response = await ac.post(
+            "/qr-codes/", json={"url": "https://example.com/busy", "size": 5}, headers=headers
+        )
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(render_executor.retry_after)
+
+
+def test_render_key_covers_every_render_parameter():
+    """
+    Test that the content address changes with any parameter and ignores colour spelling.
+    """
+    params = {
+        "data": "https://example.com/", "size": 10, "fill_color": "red",
+        "back_color": "white", "border": 5, "error_correction": "M", "fmt": "png",
+    }
+    key = render_key(**params)
+    assert key == render_key(**{**params, "fill_color": " RED "})
+    for name, value in [("size", 11), ("back_color", "yellow"), ("border", 4),
+                        ("error_correction", "H"), ("fmt", "svg")]:
+        assert render_key(**{**params, name: value}) != key
+
+
+def test_render_cache_evicts_least_recently_used_by_bytes():
+    """
+    Test that the in-memory tier stays within its byte budget, evicting the oldest entries.
+    """
+    cache = RenderCache(max_bytes=3 * (ENTRY_OVERHEAD + len("a.png")))
+    for key in ("a", "b", "c"):
+        cache.put(key, f"{key}.png")
+    assert cache.get("a") is not None
+    cache.put("d", "d.png")
+
+    assert cache.get("b") is None
+    assert [cache.get(key).filename for key in ("a", "c", "d")] == ["a.png", "c.png", "d.png"]
+    assert cache.current_bytes <= cache.max_bytes
+
+
+def test_render_cache_rechecks_disk_after_ttl(tmp_path):
+    """
+    Test that a remembered artifact deleted behind the cache's back is noticed after the TTL.
+    """
+    storage = FlatStorage(tmp_path, "http://testserver/downloads")
+    storage.put("a.png", b"png")
+    cache = RenderCache(max_bytes=1024, ttl=0)
+    assert cache.exists("a", "a.png", storage)
+    storage.delete("a.png")
+    assert not cache.exists("a", "a.png", storage)
+    assert cache.get("a") is None
+
+
+def test_generate_qr_code_rejects_unsupported_format(tmp_path):
+    """
+    Test that formats without an encoder are refused instead of saved as PNG.
+    """
+    with pytest.raises(ValueError):
+        generate_qr_code(data="https://example.com/", filename="a.gif", fmt="gif",
+                         storage=FlatStorage(tmp_path, "http://testserver/downloads"))
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.asyncio
+async def test_create_qr_code_keys_files_on_render_parameters():
+    """
+    Test that the same URL with different colours produces distinct artifacts.
+    """
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        token_response = await ac.post("/token", data={"username": "admin", "password": "secret"})
+        headers = {"Authorization": f"Bearer {token_response.json()['access_token']}"}
+        urls = []
+        for back_color in ("white", "yellow"):
+            qr_request = {"url": "https://example.com/colours", "back_color": back_color, "size": 2}
+            response = await ac.post("/qr-codes/", json=qr_request, headers=headers)
+            assert response.status_code == 200
+            urls.append(response.json()["links"][1]["href"])
+        assert urls[0] != urls[1]
+
+        for url in urls:
+            delete_response = await ac.delete(f"/qr-codes/{url.split('/')[-1]}", headers=headers)
+            assert delete_response.status_code == 204
+
+
+@pytest.mark.asyncio
+async def test_single_flight_collapses_concurrent_calls():
+    """
+    Test that concurrent callers for one key share a single call and its result.
+    """
+    flight = SingleFlight()
+    calls = []
+
+    async def render(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value * 2
+
+    results = await asyncio.gather(*(flight.do("key", render, 21) for _ in range(5)))
+    assert results == [42] * 5
+    assert calls == [21]
+    assert not flight.in_flight("key")
+
+    async def fail():
+        raise RuntimeError("render failed")
+
+    failures = await asyncio.gather(*(flight.do("bad", fail) for _ in range(3)),
+                                    return_exceptions=True)
+    assert all(isinstance(failure, RuntimeError) for failure in failures)
+    assert len(flight) == 0
+
+
+def test_atomic_write_leaves_no_partial_files(tmp_path):
+    """
+    Test that atomic writes replace the target and clean up their temporary file.
+    """
+    target = tmp_path / "code.png"
+    target.write_bytes(b"old")
+    atomic_write_bytes(target, b"new")
+    assert target.read_bytes() == b"new"
+    assert [path.name for path in tmp_path.iterdir()] == ["code.png"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_creates_render_once(
+        client, get_access_token_for_test, monkeypatch):
+    """
+    Test that concurrent POST /qr-codes/ calls with the same parameters submit one render.
+    """
+    submitted = []
+
+    async def fake_submit(fn, **kwargs):
+        submitted.append(kwargs["filename"])
+        await asyncio.sleep(0.05)
+        return {"data": kwargs["data"], "created_at": "2024-01-01T00:00:00+00:00"}
+
+    monkeypatch.setattr(render_executor, "submit", fake_submit)
+    headers = {"Authorization": f"Bearer {get_access_token_for_test}"}
+    qr_request = {"url": "https://example.com/single-flight", "size": 3}
+    responses = await asyncio.gather(
+        *(client.post("/qr-codes/", json=qr_request, headers=headers) for _ in range(5))
+    )
+
+    assert [response.status_code for response in responses] == [200] * 5
+    assert len(submitted) == 1
+    render_cache.discard(submitted[0].rpartition(".")[0])
+    qr_index.remove(submitted[0])
+
+
+@pytest.mark.asyncio
+async def test_render_endpoint_streams_image_and_honours_etag(
+        client, get_access_token_for_test, monkeypatch):
+    """
+    Test that ephemeral renders return the image with an ETag and answer 304 without rendering.
+    """
+    headers = {"Authorization": f"Bearer {get_access_token_for_test}"}
+    params = {"data": "https://example.com/ephemeral", "size": 2, "format": "svg"}
+    response = await client.get("/qr-codes/render", params=params, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/svg+xml"
+    assert response.content.startswith(b"<?xml")
+    assert "immutable" in response.headers["cache-control"]
+
+    async def fail_submit(*args, **kwargs):
+        raise AssertionError("a revalidation must not render")
+
+    monkeypatch.setattr(render_executor, "submit", fail_submit)
+    cached = await client.get("/qr-codes/render", params=params, headers={
+        **headers, "If-None-Match": response.headers["etag"]
+    })
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == response.headers["etag"]
+
+
+def test_render_qr_code_produces_png_in_memory():
+    """
+    Test that in-memory rendering returns a PNG without needing a path.
+    """
+    body = render_qr_code(data="https://example.com/", size=1)
+    assert body.startswith(b"\x89PNG\r\n\x1a\n")
+
+
+@pytest.mark.skipif(not NATIVE_RASTER_AVAILABLE, reason="numpy is not installed")
+def test_native_rasterizer_matches_qrcode_image():
+    """
+    Test that the NumPy rasteriser draws the same pixels as the qrcode image factory.
+    """
+    qr = build_qr_code("https://example.com/raster", size=3, border=2)
+    _, _, expected_rows, _ = png.Reader(bytes=image_bytes(qr.make_image())).read()
+    body = render_png(qr.get_matrix(), 3, parse_color("navy"), parse_color("#ffff00"))
+    width, height, rows, info = png.Reader(bytes=body).read()
+
+    assert info["palette"] == [(255, 255, 0), (0, 0, 128)]
+    assert width == height == (qr.modules_count + 4) * 3
+    # The qrcode image is greyscale with white as 1; the palette puts dark at index 1
+    assert [list(row) for row in rows] == [[1 - v for v in row] for row in expected_rows]
+
+
+def image_bytes(img) -> bytes:
+    """
+    Saves a qrcode image into memory.
+    """
+    buffer = io.BytesIO()
+    img.save(buffer)
+    return buffer.getvalue()
+
+
+@pytest.mark.skipif(not NATIVE_RASTER_AVAILABLE, reason="numpy is not installed")
+def test_png_encoder_modes_and_filters_preserve_pixels():
+    """
+    Test that greyscale, palette, filter and compression choices all decode to the same
+    image, and that the compact encoding is no larger than the qrcode image factory.
+    """
+    qr = build_qr_code("https://example.com/encoder", size=8)
+    pixels = rasterize(qr.get_matrix(), 8)
+    expected = [list(row) for row in pixels.astype(int)]
+
+    grey = encode_png(pixels, [(255, 255, 255), (0, 0, 0)])
+    _, _, rows, info = png.Reader(bytes=grey).read()
+    assert info["greyscale"] and "palette" not in info
+    assert [[1 - v for v in row] for row in rows] == expected
+
+    for png_filter, compression_level in [("none", 9), ("up", 6), ("none", 0)]:
+        body = encode_png(pixels, [(255, 255, 0), (0, 0, 128)], png_filter=png_filter,
+                          compression_level=compression_level, zlib_strategy="filtered")
+        assert [list(row) for row in png.Reader(bytes=body).read()[2]] == expected
+    assert len(grey) <= len(image_bytes(qr.make_image()))
+
+
+def test_streaming_png_encoder_matches_qrcode_image_in_bounded_memory():
+    """
+    Test that the row-streaming encoder draws the qrcode image factory's pixels with
+    every filter and colour mode, in many IDAT chunks, and that a version 40 render at
+    the largest box size peaks far below the size of its pixels.
+    """
+    qr = build_qr_code("https://example.com/streaming", size=3, border=2)
+    _, _, expected_rows, _ = png.Reader(bytes=image_bytes(qr.make_image())).read()
+    expected = [list(row) for row in expected_rows]
+    for palette, png_filter in [([(255, 255, 255), (0, 0, 0)], "none"),
+                                ([(255, 255, 0), (0, 0, 128)], "up")]:
+        buffer = io.BytesIO()
+        write_png_rows(qr.get_matrix(), 3, palette, buffer, png_filter=png_filter,
+                       compression_level=0, chunk_size=256)
+        assert buffer.getvalue().count(b"IDAT") > 2
+        _, _, rows, info = png.Reader(bytes=buffer.getvalue()).read()
+        grey = "palette" not in info
+        # The qrcode image is greyscale with white as 1; the palette puts dark at index 1
+        assert [list(row) if grey else [1 - v for v in row] for row in rows] == expected
+
+    matrix = build_qr_code("x" * 2900, size=40, border=5, error_correction="L").get_matrix()
+    assert len(matrix) == 187
+    tracemalloc.start()
+    try:
+        write_png_rows(matrix, 40, [(255, 255, 255), (0, 0, 0)], io.BytesIO())
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # 7480 x 7480 pixels take 7 MB even packed at one bit each.
+    assert peak < 2 * 1024 * 1024
+
+
+@pytest.mark.skipif(not NATIVE_RASTER_AVAILABLE, reason="numpy is not installed")
+def test_reencode_png_keeps_pixels_and_shrinks_files():
+    """
+    Test that re-encoding an RGB image of a QR code keeps its pixels and saves bytes.
+    """
+    qr = build_qr_code("https://example.com/reencode", size=4)
+    pixels = rasterize(qr.get_matrix(), 4)
+    rgb_rows = [[channel for dark in row for channel in ((0, 0, 0) if dark else (255, 0, 0))]
+                for row in pixels]
+    buffer = io.BytesIO()
+    png.Writer(pixels.shape[1], pixels.shape[0], greyscale=False).write(buffer, rgb_rows)
+
+    body = reencode_png(buffer.getvalue())
+    assert len(body) < len(buffer.getvalue())
+    _, _, rows, info = png.Reader(bytes=body).asRGB8()
+    assert [list(row) for row in rows] == rgb_rows
+    assert info["bitdepth"] == 8
+
+
+def test_vector_formats_merge_runs_and_keep_colours():
+    """
+    Test that vector renderers emit one segment per horizontal run in the requested colours.
+    """
+    matrix = [[False, True, True, True], [True, False, True, False],
+              [False] * 4, [False] * 4]
+    svg = render_svg(matrix, 10, (0, 0, 128), (255, 255, 0)).decode()
+    assert 'd="M1 0h3v1h-3zM0 1h1v1h-1zM2 1h1v1h-1z"' in svg
+    assert 'fill="#000080"' in svg and 'fill="#ffff00"' in svg
+    assert 'width="40"' in svg
+
+    eps = render_eps(matrix, 10, (0, 0, 0), (255, 255, 255)).decode()
+    assert eps.startswith("%!PS-Adobe-3.0 EPSF-3.0\n%%BoundingBox: 0 0 40 40")
+    assert eps.count("1 rectfill") == 3
+
+    pdf = render_pdf(matrix, 10, (0, 0, 0), (255, 255, 255))
+    assert pdf.startswith(b"%PDF-1.4") and pdf.rstrip().endswith(b"%%EOF")
+    assert b"/MediaBox [0 0 40 40]" in pdf
+    offset = int(pdf.rstrip().split(b"\n")[-2])
+    assert pdf[offset:offset + 4] == b"xref"
+
+
+@pytest.mark.asyncio
+async def test_create_qr_code_stores_vector_formats(client, get_access_token_for_test):
+    """
+    Test that vector codes are stored with their own extension and media type.
+    """
+    headers = {"Authorization": f"Bearer {get_access_token_for_test}"}
+    qr_request = {"url": "https://example.com/vector", "format": "pdf", "size": 2}
+    response = await client.post("/qr-codes/", json=qr_request, headers=headers)
+    download = response.json()["links"][1]
+    assert download["href"].endswith(".pdf")
+    assert download["type"] == "application/pdf"
+    await client.delete(f"/qr-codes/{download['href'].split('/')[-1]}", headers=headers)
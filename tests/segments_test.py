@@ -0,0 +1,89 @@
+"""
+Test suite for the encoding planner: optimal segments and smallest-version selection.
+"""
+
+import uuid
+
+import pytest
+import qrcode
+from qrcode import constants, util
+from qrcode.exceptions import DataOverflowError
+from app.services.qr_service import build_qr_code
+from app.services.segments import plan_encoding
+
+
+def encoded_bits(segments, version: int) -> int:
+    """
+    Returns the number of bits the segments take at the given version.
+    """
+    sizes = util.mode_sizes_for_version(version)
+    buffer = util.BitBuffer()
+    for segment in segments:
+        buffer.put(segment.mode, 4)
+        buffer.put(len(segment), sizes[segment.mode])
+        segment.write(buffer)
+    return len(buffer)
+
+
+@pytest.mark.parametrize("data", [
+    "https://example.com/",
+    "https://example.com/track?id=9781234567897&order=20260101123456",
+    "HTTPS://EXAMPLE.COM/ORDER/12345678901234567890",
+    "https://exämple.com/ü/" + "9" * 40,
+])
+def test_plan_is_never_larger_than_the_qrcode_package(data):
+    """
+    Test that the planned segments take the bits the plan reports, no more than the
+    segments chosen by the qrcode package, at the smallest version that holds them.
+    """
+    for level in (constants.ERROR_CORRECT_L, constants.ERROR_CORRECT_H):
+        plan = plan_encoding(data, level)
+        reference = qrcode.QRCode(error_correction=level)
+        reference.add_data(data)
+        reference.make(fit=True)
+
+        assert encoded_bits(plan.segments, plan.version) == plan.bits
+        assert plan.bits <= encoded_bits(reference.data_list, plan.version)
+        assert plan.version <= reference.version
+        assert plan.bits > util.BIT_LIMIT_TABLE[level][plan.version - 1]
+
+
+def test_digit_runs_shrink_the_symbol():
+    """
+    Test that long digit runs are encoded in numeric mode, letting a URL fit a smaller
+    version than as a single byte segment, and that oversized data is rejected.
+    """
+    data = "https://example.com/track?id=9781234567897&order=20260101123456"
+    byte_only = qrcode.QRCode(error_correction=constants.ERROR_CORRECT_M)
+    byte_only.add_data(data, optimize=0)
+    byte_only.make(fit=True)
+
+    qr = build_qr_code(data, size=1, border=0, error_correction="M")
+    assert qr.version < byte_only.version
+    assert len(qr.get_matrix()) == 17 + 4 * qr.version
+
+    with pytest.raises(DataOverflowError):
+        plan_encoding("x" * 3000, constants.ERROR_CORRECT_L)
+
+
+@pytest.mark.asyncio
+async def test_error_correction_and_border_are_part_of_the_request(
+        client, get_access_token_for_test):
+    """
+    Test that the error correction level and the quiet zone of a request are applied to
+    the stored QR code and distinguish it from the same URL with the defaults.
+    """
+    headers = {"Authorization": f"Bearer {get_access_token_for_test}"}
+    url = f"https://example.com/segments/{uuid.uuid4().hex}"
+    default = await client.post("/qr-codes/", json={"url": url, "format": "svg"},
+                                headers=headers)
+    custom = await client.post(
+        "/qr-codes/", json={"url": url, "format": "svg", "error_correction": "H", "border": 0},
+        headers=headers
+    )
+    assert default.status_code == custom.status_code == 200
+    assert default.json()["qr_code_url"] != custom.json()["qr_code_url"]
+
+    response = await client.post("/qr-codes/", json={"url": url, "error_correction": "X"},
+                                 headers=headers)
+    assert response.status_code == 422
@@ -0,0 +1,95 @@
+"""
+Test suite for the render cache shared by the worker processes of a host.
+"""
+
+import errno
+import hashlib
+
+import pytest
+from app.services.shared_cache import SharedRenderCache
+
+
+def key(number: int) -> str:
+    """
+    Returns a render key for tests.
+    """
+    return hashlib.sha256(str(number).encode()).hexdigest()
+
+
+def test_workers_share_entries_and_reject_torn_slots(tmp_path):
+    """
+    Test that an image cached through one mapping is read through another, that
+    oversized images are not cached, and that a slot changed under a reader is a miss.
+    """
+    path = tmp_path / "cache"
+    writer = SharedRenderCache(path, max_bytes=8 * 1024, slot_bytes=1024, ways=4)
+    reader = SharedRenderCache(path, max_bytes=8 * 1024, slot_bytes=1024, ways=4)
+    assert writer.put(key(1), b"png" * 100)
+    assert reader.get(key(1)) == b"png" * 100
+    assert reader.get(key(2)) is None
+    assert not writer.put(key(3), bytes(writer.max_image_bytes + 1))
+
+    # Corrupt the cached image in place: the checksum no longer matches.
+    mapping = reader._mapping()  # pylint: disable=protected-access
+    offset = mapping.find(b"pngpng")
+    mapping[offset] = ord("x")
+    assert reader.get(key(1)) is None
+
+    writer.clear()
+    assert reader.get(key(1)) is None
+    writer.close()
+    reader.close()
+
+
+def test_clock_gives_hit_entries_a_second_chance(tmp_path):
+    """
+    Test that when a set is full, the entry that was hit survives while an entry that
+    was not is evicted.
+    """
+    cache = SharedRenderCache(tmp_path / "cache", max_bytes=4 * 256, slot_bytes=256, ways=4)
+    assert cache.sets == 1
+    for number in range(4):
+        cache.put(key(number), str(number).encode())
+    assert cache.get(key(0)) == b"0"
+    cache.put(key(4), b"4")
+    assert cache.get(key(0)) == b"0"
+    assert cache.get(key(4)) == b"4"
+    assert sum(cache.get(key(number)) is not None for number in range(1, 4)) == 2
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_render_endpoint_fills_the_shared_cache(client, get_access_token_for_test,
+                                                      tmp_path, monkeypatch):
+    """
+    Test that a rendered image is cached for the other workers and served from there.
+    """
+    cache = SharedRenderCache(tmp_path / "cache", max_bytes=64 * 1024, slot_bytes=8192)
+    monkeypatch.setattr("app.routers.qr_code.shared_cache", cache)
+    headers = {"Authorization": f"Bearer {get_access_token_for_test}"}
+    params = {"data": "shared cache", "format": "svg"}
+    first = await client.get("/qr-codes/render", params=params, headers=headers)
+    cache_key = first.headers["etag"].strip('"')
+    assert cache.get(cache_key) == first.content
+
+    cache.put(cache_key, b"<svg>cached</svg>")
+    second = await client.get("/qr-codes/render", params=params, headers=headers)
+    assert second.content == b"<svg>cached</svg>"
+    assert second.headers["etag"] == first.headers["etag"]
+    cache.close()
+
+
+def test_cache_is_disabled_when_shared_memory_is_full(tmp_path, monkeypatch):
+    """
+    Test that a cache whose space cannot be reserved is disabled instead of failing
+    on its first write.
+    """
+    def no_space(fd, offset, length):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr("os.posix_fallocate", no_space)
+    cache = SharedRenderCache(tmp_path / "cache", max_bytes=8 * 1024, slot_bytes=1024)
+    assert not cache.put(key(1), b"png")
+    assert cache.get(key(1)) is None
+    assert not cache.enabled
+    cache.close()
@@ -0,0 +1,135 @@
+"""
+Tests for the storage drivers and the storage migration command.
+"""
+
+import io
+from datetime import datetime, timezone
+
+import pytest
+from app.cli import main as cli_main
+from app.services.storage import FlatStorage, S3Storage, ShardedStorage
+
+BASE_URL = "http://testserver/downloads"
+
+
+class MissingKey(Exception):
+    """
+    The error a boto3 client raises for a missing key.
+    """
+
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class InMemoryS3Client:
+    """
+    A local stand-in for the subset of the boto3 S3 client the driver uses.
+    """
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, ContentType):  # pylint: disable=invalid-name
+        self.objects[(Bucket, Key)] = (Body, ContentType, datetime.now(timezone.utc))
+
+    def get_object(self, Bucket, Key):  # pylint: disable=invalid-name
+        if (Bucket, Key) not in self.objects:
+            raise MissingKey("NoSuchKey")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)][0])}
+
+    def head_object(self, Bucket, Key):  # pylint: disable=invalid-name
+        if (Bucket, Key) not in self.objects:
+            raise MissingKey("404")
+        return {"LastModified": self.objects[(Bucket, Key)][2]}
+
+    def delete_object(self, Bucket, Key):  # pylint: disable=invalid-name
+        self.objects.pop((Bucket, Key), None)
+
+    def get_paginator(self, _operation):
+        """
+        Returns a paginator yielding pages of at most two keys.
+        """
+        client = self
+
+        class Paginator:  # pylint: disable=too-few-public-methods
+            """
+            Pages through the keys of a bucket.
+            """
+
+            def paginate(self, Bucket, Prefix):  # pylint: disable=invalid-name
+                """
+                Yields list_objects_v2 pages.
+                """
+                keys = sorted(key for bucket, key in client.objects
+                              if bucket == Bucket and key.startswith(Prefix))
+                for start in range(0, len(keys), 2):
+                    yield {"Contents": [{"Key": key} for key in keys[start:start + 2]]}
+
+        return Paginator()
+
+
+@pytest.fixture(params=["flat", "sharded", "s3"])
+def storage(request, tmp_path):
+    """
+    Provides each storage driver on an empty store.
+    """
+    if request.param == "flat":
+        return FlatStorage(tmp_path, BASE_URL)
+    if request.param == "sharded":
+        return ShardedStorage(tmp_path, BASE_URL)
+    return S3Storage("bucket", "http://s3.test/bucket", prefix="qr/", client=InMemoryS3Client())
+
+
+def test_storage_contract(storage):  # pylint: disable=redefined-outer-name
+    """
+    Every driver stores, lists, replaces and deletes objects the same way.
+    """
+    assert not storage.exists("a.png")
+    with pytest.raises(FileNotFoundError):
+        storage.get("a.png")
+    storage.put("a.png", b"one")
+    storage.put("a.json", b"{}")
+    storage.put("b.png", b"two")
+    storage.put("a.png", b"three")
+    assert storage.get("a.png") == b"three"
+    assert sorted(storage.iterate()) == ["a.json", "a.png", "b.png"]
+    assert storage.modified("a.png") > 0
+    assert storage.url("a.png").endswith("/" + storage.key("a.png"))
+    assert storage.delete("a.png")
+    assert not storage.delete("a.png")
+    assert sorted(storage.iterate()) == ["a.json", "b.png"]
+
+
+def test_sharded_storage_keeps_metadata_next_to_image(tmp_path):
+    """
+    An image and its metadata share a shard two levels below the root.
+    """
+    storage = ShardedStorage(tmp_path, BASE_URL)  # pylint: disable=redefined-outer-name
+    storage.put("abc.png", b"png")
+    storage.put("abc.json", b"{}")
+    assert storage.local_path("abc.png").parent == storage.local_path("abc.json").parent
+    assert storage.local_path("abc.png").parent.parent.parent == tmp_path
+
+
+def test_migrate_flat_to_sharded_in_place(tmp_path, capsys):
+    """
+    Migrating in place moves every QR code and its metadata into shards and leaves the
+    index where it is.
+    """
+    flat = FlatStorage(tmp_path, BASE_URL)
+    for stem in ("a", "b", "c"):
+        flat.put(f"{stem}.png", stem.encode())
+        flat.put(f"{stem}.json", b"{}")
+    (tmp_path / "index.sqlite").write_bytes(b"")
+
+    assert cli_main(["migrate-storage", "--from", "flat", "--to", "sharded",
+                     "--source-directory", str(tmp_path), "--delete-source"]) == 0
+    assert "Copied 6 of 6 objects" in capsys.readouterr().out
+
+    sharded = ShardedStorage(tmp_path, BASE_URL)
+    assert sorted(sharded.iterate()) == sorted(
+        f"{stem}.{ext}" for stem in ("a", "b", "c") for ext in ("png", "json")
+    )
+    assert sharded.get("b.png") == b"b"
+    assert list(flat.iterate()) == ["index.sqlite"]
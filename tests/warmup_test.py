@@ -0,0 +1,82 @@
+"""
+Tests for warming up the render cache from a URL list.
+"""
+
+import asyncio
+
+import pytest
+from app.services.qr_index import qr_index
+from app.services.qr_service import delete_qr_code
+from app.services.render_cache import render_cache
+from app.services.render_executor import render_executor
+from app.services.warmup import WarmupProgress, expand_variants, parse_warmup_line, warm_up
+
+def test_parse_and_expand_lines():
+    """
+    Lines are bare URLs or JSON requests, and expand into every size and format.
+    """
+    assert parse_warmup_line("  # campaign  ") is None
+    request = parse_warmup_line('{"url": "https://example.com/a", "size": 3}')
+    assert request.size == 3
+    variants = expand_variants(request, sizes=[1, 2], formats=["png", "svg"])
+    assert [(variant.size, variant.format) for variant in variants] == [
+        (1, "png"), (1, "svg"), (2, "png"), (2, "svg")
+    ]
+    with pytest.raises(ValueError):
+        parse_warmup_line("not a url")
+
+@pytest.mark.asyncio
+async def test_warm_up_skips_done_lines_and_stored_codes(monkeypatch):
+    """
+    A resumed warm-up skips the lines before its checkpoint, and stored codes are not
+    rendered again.
+    """
+    rendered = []
+
+    async def fake_submit(fn, **kwargs):
+        rendered.append(kwargs["filename"])
+        await asyncio.sleep(0)
+        return {"data": kwargs["data"], "created_at": "2024-01-01T00:00:00+00:00"}
+
+    monkeypatch.setattr(render_executor, "submit", fake_submit)
+    lines = [f"https://example.com/warm/{number}" for number in range(6)] + ["bad"]
+    progress = await warm_up(lines, sizes=[1], progress=WarmupProgress(resume_line=2),
+                             concurrency=3)
+    assert progress.finished
+    assert (progress.rendered, progress.failed, progress.resume_line) == (4, 1, 7)
+    assert len(rendered) == 4
+
+    for filename in rendered:
+        render_cache.put(filename.rpartition(".")[0], filename)
+    again = await warm_up(lines[2:6], sizes=[1])
+    assert (again.rendered, again.skipped) == (0, 4)
+    for filename in rendered:
+        render_cache.discard(filename.rpartition(".")[0])
+        qr_index.remove(filename)
+
+@pytest.mark.asyncio
+async def test_warmup_endpoint_reports_progress(client, get_access_token_for_test):
+    """
+    The admin endpoint starts a warm-up job whose progress can be polled.
+    """
+    headers = {"Authorization": f"Bearer {get_access_token_for_test}"}
+    response = await client.post(
+        "/admin/warmup", params={"sizes": [1]}, headers=headers,
+        content=b"https://example.com/warm-endpoint\n"
+    )
+    assert response.status_code == 202
+    status_url = response.headers["Location"]
+    for _ in range(100):
+        progress = (await client.get(status_url, headers=headers)).json()
+        if progress["finished"]:
+            break
+        await asyncio.sleep(0.05)
+    assert progress["finished"]
+    assert progress["rendered"] + progress["skipped"] == 1
+
+    listing = await client.get("/qr-codes/", params={"url": "https://example.com/warm-endpoint"})
+    for item in listing.json():
+        filename = item["links"][0]["href"].split("/")[-1]
+        delete_qr_code(filename)
+        render_cache.discard(filename.rpartition(".")[0])
+        qr_index.remove(filename)